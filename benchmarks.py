@@ -0,0 +1,1193 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import requests
+
+import rfm
+from parsing import parse_money, parse_quantity
+from routes import assign_routes, route_margin
+from churn import DEFAULT_POLICY, add_churn, churn_pivot
+from cust_segmentation import segment_customers
+from customer_lifetime_value import lifetime_value_report
+from customer_state import (
+    member_summary, sales_summary, sync_state, update_state
+    )
+from purchases import purchase_history
+from rfm import quantile_edges, rfm_scores
+from rfm_history import monthly_cutoffs, rfm_history
+from bq_loader import (
+    CSVSink, ParquetSink, SQLiteSink, clean_sales, load_chunks, load_sales,
+    read_sales_export, stream_sales
+    )
+from blaze_cache import CachedBlazeClient
+from blaze_client import BlazeAPIError, BlazeClient
+from inventory import inventory_summary
+from fakes import FakeBlazeServer, FakeMetrcServer, FakeSpread
+from gsheet_publisher import frame_values, partition_tabs, publish_tabs
+from metrc_completion import RESULT_COLS, complete_deliveries, get_active_deliveries
+from onfleet_reports import (
+    REPORT_COLUMNS, SUMMARY_COLS, append_history, collect_reports, daily_summary,
+    read_history
+    )
+from sourcing_report import (
+    INVENTORIES, dt_gen, extract_transactions, get_batch_quantities,
+    get_blz_batch_qty, get_brands, get_products, get_vendors, sales_lines
+    )
+import sales_db
+from sales_cache import DEDUP_COLS, read_cache, refresh_cache
+from sales_loader import load_sales_reports, read_sales_report
+from sales_schema import apply_schema, concat_schema, dollars, memory_report
+from synthetic_data import (
+    synthetic_batch_qty, synthetic_brands, synthetic_customers, synthetic_products,
+    synthetic_sales, synthetic_transactions, synthetic_vendors, write_onfleet_dir,
+    write_sales_details, write_sales_dir
+    )
+
+##############################################################################
+# Description: Benchmarks for the shared analytics code. Each bench_* func
+# builds synthetic data shaped like the BLAZE exports, times the current
+# implementation against the old approach and prints the results.
+# Run with: python benchmarks.py <name>
+# The end to end suite times the scripts' pipelines at fixed sizes and
+# saves or checks a json baseline:
+#   python benchmarks.py --suite 10k 1m 10m --save benchmarks_baseline.json
+#   python benchmarks.py --suite 10k 1m --compare benchmarks_baseline.json
+# 10m runs for about half an hour and needs about 3 GB of memory.
+##############################################################################
+
+def timed(func, *args, **kwargs):
+    """Run func once and return (result, seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_loader(n_days: int = 365, rows_per_day: int = 400) -> None:
+    """Append-per-file loop vs. single-concat loader on a year of exports."""
+
+    def append_loop(sls_dir):
+        df = pd.DataFrame()
+        for x in sorted(os.listdir(sls_dir)):
+            # DataFrame.append is gone in pandas 2, concat per file has
+            # the same copy-everything-each-time behaviour
+            df = pd.concat([df, read_sales_report(os.path.join(sls_dir, x))])
+        return df
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_sales_dir(tmp, n_days=n_days, rows_per_day=rows_per_day)
+        old, t_old = timed(append_loop, tmp)
+        new, t_new = timed(load_sales_reports, tmp)
+        par, t_par = timed(
+            load_sales_reports, tmp, processes=os.cpu_count()
+            )
+    assert len(old) == len(new) == len(par)
+    print(f'{n_days} files, {len(new):,} rows')
+    print(f'append loop:        {t_old:8.2f}s')
+    print(f'single concat:      {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+    print(f'process pool ({os.cpu_count()}):  {t_par:8.2f}s')
+
+
+def bench_cache(n_days: int = 365, rows_per_day: int = 400) -> None:
+    """Full rescan vs. nightly cache refresh after one new export lands."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sls_dir, cache_dir = os.path.join(tmp, 'sls'), os.path.join(tmp, 'cache')
+        os.makedirs(sls_dir)
+        write_sales_dir(sls_dir, n_days=n_days, rows_per_day=rows_per_day)
+        _, t_cold = timed(refresh_cache, sls_dir, cache_dir)
+        write_sales_dir(
+            sls_dir, n_days=1, rows_per_day=rows_per_day,
+            start=datetime(2021, 1, 1) + timedelta(days=n_days)
+            )
+        full, t_full = timed(
+            lambda: load_sales_reports(sls_dir).drop_duplicates(
+                subset=DEDUP_COLS
+                )
+            )
+        added, t_warm = timed(refresh_cache, sls_dir, cache_dir)
+        cached, t_read = timed(read_cache, cache_dir)
+    assert len(cached) == len(full)
+    print(f'{n_days + 1} files, {len(cached):,} rows, {added} added')
+    print(f'full rescan:        {t_full:8.2f}s')
+    print(f'cold cache build:   {t_cold:8.2f}s')
+    print(f'warm refresh:       {t_warm:8.2f}s')
+    print(f'read partitions:    {t_read:8.2f}s')
+
+
+def bench_parse(n: int = 2_000_000) -> None:
+    """str.strip/str.split chains vs. parsing.parse_money/parse_quantity."""
+    raw = synthetic_sales(n, datetime(2021, 1, 1))
+    money, qty = raw['COGs'], raw['Quantity Sold']
+
+    old_money, t_strip = timed(lambda: money.str.strip('$').astype('float'))
+    _, t_regex = timed(
+        lambda: pd.to_numeric(money.str.replace(r'[$,]', '', regex=True))
+        )
+    new_money, t_money = timed(parse_money, money)
+    old_qty, t_qty_strip = timed(lambda: qty.str.strip('ea|g').astype('float'))
+    split, t_split = timed(lambda: qty.str.split(' ', expand=True))
+    new_qty, t_qty = timed(parse_quantity, qty)
+    assert (old_money == new_money).all() and (old_qty == new_qty['quantity']).all()
+    assert (split[1] == new_qty['unit'].astype(str)).all()
+
+    # what the old chains do with the cells they cannot handle
+    odd = pd.Series(['-$5.00', '$1,234.50', '($2.00)'])
+    assert parse_money(odd).tolist() == [-5.0, 1234.5, -2.0]
+    try:
+        odd.str.strip('$').astype('float')
+        raise AssertionError('strip chain parsed negative/thousands money')
+    except ValueError:
+        pass
+    print(f'{n:,} cells, results identical on well formed values')
+    print(f'money strip chain:  {t_strip:8.2f}s')
+    print(f'money regex:        {t_regex:8.2f}s')
+    print(f'parse_money:        {t_money:8.2f}s ({t_strip / t_money:.1f}x)')
+    print(f'qty strip chain:    {t_qty_strip:8.2f}s')
+    print(f'qty split expand:   {t_split:8.2f}s')
+    print(f'parse_quantity:     {t_qty:8.2f}s ({t_split / t_qty:.1f}x vs split)')
+
+
+def bench_schema(n_days: int = 365, rows_per_day: int = 400) -> None:
+    """Memory and groupby time of a year of exports, object vs. compact dtypes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_sales_dir(tmp, n_days=n_days, rows_per_day=rows_per_day)
+        raw = load_sales_reports(tmp, compact=False)
+    compact, t_schema = timed(apply_schema, raw)
+
+    def by_member(df):
+        return df.groupby(['Member ID', 'Member'], observed=True).agg(
+            {'Net Sales': 'sum', 'Date': 'max'}
+            )
+
+    old, t_old = timed(by_member, raw)
+    new, t_new = timed(by_member, compact)
+    new.index = new.index.set_levels([x.astype(object) for x in new.index.levels])
+    assert old.index.equals(new.index)
+    # money is kept in cents
+    assert np.allclose(old['Net Sales'], dollars(new['Net Sales']))
+    # converted a month at a time and stacked, as the cache is read
+    months = raw['Date'].dt.to_period('M')
+    stacked = concat_schema([apply_schema(x) for _, x in raw.groupby(months)])
+    pd.testing.assert_frame_equal(stacked, compact)
+    print(memory_report(raw, compact).to_string())
+    print(f'apply_schema:       {t_schema:8.2f}s')
+    print(f'groupby object:     {t_old:8.2f}s')
+    print(f'groupby compact:    {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_rfm(n: int = 1_000_000) -> None:
+    """Row-wise RScore/FMScore apply vs. vectorized rfm_scores."""
+
+    def row_wise(cust, quantiles):
+        out = cust.copy()
+        out['r_quant'] = out['recency'].apply(
+            rfm.RScore, args=('recency', quantiles,)
+            )
+        out['f_quant'] = out['frequency'].apply(
+            rfm.FMScore, args=('frequency', quantiles,)
+            )
+        out['m_quant'] = out['monetary'].apply(
+            rfm.FMScore, args=('monetary', quantiles,)
+            )
+        out['af_quant'] = out['Avg Days Between Purch'].apply(
+            rfm.RScore, args=('Avg Days Between Purch', quantiles,)
+            )
+        out['RFMScore'] = out.r_quant.map(str) + out.f_quant.map(str) +\
+            out.m_quant.map(str) + out.af_quant.map(str)
+        return out
+
+    cust = synthetic_customers(n)
+    quantiles = rfm.quantile_edges(cust)
+    old, t_old = timed(row_wise, cust, quantiles)
+    new, t_new = timed(rfm.rfm_scores, cust, quantiles)
+    for col in rfm.RFM_COLS:
+        assert (old[col].to_numpy() == new[col].to_numpy()).all(), col
+    assert (old['RFMScore'].astype(int) == new['RFMScore']).all()
+    print(f'{n:,} customers, scores identical')
+    print(f'row-wise apply:     {t_old:8.2f}s')
+    print(f'vectorized:         {t_new:8.2f}s ({t_old / t_new:.0f}x)')
+
+
+def bench_rfm_history(n_days: int = 730, rows_per_day: int = 300) -> None:
+    """Segmentation rerun at every month start vs. one as-of rfm_history pass."""
+    policy = {(1, None): 120, (1, 1): 150, (None, None): 90}
+
+    def rerun(df, cutoffs):
+        snaps = []
+        for cutoff in cutoffs:
+            sub = df.loc[df['Date'] < cutoff]
+            if sub.empty:
+                continue
+            _, cust = purchase_history(sub)
+            cust = cust.rename(columns={
+                'last_purchase': 'Last Purchase Date',
+                'avg_days_btwn_purch': 'Avg Days Between Purch'
+                })
+            cust['recency'] = (cutoff - cust['Last Purchase Date']).dt.days
+            cust = rfm.rfm_scores(cust, rfm.quantile_edges(cust))
+            snaps.append(add_churn(cust, policy, cutoff).assign(cutoff=cutoff))
+        return pd.concat(snaps, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_sales_dir(tmp, n_days=n_days, rows_per_day=rows_per_day)
+        df = load_sales_reports(tmp)
+    cutoffs = monthly_cutoffs(df['Date'].min(), df['Date'].max())
+    old, t_old = timed(rerun, df, cutoffs)
+    new, t_new = timed(rfm_history, df, cutoffs, policy)
+    old = old.sort_values(['cutoff', 'Member ID'], ignore_index=True)
+    new = new.sort_values(['cutoff', 'Member ID'], ignore_index=True)
+    assert len(old) == len(new)
+    # money is summed in cents on both sides, so totals match to the bit
+    assert np.array_equal(old['monetary'].to_numpy(), new['monetary'].to_numpy())
+    for col in [
+            'monetary', 'frequency', 'recency', 'Avg Days Between Purch',
+            *rfm.RFM_COLS, 'RFMScore', 'churn'
+            ]:
+        assert np.allclose(
+            old[col].to_numpy(dtype='float64'), new[col].to_numpy(dtype='float64'),
+            equal_nan=True
+            ), col
+    print(f'{len(df):,} rows, {len(cutoffs)} cutoffs, {len(new):,} snapshots identical')
+    print(f'rerun per cutoff:   {t_old:8.2f}s')
+    print(f'rfm_history:        {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_customer_state(n_days: int = 730, rows_per_day: int = 400) -> None:
+    """Regrouping the whole history vs. folding one day into the member state."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sls_dir, state_dir = os.path.join(tmp, 'sls'), os.path.join(tmp, 'state')
+        os.makedirs(sls_dir)
+        write_sales_dir(sls_dir, n_days=n_days, rows_per_day=rows_per_day)
+        df = load_sales_reports(sls_dir)
+        day = df['Date'].dt.normalize()
+        last, late = day == day.max(), day == day.min() + pd.Timedelta(days=30)
+        update_state(state_dir, df.loc[~last & ~late])
+        _, t_day = timed(update_state, state_dir, df.loc[last])
+        _, t_late = timed(update_state, state_dir, df.loc[late])
+        # the same day delivered again is a no-op
+        state, t_again = timed(update_state, state_dir, df.loc[last])
+    (_, full), t_full = timed(purchase_history, df, ['Member ID'])
+    new = member_summary(state).sort_values('Member ID', ignore_index=True)
+    assert len(new) == len(full)
+    for col in [
+            'monetary', 'frequency', 'purchases', 'first_purchase',
+            'last_purchase', 'avg_days_btwn_purch'
+            ]:
+        a, b = full[col].to_numpy(), new[col].to_numpy()
+        if col.endswith('purchase'):
+            assert (a == b).all(), col
+        else:
+            assert np.allclose(a.astype('float64'), b.astype('float64'), equal_nan=True), col
+    # reports as of a past date summarize the sales instead of the state
+    pd.testing.assert_frame_equal(
+        new, sales_summary(df).sort_values('Member ID', ignore_index=True),
+        check_dtype=False
+        )
+    print(f'{len(df):,} rows, {len(new):,} members identical')
+    print(f'full regroup:       {t_full:8.2f}s')
+    print(f'update one day:     {t_day:8.2f}s')
+    print(f'late day:           {t_late:8.2f}s')
+    print(f'redelivered day:    {t_again:8.2f}s')
+
+
+def bench_state_sync(n_days: int = 120, rows_per_day: int = 300) -> None:
+    """Member state kept in step with a cache other scripts also refresh."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sls_dir, cache_dir, state_dir = (
+            os.path.join(tmp, x) for x in ['sls', 'cache', 'state']
+            )
+        os.makedirs(sls_dir)
+        os.makedirs(os.path.join(tmp, 'all'))
+        paths = write_sales_dir(os.path.join(tmp, 'all'), n_days, rows_per_day)
+        for path in paths[:n_days // 2]:
+            shutil.copy(path, sls_dir)
+        refresh_cache(sls_dir, cache_dir)
+        sync_state(state_dir, cache_dir)
+        # profit_per_route style runs refresh the cache without syncing
+        for path in paths[n_days // 2:-1]:
+            shutil.copy(path, sls_dir)
+            refresh_cache(sls_dir, cache_dir)
+        # a run that died before its manifest swap leaves a ledger part
+        # marking the new transactions seen, it must not count
+        read_cache(cache_dir)[['Trans No.', 'Member ID', 'Date']].to_parquet(
+            os.path.join(state_dir, 'trans', 'part-999999.parquet'), index=False
+            )
+        state, t_catch_up = timed(sync_state, state_dir, cache_dir)
+        shutil.copy(paths[-1], sls_dir)
+        refresh_cache(sls_dir, cache_dir)
+        state, t_day = timed(sync_state, state_dir, cache_dir)
+        _, t_noop = timed(sync_state, state_dir, cache_dir)
+        df = read_cache(cache_dir)
+    (_, full) = purchase_history(df, ['Member ID'])
+    new = member_summary(state).sort_values('Member ID', ignore_index=True)
+    assert len(new) == len(full)
+    for col in ['monetary', 'frequency', 'purchases', 'last_purchase', 'avg_days_btwn_purch']:
+        a, b = full[col].to_numpy(), new[col].to_numpy()
+        if col.endswith('purchase'):
+            assert (a == b).all(), col
+        else:
+            assert np.allclose(a.astype('float64'), b.astype('float64'), equal_nan=True), col
+    print(f'{len(df):,} rows, {len(new):,} members match the cache')
+    print(f'catch up {n_days - n_days // 2 - 1} refreshes: {t_catch_up:8.2f}s')
+    print(f'sync one day:          {t_day:8.2f}s')
+    print(f'sync with no change:   {t_noop:8.2f}s')
+
+
+def bench_inventory(n: int = 50_000) -> None:
+    """sourcing_report's apply + merge chain vs. inventory_summary."""
+
+    def merge_chain(products, batch_qty, vendors, brands):
+        products = products.copy()
+        products['category_name'] = products.category.apply(lambda x: x.get('name'))
+        products.loc[
+            products['category_name'] == 'Flower', 'unitPrice'
+            ] = products.loc[
+                products['category_name'] == 'Flower', 'priceRanges'
+                ].apply(lambda x: x[1].get('price'))
+        inv_summ = products.merge(
+            batch_qty, how='left', right_on='productId', left_on='id'
+            ).groupby([
+                'brandId', 'vendorId', 'productId',
+                'sku', 'category_name', 'name', 'unitPrice'
+                ]).agg({'quantity': 'sum'}).reset_index().merge(
+                    vendors, how='left', left_on='vendorId', right_on='id'
+                ).merge(
+                    brands, how='left', left_on='brandId', right_on='brand_id'
+                )
+        inv_summ = inv_summ.rename(columns={'quantity': 'ohq'})
+        inv_summ['onhand($)'] = inv_summ['ohq'] * inv_summ['unitPrice']
+        return inv_summ
+
+    rng = np.random.default_rng(0)
+    products = pd.DataFrame(synthetic_products(n))
+    # a third of the catalog has nothing on hand, and a few are unbranded
+    stocked = products['id'].sample(frac=2 / 3, random_state=0).to_numpy()
+    products.loc[products.sample(frac=0.01, random_state=1).index, 'brandId'] = None
+    batch_qty = pd.DataFrame({
+        'productId': rng.choice(stocked, 3 * n),
+        'batchId': [f'bt{i}' for i in range(3 * n)],
+        'quantity': rng.integers(0, 40, 3 * n).astype(float)
+        })
+    vendors = pd.DataFrame({
+        'id': [f'v{i:03d}' for i in range(30)],
+        'vendor_name': [f'Vendor {i}' for i in range(30)],
+        'active': True,
+        'companyId': 'c1'
+        })
+    brands = pd.DataFrame({
+        'brand_id': [f'b{i:03d}' for i in range(59)],
+        'brand_name': [f'Brand {i}' for i in range(59)],
+        'active': True
+        })
+    old, t_old = timed(merge_chain, products, batch_qty, vendors, brands)
+    new, t_new = timed(inventory_summary, products, batch_qty, vendors, brands)
+    pd.testing.assert_frame_equal(old, new)
+    print(f'{n:,} products, {len(batch_qty):,} batches, {len(new):,} rows identical')
+    print(f'apply + merges:     {t_old:8.2f}s')
+    print(f'inventory_summary:  {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_gsheet(n: int = 20_000) -> None:
+    """publish_tabs on the inventory summary against a fake spreadsheet."""
+    products = pd.DataFrame(synthetic_products(n))
+    batch_qty = pd.DataFrame(synthetic_batch_qty(products['id'], 2 * n))
+    vendors = pd.DataFrame(synthetic_vendors()).rename(columns={'name': 'vendor_name'})
+    brands = pd.DataFrame(synthetic_brands()).rename(
+        columns={'name': 'brand_name', 'id': 'brand_id'}
+        )
+    inv = inventory_summary(products, batch_qty, vendors, brands)
+    fake = FakeSpread()
+    sheet = fake.spread
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'publish.json')
+        tabs = partition_tabs(inv)
+        written, t_first = timed(publish_tabs, fake, tabs, state_path=state_path)
+        assert written == list(tabs)
+        assert sheet.calls == (
+            ['worksheets'] + ['add_worksheet'] * len(tabs)
+            + ['batch_update', 'values_batch_update']
+            )
+        for tab, frame in tabs.items():
+            assert sheet.worksheet(tab).values == frame_values(frame)
+        assert len(tabs['All']) == len(inv)
+        conc = inv['category_name'].isin(['Concentrates', 'Extracts'])
+        assert len(tabs['Conc/Extracts']) == conc.sum()
+
+        # nothing changed: no calls at all
+        n_calls = len(sheet.calls)
+        again, t_again = timed(
+            publish_tabs, fake, partition_tabs(inv), state_path=state_path
+            )
+        assert again == [] and len(sheet.calls) == n_calls
+
+        # a category sells down: only its tab and All are rewritten, and
+        # the rows left over from the longer publish are gone
+        sold = inv.drop(inv.index[inv['category_name'] == 'Edibles'][::2])
+        tabs = partition_tabs(sold)
+        changed = publish_tabs(fake, tabs, state_path=state_path)
+        assert changed == ['All', 'Edibles']
+        assert sheet.calls[n_calls:] == [
+            'worksheets', 'batch_update', 'values_batch_update'
+            ]
+        for tab, frame in tabs.items():
+            assert sheet.worksheet(tab).values == frame_values(frame)
+    print(f'{len(inv):,} rows over {len(tabs)} tabs, contents identical')
+    print(f'first publish:      {t_first:8.2f}s ({n_calls} calls)')
+    print(f'unchanged publish:  {t_again:8.2f}s (0 calls)')
+
+
+def bench_blaze_paging(
+        n: int = 10_000, page_size: int = 100, latency: float = 0.02
+        ) -> None:
+    """Recursive page-and-concat fetch vs. BlazeClient on a fake BLAZE."""
+
+    def recursive(base_url, skip=0):
+        # the old get_products: one request per recursion level, a fresh
+        # connection per call and a concat of everything below it
+        response = requests.get(f'{base_url}/products', params={'skip': skip})
+        dat = pd.DataFrame().from_records(response.json().get('values'))
+        if skip >= response.json().get('total'):
+            return dat
+        return pd.concat([
+            dat, recursive(base_url, skip=skip + response.json().get('limit'))
+            ])
+
+    products = synthetic_products(n)
+    with FakeBlazeServer(
+            {'products': products}, page_size=page_size, latency=latency
+            ) as server:
+        old, t_old = timed(recursive, server.base_url)
+        old_conns = server.connections
+        client = BlazeClient('key', 'key', base_url=server.base_url, max_workers=8)
+        new, t_new = timed(client.fetch_all, 'products')
+        new_conns = server.connections - old_conns
+    assert len(old) == len(new) == n
+
+    # a failed page stops the pull: past it only the pages already in
+    # flight are requested, not the rest of the catalog
+    bad = 5 * page_size
+    with FakeBlazeServer(
+            {'products': products}, page_size=page_size, latency=latency,
+            fail=lambda path, query: int(query.get('skip', 0)) == bad
+            ) as server:
+        client = BlazeClient('key', 'key', base_url=server.base_url, max_workers=8)
+        try:
+            client.fetch_all('products')
+        except BlazeAPIError:
+            pass
+        else:
+            raise AssertionError('failed page did not raise')
+        # the first page, the ones up to the failed page and one window
+        assert len(server.requests) <= bad // page_size + 1 + client.max_workers
+    print(f'{n:,} products, {n // page_size} pages, {latency * 1000:.0f}ms latency')
+    print(f'recursive concat:   {t_old:8.2f}s ({old_conns} connections)')
+    print(f'BlazeClient (8):    {t_new:8.2f}s ({new_conns} connections, '
+          f'{t_old / t_new:.1f}x)')
+
+
+def bench_batch_qty(
+        n: int = 2_000, n_stores: int = 2, page_size: int = 100, latency: float = 0.02
+        ) -> None:
+    """One inventory at a time vs. every store and inventory in parallel."""
+    rng = np.random.default_rng(0)
+    by_id = {
+        inv_id: [
+            {'productId': f'p{i:06d}', 'quantity': float(rng.integers(0, 40))}
+            for i in range(n)
+            ] for inv_id in INVENTORIES.values()
+        }
+
+    def batches(query):
+        return by_id[query['inventoryId']]
+
+    with FakeBlazeServer(
+            {'store/batches/quantities': batches}, page_size=page_size,
+            latency=latency
+            ) as server:
+        stores = {
+            f'store{i}': (
+                BlazeClient('key', 'key', base_url=server.base_url), INVENTORIES
+                ) for i in range(n_stores)
+            }
+
+        def serial():
+            return pd.concat([
+                get_blz_batch_qty(name, client, inventories).assign(
+                    store=store, inventory=name
+                    )
+                for store, (client, inventories) in stores.items()
+                for name in inventories
+                ], ignore_index=True)
+
+        old, t_old = timed(serial)
+        new, t_new = timed(get_batch_quantities, stores)
+    pd.testing.assert_frame_equal(old, new)
+    # each inventory's own batches, nothing mixed in from another
+    totals = new.groupby('inventory')['quantity'].sum()
+    for name, inv_id in INVENTORIES.items():
+        assert totals[name] == n_stores * sum(x['quantity'] for x in by_id[inv_id])
+    print(f'{n_stores} stores x {len(INVENTORIES)} inventories, {len(new):,} rows')
+    print(f'serial:             {t_old:8.2f}s')
+    print(f'parallel:           {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_catalog_cache(
+        n: int = 10_000, n_changed: int = 50, page_size: int = 100,
+        latency: float = 0.02
+        ) -> None:
+    """Catalog pulls cold, warm within the TTL and past it with a delta."""
+    products = synthetic_products(n)
+    for i, x in enumerate(products):
+        x['modified'] = 1_600_000_000_000 + i
+    vendors = [{'id': f'v{i:03d}', 'name': f'Vendor {i}'} for i in range(30)]
+    brands = [{'id': f'b{i:03d}', 'name': f'Brand {i}'} for i in range(60)]
+
+    def changed_products(query):
+        since = int(query.get('startDate', 0))
+        return [x for x in products if x['modified'] > since]
+
+    def pull(client):
+        return get_products(client), get_vendors(client), get_brands(client)
+
+    with tempfile.TemporaryDirectory() as tmp, FakeBlazeServer({
+            'products': changed_products, 'vendors': vendors,
+            'store/inventory/brands': brands
+            }, page_size=page_size, latency=latency) as server:
+        client = BlazeClient('key', 'key', base_url=server.base_url, max_workers=8)
+        cold, t_cold = timed(pull, CachedBlazeClient(client, tmp))
+        n_cold = len(server.requests)
+        warm, t_warm = timed(pull, CachedBlazeClient(client, tmp))
+        n_warm = len(server.requests) - n_cold
+        for old, new in zip(cold, warm):
+            pd.testing.assert_frame_equal(old, new)
+        assert n_warm == 0
+
+        # past the TTL: a few products changed upstream, vendors and brands
+        # have no modified filter and are pulled in full
+        for x in products[:n_changed]:
+            x['unitPrice'] += 1
+            x['modified'] = 1_700_000_000_000
+        products.append(dict(products[0], id='p_new', modified=1_700_000_000_000))
+        expired = CachedBlazeClient(client, tmp, ttls={
+            k: timedelta(0) for k in ('products', 'vendors', 'store/inventory/brands')
+            })
+        before = len(server.requests)
+        delta, t_delta = timed(pull, expired)
+        n_delta = len(server.requests) - before
+        full = pull(client)
+    key = ['id']
+    pd.testing.assert_frame_equal(
+        delta[0].sort_values(key, ignore_index=True),
+        full[0].sort_values(key, ignore_index=True)
+        )
+    assert expired.stats == {'hit': 0, 'delta': 1, 'miss': 2}
+    print(f'{n:,} products, {page_size} per page, {latency * 1000:.0f}ms latency')
+    print(f'cold:               {t_cold:8.2f}s ({n_cold} requests)')
+    print(f'warm:               {t_warm:8.2f}s ({n_warm} requests)')
+    print(f'expired + delta:    {t_delta:8.2f}s ({n_delta} requests, '
+          f'{n_changed + 1} products changed)')
+
+
+def bench_transactions(
+        n_days: int = 31, per_day: int = 300, page_size: int = 100,
+        latency: float = 0.02
+        ) -> None:
+    """Serial window loop with per-row applies vs. extract_transactions."""
+    first = datetime(2022, 3, 1)
+    txns = synthetic_transactions(n_days, per_day, first)
+
+    def window(query):
+        # startDate and endDate are both included, by day
+        lo = datetime.strptime(query['startDate'], '%m/%d/%Y')
+        hi = datetime.strptime(query['endDate'], '%m/%d/%Y') + timedelta(days=1)
+        lo, hi = lo.timestamp() * 1000, hi.timestamp() * 1000
+        return [x for x in txns if lo <= x['created'] < hi]
+
+    def serial(client, start, end):
+        # the old get_sls: a loop concat of cart items per window, joined
+        # back to the transactions on an id prefix
+        out = []
+        for i, j in dt_gen(start, end, timedelta(days=1)):
+            dat = client.fetch_all('transactions', params={'startDate': i, 'endDate': j})
+            itms = pd.DataFrame()
+            for x in dat.cart.apply(lambda x: pd.DataFrame.from_records(x.get('items'))):
+                itms = x if itms.empty else pd.concat([itms, x])
+            dat['joinid'] = dat.id.apply(lambda x: x[0:-3])
+            dat = dat.rename(columns={'id': 'txn_id'})
+            itms['joinid'] = itms.id.apply(lambda x: x[0:-3])
+            out.append(dat.merge(itms, how='left', on='joinid'))
+        return pd.concat(out, ignore_index=True)
+
+    start = first.strftime('%m/%d/%Y')
+    end = (first + timedelta(days=n_days - 1)).strftime('%m/%d/%Y')
+    with tempfile.TemporaryDirectory() as tmp, FakeBlazeServer(
+            {'transactions': window}, page_size=page_size, latency=latency
+            ) as server:
+        client = BlazeClient('key', 'key', base_url=server.base_url)
+        old, t_old = timed(serial, client, start, end)
+        sink = ParquetSink(os.path.join(tmp, 'txns'))
+        rows, t_new = timed(extract_transactions, start, end, sink, client)
+        new = sink.read()
+    n_items = sum(len(x['cart']['items']) for x in txns)
+    assert rows == len(old) == len(new) == n_items
+    key = ['transNo', 'productId', 'quantity']
+    pd.testing.assert_frame_equal(
+        old[key].sort_values(key, ignore_index=True),
+        new[key].sort_values(key, ignore_index=True), check_dtype=False
+        )
+    print(f'{n_days} days, {len(txns):,} transactions, {n_items:,} line items')
+    print(f'serial windows:     {t_old:8.2f}s')
+    print(f'extract (4 windows):{t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_resume(
+        n_days: int = 30, per_day: int = 200, fail_day: int = 25, latency: float = 0.02
+        ) -> None:
+    """A backfill that fails on one day, rerun from its checkpoint."""
+    rng = np.random.default_rng(0)
+    first = datetime(2022, 3, 1)
+    days = [(first + timedelta(days=d)).strftime('%m/%d/%Y') for d in range(n_days)]
+    by_day = {
+        day: [{
+            'id': f'{d:03d}{t:05d}', 'transNo': str(d * per_day + t),
+            'created': int((first + timedelta(days=d)).timestamp() * 1000),
+            'cart': {'items': [{'productId': f'p{rng.integers(0, 500):04d}', 'quantity': 1.0}]}
+            } for t in range(per_day)]
+        for d, day in enumerate(days)
+        }
+    broken = {'on': True}
+
+    def fail(path, query):
+        return broken['on'] and query.get('startDate') == days[fail_day - 1]
+
+    with tempfile.TemporaryDirectory() as tmp, FakeBlazeServer(
+            {'transactions': lambda q: by_day[q['startDate']]}, latency=latency,
+            fail=fail
+            ) as server:
+        client = BlazeClient('key', 'key', base_url=server.base_url)
+        sink = ParquetSink(os.path.join(tmp, 'txns'))
+        ckpt = os.path.join(tmp, 'ckpt')
+        try:
+            extract_transactions(days[0], days[-1], sink, client, checkpoint_dir=ckpt)
+            raise AssertionError('expected the failing day to raise')
+        except BlazeAPIError:
+            pass
+        assert not os.path.exists(sink.path)
+        before = len(server.requests)
+        broken['on'] = False
+        rows, t_resume = timed(
+            extract_transactions, days[0], days[-1], sink, client, checkpoint_dir=ckpt
+            )
+        refetched = {q['startDate'] for _, _, q, _ in server.requests[before:]}
+        n_resume = len(server.requests) - before
+        # days before the failure come from the checkpoint; windows not yet
+        # submitted when it failed are fetched on the rerun
+        assert days[fail_day - 1] in refetched
+        assert refetched <= set(days[fail_day - 1:])
+        assert not os.path.exists(ckpt)
+        before = len(server.requests)
+        full = ParquetSink(os.path.join(tmp, 'full'))
+        _, t_full = timed(extract_transactions, days[0], days[-1], full, client)
+        n_full = len(server.requests) - before
+        pd.testing.assert_frame_equal(sink.read(), full.read())
+    assert rows == n_days * per_day
+    print(f'{n_days} day backfill, day {fail_day} failed on the first run')
+    print(f'resume:             {t_resume:8.2f}s ({n_resume} requests, '
+          f'{len(refetched)} windows)')
+    print(f'full rerun:         {t_full:8.2f}s ({n_full} requests)')
+
+
+def bench_onfleet(n_months: int = 12, downloads: int = 3) -> None:
+    """Month by month merge script vs. collect_reports + daily_summary."""
+
+    def old_month(folder):
+        # sg_data_collection2 as it was, for one month folder
+        from glob import glob
+        reports = dict()
+        for x in glob(f'{folder}/*/*.csv'):
+            reports[os.path.basename(x).strip('.csv')] = pd.read_csv(x)
+        frames = []
+        for name, cols in REPORT_COLUMNS.items():
+            df = reports.get(name).drop('Unnamed: 0', axis='columns').T.reset_index()
+            df.columns = ['Date'] + cols
+            frames.append(df)
+        summary = frames[0]
+        for df in frames[1:]:
+            summary = summary.merge(df, how='inner', on='Date')
+        summary['Dur In Transit'] = summary['Dur In Transit'] * (1 / 3600)
+        summary['Dur Idle'] = summary['Dur Idle'] * (1 / 3600)
+        tasks = summary['Succeeded'] + summary['Failed']
+        summary['% On Time'] = summary['On Time'] / tasks
+        summary['% <10 min Late'] = summary['Delayed < 10 min'] / tasks
+        summary['% 10-30 min Late'] = summary['Delayed 10-30 mins'] / tasks
+        summary['% 30-60 min Late'] = summary['Delayed 30-60 mins'] / tasks
+        summary['Tasks per Hour'] = (tasks / summary['Dur In Transit']).round(2)
+        summary['Miles per Task'] = (
+            (summary['Dist In Transit'] + summary['Dist Idle']) / tasks
+            ).round(2)
+        summary['Order Rate'] = tasks
+        summary['% Dur Idle'] = summary['Dur Idle'] / (
+            summary['Dur Idle'] + summary['Dur In Transit']
+            )
+        return summary
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'OF Data')
+        days = write_onfleet_dir(root, n_months, downloads)
+
+        def old_run():
+            return pd.concat([
+                old_month(os.path.join(root, x)) for x in sorted(os.listdir(root))
+                ], ignore_index=True)
+
+        def new_run():
+            return daily_summary(collect_reports(root))
+
+        old, t_old = timed(old_run)
+        new, t_new = timed(new_run)
+        history = os.path.join(tmp, 'OF History')
+        appended = append_history(new, history)
+        again = append_history(new, history)
+        hist = read_history(history)
+        parts = sorted(os.listdir(history))
+        # a revised day rewrites its month's part and nothing else
+        revised = new.copy()
+        revised.loc[revised.index[-1], 'Failed'] += 1
+        inodes = {x: os.stat(os.path.join(history, x)).st_ino for x in parts}
+        assert append_history(revised, history) == 1
+        touched = [
+            x for x in parts
+            if os.stat(os.path.join(history, x)).st_ino != inodes[x]
+            ]
+        pd.testing.assert_frame_equal(read_history(history), revised)
+        assert sorted(os.listdir(history)) == parts
+        # no exports yet: an empty summary rather than a concat error
+        os.makedirs(os.path.join(tmp, 'empty'))
+        empty = daily_summary(collect_reports(os.path.join(tmp, 'empty')))
+    # the old script kept one download per month, the last one globbed
+    assert len(old) == n_months * len(np.array_split(range(30), downloads)[-1])
+    assert len(new) == len(days) == appended == len(hist)
+    assert again == 0
+    assert parts == [
+        f'part-{m}.parquet' for m in new['Date'].dt.to_period('M').unique()
+        ]
+    assert touched == [f"part-{revised['Date'].iloc[-1]:%Y-%m}.parquet"]
+    assert list(empty.columns) == SUMMARY_COLS and not len(empty)
+    old['Date'] = pd.to_datetime(old['Date'])
+    match = new.merge(old[new.columns], on='Date', suffixes=('', '_old'))
+    for c in new.columns.drop('Date'):
+        assert np.allclose(match[c], match[f'{c}_old'].astype(float))
+    print(f'{n_months} months x {downloads} downloads, {len(new)} days')
+    print(f'month by month:     {t_old:8.2f}s ({len(old)} days kept)')
+    print(f'collect + summary:  {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_sales_db(n_days: int = 730, rows_per_day: int = 400) -> None:
+    """Whole cache into pandas then pivot vs. the DuckDB sales views."""
+    as_of = datetime(2023, 1, 1)
+
+    def in_pandas(cache_dir):
+        df = read_cache(cache_dir)
+        _, cust = purchase_history(df, ['Member ID'])
+        latest = df.sort_values('Date', kind='stable').drop_duplicates('Member ID', keep='last')
+        cust['Marketing Source'] = latest.set_index('Member ID')['Marketing Source'].reindex(
+            cust['Member ID']
+            ).astype(str).fillna('None').to_numpy()
+        cust = cust.rename(columns={
+            'last_purchase': 'Last Purchase Date',
+            'avg_days_btwn_purch': 'Avg Days Between Purch'
+            })
+        cust['recency'] = (as_of - cust['Last Purchase Date']).dt.days
+        cust = rfm.rfm_scores(cust, rfm.quantile_edges(cust))
+        joined = df.groupby(['Member ID', 'Member'], observed=True)['Date Joined'].max()
+        return {
+            'churn_piv': churn_pivot(add_churn(cust, DEFAULT_POLICY, as_of), DEFAULT_POLICY, as_of),
+            'new_cust_piv': joined.groupby(
+                [joined.dt.year.rename('year'), joined.dt.month.rename('month')]
+                ).count().reset_index(),
+            'mkt_src': cust.pivot_table(
+                index=['m_quant', 'af_quant'], columns='Marketing Source',
+                values='Member ID', aggfunc='nunique', fill_value=0
+                ),
+            'routes': route_margin(df)
+            }
+
+    def in_duckdb(cache_dir):
+        con = sales_db.connect(cache_dir)
+        return {
+            'churn_piv': sales_db.churn_piv(con, DEFAULT_POLICY, as_of),
+            'new_cust_piv': sales_db.new_cust_piv(con),
+            'mkt_src': sales_db.mkt_src(con),
+            'routes': sales_db.routes(con)
+            }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sls_dir, cache_dir = os.path.join(tmp, 'sls'), os.path.join(tmp, 'cache')
+        os.makedirs(sls_dir)
+        write_sales_dir(sls_dir, n_days=n_days, rows_per_day=rows_per_day)
+        refresh_cache(sls_dir, cache_dir)
+        old, t_old = timed(in_pandas, cache_dir)
+        new, t_new = timed(in_duckdb, cache_dir)
+    old['routes'] = old['routes'].reset_index(drop=True).astype({'route': str, 'Employee': str})
+    for name in old:
+        pd.testing.assert_frame_equal(
+            new[name], old[name], check_dtype=False, check_names=False,
+            check_index_type=False, check_column_type=False, rtol=1e-4
+            )
+    print(f'{n_days * rows_per_day:,} rows, {len(old)} tables identical')
+    print(f'read_cache + pandas: {t_old:8.2f}s')
+    print(f'sales_db:            {t_new:8.2f}s ({t_old / t_new:.1f}x)')
+
+
+def bench_metrc(n: int = 200, latency: float = 0.02) -> None:
+    """GET + single PUT per delivery vs. the async batched pipeline."""
+    deliveries = [{
+        'Id': i,
+        'SalesDateTime': '2022-01-01T12:00:00.000',
+        'Transactions': [{'PackageLabel': f'1A40{i:010d}'}]
+        } for i in range(1, n + 1)]
+    frame = pd.DataFrame(deliveries).drop(columns='Transactions')
+
+    def one_by_one(base_url):
+        # the old apply(complete_deliveries): blocking GET then a
+        # one-element PUT for every delivery
+        for row in deliveries:
+            r = requests.get(f"{base_url}/sales/v1/delivery/{row['Id']}")
+            d = {
+                'Id': row['Id'], 'ActualArrivalDateTime': row['SalesDateTime'],
+                'AcceptedPackages': [
+                    x.get('PackageLabel') for x in r.json().get('Transactions')
+                    ]
+                }
+            requests.put(f'{base_url}/sales/v1/deliveries/complete', json=[d])
+
+    with FakeMetrcServer(deliveries, latency=latency) as server:
+        _, t_old = timed(one_by_one, server.base_url)
+    with FakeMetrcServer(deliveries, latency=latency) as server:
+        result, t_new = timed(
+            complete_deliveries, frame, base_url=server.base_url,
+            per_second=1000
+            )
+        n_requests = len(server.requests)
+    assert (result['status'] == 'completed').all()
+    # end of day with nothing left to complete
+    with FakeMetrcServer([]) as server:
+        empty = get_active_deliveries(base_url=server.base_url)
+        done = complete_deliveries(empty, base_url=server.base_url)
+        assert done.empty and list(done.columns) == RESULT_COLS
+        assert not server.requests[1:]
+    print(f'{n} deliveries, {latency * 1000:.0f}ms latency')
+    print(f'one by one:         {t_old:8.2f}s ({2 * n} requests)')
+    print(f'async batched:      {t_new:8.2f}s ({n_requests} requests, '
+          f'{t_old / t_new:.1f}x)')
+
+
+def bench_bq_insert(n: int = 500_000, chunk_size: int = 50_000) -> None:
+    """Chunked staged load into the local sqlite sink, then an idempotent rerun."""
+    n_days = max(n // 2000, 1)
+    raw = pd.concat([
+        synthetic_sales(n // n_days, datetime(2021, 1, 1) + timedelta(days=i), seed=i)
+        for i in range(n_days)
+        ], ignore_index=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        sales, t_clean = timed(clean_sales, raw)
+        sink = SQLiteSink(os.path.join(tmp, 'kc.db'))
+        inserted, t_load = timed(load_sales, sales, sink, chunk_size)
+        again, t_rerun = timed(load_sales, sales, sink, chunk_size)
+        assert inserted == len(sales) and again == 0
+        assert len(sink.read()) == len(sales)
+        # rows without a SKU are keyed on the missing value, not loaded twice
+        no_sku = sales.drop_duplicates(['Trans_No_', 'Date']).head(1000).assign(Product_SKU=None)
+        assert load_sales(no_sku, sink, chunk_size) == len(no_sku)
+        assert load_sales(no_sku, sink, chunk_size) == 0
+        assert len(sink.read()) == len(sales) + len(no_sku)
+        sink.conn.close()
+    print(f'{len(raw):,} rows, {len(sales):,} after key dedup')
+    print(f'clean:              {t_clean:8.2f}s')
+    print(f'staged load:        {t_load:8.2f}s ({inserted:,} inserted)')
+    print(f'rerun:              {t_rerun:8.2f}s ({again} inserted)')
+
+
+def peak_mb(func, *args, **kwargs):
+    """Run func once under tracemalloc and return (result, peak MB)."""
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        return result, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(n: int = 200_000, chunk_size: int = 25_000) -> None:
+    """Whole-file read and clean vs. streamed chunks, same rows out."""
+    n_days = max(n // 2000, 1)
+    raw = pd.concat([
+        synthetic_sales(n // n_days, datetime(2021, 1, 1) + timedelta(days=i), seed=i)
+        for i in range(n_days)
+        ], ignore_index=True)
+    # re-exported rows far apart in the file, so duplicates span chunks,
+    # some of them without a SKU
+    raw.loc[raw.sample(n // 100, random_state=1).index, 'Product SKU'] = None
+    raw = pd.concat([raw, raw.sample(n // 20, random_state=0)], ignore_index=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'COMPLETED_SALES_DETAILS_REPORT.csv')
+        with open(path, 'w', newline='') as f:
+            f.write('Completed Sales Details Report\n')
+            raw.to_csv(f, index=False)
+        del raw
+        def read_whole():
+            return clean_sales(read_sales_export(path))
+
+        def read_stream():
+            return sum(len(x) for x in stream_sales(path, chunk_size))
+
+        # tracemalloc slows allocation down a lot, so time and measure apart
+        whole, t_whole = timed(read_whole)
+        streamed, t_stream = timed(read_stream)
+        _, mb_whole = peak_mb(read_whole)
+        _, mb_stream = peak_mb(read_stream)
+        chunks = pd.concat(stream_sales(path, chunk_size), ignore_index=True)
+        pd.testing.assert_frame_equal(whole, chunks)
+        assert streamed == len(whole)
+        for sink in [
+                ParquetSink(os.path.join(tmp, 'parquet')),
+                CSVSink(os.path.join(tmp, 'sales.csv'))
+                ]:
+            assert load_chunks(stream_sales(path, chunk_size), sink) == len(whole)
+            assert len(sink.read()) == len(whole)
+    print(f'{len(whole):,} rows after key dedup, streamed output identical')
+    print(f'whole file:         {t_whole:8.2f}s {mb_whole:8.0f} MB peak')
+    print(f'stream {chunk_size:,}:     {t_stream:8.2f}s {mb_stream:8.0f} MB peak')
+
+
+def bench_routes(n: int = 3_000_000) -> None:
+    """Ten full-column .loc scans vs. one searchsorted route assignment."""
+
+    def loc_scans(df):
+        df = df.copy()
+        df['hour'] = df.Date.dt.hour
+        df['route'] = None
+        df.loc[df['hour'].between(13, 15), 'route'] = 'First Route (1-3pm)'
+        df.loc[df['hour'].between(15, 17), 'route'] = 'Second Route (3-5pm)'
+        df.loc[df['hour'].between(17, 19), 'route'] = 'Third Route (5-7pm)'
+        df.loc[df['hour'].between(19, 20), 'route'] = 'Fourth Route (7-8)'
+        df.loc[df['hour'].between(20, 21), 'route'] = 'Last Route'
+        df.loc[df['hour'].between(13, 15), 'route_nbr'] = 1
+        df.loc[df['hour'].between(15, 17), 'route_nbr'] = 2
+        df.loc[df['hour'].between(17, 19), 'route_nbr'] = 3
+        df.loc[df['hour'].between(19, 20), 'route_nbr'] = 4
+        df.loc[df['hour'].between(20, 21), 'route_nbr'] = 5
+        df.Date = df.Date.dt.date
+        routes = df.groupby(['Date', 'Employee', 'route', 'route_nbr']).agg(
+            {'Retail Value': 'sum', 'COGs': 'sum'}
+            )
+        routes['margin'] = routes['Retail Value'] - routes['COGs']
+        return df, routes.reset_index().sort_values(['Date', 'Employee', 'route_nbr'])
+
+    # boundaries: windows are [start, end) to the minute
+    edge = pd.Series(pd.to_datetime([
+        '2021-01-01 12:59', '2021-01-01 13:00', '2021-01-01 14:59',
+        '2021-01-01 15:00', '2021-01-01 19:59', '2021-01-01 20:00',
+        '2021-01-01 21:59', '2021-01-01 22:00', '2021-01-01 00:00'
+        ]))
+    assert assign_routes(edge)['route_nbr'].tolist() == [
+        pd.NA, 1, 1, 2, 4, 5, 5, pd.NA, pd.NA
+        ]
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Date': pd.Timestamp('2019-01-01') + pd.to_timedelta(
+            rng.integers(0, 3 * 365 * 1440, n), 'm'),
+        'Employee': rng.choice([f'Driver {i}' for i in range(12)], n),
+        'Retail Value': rng.integers(500, 12000, n) / 100,
+        'COGs': rng.integers(200, 5000, n) / 100
+        })
+    (old_df, old), t_old = timed(loc_scans, df)
+    labels, t_assign = timed(assign_routes, df['Date'])
+    new, t_new = timed(route_margin, df)
+    assert (labels['route'].astype(object).fillna('') ==
+            old_df['route'].fillna('')).all()
+    assert np.allclose(old['margin'].to_numpy(), new['margin'].to_numpy())
+    print(f'{n:,} sales over 3 years, labels and margins identical')
+    print(f'loc scans + groupby: {t_old:7.2f}s')
+    print(f'assign_routes:       {t_assign:7.2f}s')
+    print(f'route_margin:        {t_new:7.2f}s ({t_old / t_new:.1f}x)')
+
+
+BENCHES = {
+    'loader': bench_loader,
+    'cache': bench_cache,
+    'schema': bench_schema,
+    'parse': bench_parse,
+    'rfm': bench_rfm,
+    'rfm_history': bench_rfm_history,
+    'customer_state': bench_customer_state,
+    'state_sync': bench_state_sync,
+    'inventory': bench_inventory,
+    'gsheet': bench_gsheet,
+    'blaze_paging': bench_blaze_paging,
+    'batch_qty': bench_batch_qty,
+    'catalog_cache': bench_catalog_cache,
+    'transactions': bench_transactions,
+    'resume': bench_resume,
+    'metrc': bench_metrc,
+    'bq_insert': bench_bq_insert,
+    'stream': bench_stream,
+    'routes': bench_routes,
+    'onfleet': bench_onfleet,
+    'sales_db': bench_sales_db,
+    }
+
+# end to end suite: line items -> label, see run_suite()
+SUITE_SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+# a stage only counts as a regression if it is this much slower and by at
+# least MIN_SLOWDOWN seconds, so millisecond stages do not trip on noise
+TOLERANCE = 1.25
+MIN_SLOWDOWN = 0.05
+
+
+def run_suite(n: int, n_days: int = 365) -> dict:
+    """Time the scripts' pipelines end to end on n synthetic line items.
+
+    Stages, each timed once on files written up front:
+        ingest: All Sales Reports into the parquet cache
+        segmentation: cust_segmentation.segment_customers() on the cache
+        clv: customer_lifetime_value.lifetime_value_report() on the cache
+        routes: profit per route
+        sourcing: inventory summary and sourcing_report.sales_lines()
+        bq_insert: streamed COMPLETED_SALES_DETAILS load into sqlite
+
+    Args:
+        n (int): line items
+        n_days (int, optional): days the line items are spread over.
+        Defaults to 365.
+
+    Returns:
+        dict: stage -> seconds
+    """
+    as_of = datetime(2021, 1, 1) + timedelta(days=n_days)
+    per_day = max(n // n_days, 1)
+    times = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sls_dir, cache_dir, state_dir = (os.path.join(tmp, x) for x in 'scm')
+        os.makedirs(sls_dir)
+        write_sales_dir(sls_dir, n_days, per_day)
+        details = write_sales_details(os.path.join(tmp, 'details.csv'), n)
+        products = pd.DataFrame(synthetic_products(max(n // 20, 100)))
+        batch_qty = pd.DataFrame(synthetic_batch_qty(products['id'], max(n // 10, 100)))
+        vendors = pd.DataFrame(synthetic_vendors()).rename(columns={'name': 'vendor_name'})
+        brands = pd.DataFrame(synthetic_brands()).rename(
+            columns={'name': 'brand_name', 'id': 'brand_id'}
+            )
+
+        def sourcing():
+            inventory_summary(products, batch_qty, vendors, brands)
+            sales_lines(details)
+
+        _, times['ingest'] = timed(refresh_cache, sls_dir, cache_dir)
+        # the cache is already refreshed, so segment_customers() finds no
+        # new exports and times the state sync, scoring and history
+        _, times['segmentation'] = timed(
+            segment_customers, sls_dir, cache_dir, state_dir, as_of=as_of
+            )
+        # likewise lifetime_value_report() finds the state already synced
+        _, times['clv'] = timed(
+            lifetime_value_report, sls_dir, cache_dir, state_dir, as_of=as_of
+            )
+        _, times['routes'] = timed(lambda: route_margin(read_cache(
+            cache_dir, columns=['Date', 'Employee', 'Retail Value', 'COGs']
+            )))
+        _, times['sourcing'] = timed(sourcing)
+        sink = SQLiteSink(os.path.join(tmp, 'kc.db'))
+        _, times['bq_insert'] = timed(load_chunks, stream_sales(details), sink)
+        sink.conn.close()
+    return times
+
+
+def suite_baseline(sizes: list) -> dict:
+    """run_suite() at each size label, with the environment it ran in."""
+    results = {}
+    for label in sizes:
+        print(f'--- suite {label}')
+        results[label] = {
+            stage: round(t, 3) for stage, t in run_suite(SUITE_SIZES[label]).items()
+            }
+        for stage, t in results[label].items():
+            print(f'{stage:<20}{t:8.2f}s')
+    return {
+        'env': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count()
+            },
+        'results': results
+        }
+
+
+def compare_baseline(new: dict, old: dict, tolerance: float = TOLERANCE) -> list:
+    """Print new vs. old stage times and return the regressed stages.
+
+    Args:
+        new (dict): suite_baseline() output
+        old (dict): a saved suite_baseline() output
+        tolerance (float, optional): slowdown ratio allowed. Defaults to
+        TOLERANCE.
+
+    Returns:
+        list: (size, stage, old seconds, new seconds) of each regression
+    """
+    regressions = []
+    for label, stages in new['results'].items():
+        for stage, t in stages.items():
+            base = old['results'].get(label, {}).get(stage)
+            if base is None:
+                continue
+            slow = t > base * tolerance and t - base > MIN_SLOWDOWN
+            print(f'{label:>4} {stage:<16}{base:8.2f}s -> {t:8.2f}s'
+                  f'{"  REGRESSION" if slow else ""}')
+            if slow:
+                regressions.append((label, stage, base, t))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'bench', nargs='*', help=f"any of: {', '.join(BENCHES)}"
+        )
+    parser.add_argument(
+        '--suite', nargs='+', choices=SUITE_SIZES, metavar='SIZE',
+        help=f"run the end to end suite at these sizes: {', '.join(SUITE_SIZES)}"
+        )
+    parser.add_argument('--save', help='write the suite results to this json')
+    parser.add_argument(
+        '--compare', help='json baseline to check the suite results against'
+        )
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if args.suite:
+        out = suite_baseline(args.suite)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(out, f, indent=2)
+        if args.compare:
+            with open(args.compare) as f:
+                if compare_baseline(out, json.load(f), args.tolerance):
+                    sys.exit(1)
+    else:
+        for name in args.bench or BENCHES:
+            print(f'--- {name}')
+            BENCHES[name]()
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from itertools import chain
+
+import pandas as pd
+
+from blaze_client import BlazeClient
+
+##############################################################################
+# Description: On-disk cache for the BLAZE catalog endpoints (products,
+# vendors, brands). The raw records of each call are kept as gzipped json
+# with the time they were fetched. Within the endpoint's TTL a call is
+# served from disk without touching the network. Past the TTL, endpoints
+# that take a modified-since filter only pull the records changed since the
+# newest 'modified' in the cache and upsert them by id; the others are
+# pulled in full. force=True always pulls in full. Every other endpoint is
+# passed straight through to the wrapped client.
+##############################################################################
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.kc_blaze_cache')
+CATALOG_TTLS = {
+    'products': timedelta(hours=12),
+    'vendors': timedelta(days=1),
+    'store/inventory/brands': timedelta(days=1)
+    }
+# endpoints that filter on records modified after an epoch ms timestamp
+DELTA_PARAMS = {'products': 'startDate'}
+
+
+class CachedBlazeClient:
+    """BlazeClient with a TTL cache in front of the catalog endpoints.
+
+    Args:
+        client (BlazeClient, optional): client to fetch with. Defaults to
+        a new client.
+        cache_dir (str, optional): cache directory. Defaults to CACHE_DIR.
+        ttls (dict, optional): endpoint -> timedelta, the endpoints to
+        cache. Defaults to CATALOG_TTLS.
+        delta_params (dict, optional): endpoint -> modified-since param.
+        Defaults to DELTA_PARAMS.
+        force (bool, optional): ignore cached records and pull everything
+        again. Defaults to False.
+    """
+
+    def __init__(
+            self, client: BlazeClient = None, cache_dir: str = CACHE_DIR,
+            ttls: dict = CATALOG_TTLS, delta_params: dict = DELTA_PARAMS,
+            force: bool = False
+            ):
+        self.client = client or BlazeClient()
+        self.cache_dir = cache_dir
+        self.ttls = ttls
+        self.delta_params = delta_params
+        self.force = force
+        self.stats = {'hit': 0, 'delta': 0, 'miss': 0}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _path(self, endpoint: str, params: dict, offset_param: str) -> str:
+        key = json.dumps([endpoint, params or {}, offset_param], sort_keys=True)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{endpoint.replace('/', '_')}-{digest}.json.gz")
+
+    def _load(self, path: str) -> dict:
+        if self.force or not os.path.exists(path):
+            return None
+        with gzip.open(path, 'rt') as f:
+            return json.load(f)
+
+    def _save(self, path: str, entry: dict) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with gzip.open(path + '.tmp', 'wt') as f:
+            json.dump(entry, f)
+        os.replace(path + '.tmp', path)
+
+    def fetch_all(
+            self, endpoint: str, params: dict = None, offset_param: str = 'skip',
+            page_size: int = None
+            ) -> pd.DataFrame:
+        """All records of an endpoint, from the cache when still fresh.
+
+        Same arguments as BlazeClient.fetch_all().
+
+        Returns:
+            pd.DataFrame: one row per record
+        """
+        if endpoint not in self.ttls:
+            return self.client.fetch_all(endpoint, params, offset_param, page_size)
+        path = self._path(endpoint, params, offset_param)
+        entry = self._load(path)
+        now = time.time()
+
+        if entry and now - entry['fetched_at'] < self.ttls[endpoint].total_seconds():
+            outcome = 'hit'
+        elif entry and endpoint in self.delta_params:
+            outcome = 'delta'
+            since = max(
+                (x.get('modified') or 0 for x in entry['records']),
+                default=int(entry['fetched_at'] * 1000)
+                )
+            changed = chain.from_iterable(self.client.iter_pages(
+                endpoint, dict(params or {}, **{self.delta_params[endpoint]: since}),
+                offset_param, page_size
+                ))
+            records = {x.get('id'): x for x in entry['records']}
+            records.update((x.get('id'), x) for x in changed)
+            entry = {'fetched_at': now, 'records': list(records.values())}
+        else:
+            outcome = 'miss'
+            entry = {'fetched_at': now, 'records': list(chain.from_iterable(
+                self.client.iter_pages(endpoint, params, offset_param, page_size)
+                ))}
+        if outcome != 'hit':
+            self._save(path, entry)
+        self.stats[outcome] += 1
+        logger.info(
+            'blaze cache %s: %s (%d records)', outcome, endpoint, len(entry['records'])
+            )
+        return pd.DataFrame.from_records(entry['records'])
@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import chain, islice
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from checkpoint import Checkpoint
+
+##############################################################################
+# Description: Client for the BLAZE partner API. Keeps one pooled
+# requests.Session for every call, reads total/limit from the first page of
+# a paged endpoint and then fetches the remaining pages concurrently, with
+# at most max_workers requests in flight. Records from all pages are built
+# into a single DataFrame at the end rather than concatenated page by page.
+# Long pulls can checkpoint each page as it arrives (see checkpoint.py), so
+# a rerun after a failed request only fetches the pages that are missing.
+##############################################################################
+
+BASE_URL = 'https://api.partners.blaze.me/api/v1/partner'
+
+
+class BlazeAPIError(Exception):
+    """Non-2xx response from the BLAZE API."""
+
+
+def in_order(pool: ThreadPoolExecutor, func, items, in_flight: int):
+    """pool.map that only submits in_flight calls ahead of the consumer.
+
+    Results are yielded in the order of items. A call that raises stops
+    any further submissions; the ones already submitted still run.
+    """
+    items = iter(items)
+    pending = deque(pool.submit(func, x) for x in islice(items, in_flight))
+    while pending:
+        future = pending.popleft()
+        for x in islice(items, 1):
+            pending.append(pool.submit(func, x))
+        yield future.result()
+
+
+class BlazeClient:
+    """Pooled, concurrent pager for the BLAZE partner API.
+
+    Args:
+        partner_key (str, optional): partner key. Defaults to the
+        blz_partner_key env var.
+        api_key (str, optional): store api key. Defaults to the
+        blz_api_key env var.
+        base_url (str, optional): api root. Defaults to BASE_URL.
+        max_workers (int, optional): max requests in flight. Defaults to 4.
+        timeout (float, optional): seconds per request. Defaults to 60.
+    """
+
+    def __init__(
+            self, partner_key: str = None, api_key: str = None,
+            base_url: str = BASE_URL, max_workers: int = 4,
+            timeout: float = 60
+            ):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'partner_key': partner_key or os.getenv('blz_partner_key'),
+            'Authorization': api_key or os.getenv('blz_api_key')
+            })
+
+    def get(self, endpoint: str, params: dict = None) -> dict:
+        """GET an endpoint and return the decoded json.
+
+        Args:
+            endpoint (str): path under the api root, ex: 'products'
+            params (dict, optional): query params. Defaults to None.
+
+        Raises:
+            BlazeAPIError: on a non-2xx response
+
+        Returns:
+            dict: response json
+        """
+        response = self.session.get(
+            f'{self.base_url}/{endpoint}', params=params, timeout=self.timeout
+            )
+        if not response.ok:
+            raise BlazeAPIError(
+                f'Error retrieving {endpoint} with params {params} -- '
+                f'status code {response.status_code}: {response.reason}'
+                )
+        return response.json()
+
+    def iter_pages(
+            self, endpoint: str, params: dict = None, offset_param: str = 'skip',
+            page_size: int = None, checkpoint: Checkpoint = None
+            ):
+        """Yield the records of each page of a paged endpoint, in order.
+
+        Args:
+            endpoint (str): path under the api root
+            params (dict, optional): extra query params. Defaults to None.
+            offset_param (str, optional): name of the offset param, BLAZE
+            uses 'skip' on some endpoints and 'start' on others.
+            Defaults to 'skip'.
+            page_size (int, optional): sent as 'limit' when given.
+            Defaults to the api's page size.
+            checkpoint (Checkpoint, optional): pages already in it are not
+            fetched again, fetched pages are saved to it and it is cleared
+            after the last page. Defaults to None.
+
+        Raises:
+            BlazeAPIError: if a page could not be fetched. Only max_workers
+            pages are requested ahead of the one being yielded, and the
+            ones already in flight are still fetched and checkpointed first.
+
+        Yields:
+            list: records of one page
+        """
+        params = dict(params or {})
+        if page_size:
+            params['limit'] = page_size
+
+        def page(skip):
+            def fetch():
+                return self.get(endpoint, dict(params, **{offset_param: skip}))
+            return checkpoint.run(str(skip), fetch) if checkpoint else fetch()
+
+        first = page(0)
+        yield first.get('values') or []
+        total, limit = first.get('total') or 0, first.get('limit') or 0
+        if limit and limit < total:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pages = in_order(
+                    pool, page, range(limit, total, limit), self.max_workers
+                    )
+                for rest in pages:
+                    yield rest.get('values') or []
+        if checkpoint:
+            checkpoint.clear()
+
+    def fetch_all(
+            self, endpoint: str, params: dict = None, offset_param: str = 'skip',
+            page_size: int = None, checkpoint: Checkpoint = None
+            ) -> pd.DataFrame:
+        """All records of a paged endpoint as one DataFrame.
+
+        Args:
+            endpoint (str): path under the api root
+            params (dict, optional): extra query params. Defaults to None.
+            offset_param (str, optional): name of the offset param.
+            Defaults to 'skip'.
+            page_size (int, optional): sent as 'limit' when given.
+            Defaults to the api's page size.
+            checkpoint (Checkpoint, optional): see iter_pages().
+            Defaults to None.
+
+        Raises:
+            BlazeAPIError: if a page could not be fetched
+
+        Returns:
+            pd.DataFrame: one row per record
+        """
+        records = chain.from_iterable(
+            self.iter_pages(endpoint, params, offset_param, page_size, checkpoint)
+            )
+        return pd.DataFrame.from_records(list(records))
@@ -0,0 +1,363 @@
+import os
+import shutil
+import sqlite3
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from parsing import parse_money, parse_quantity
+
+##############################################################################
+# Description: Loads cleaned BLAZE COMPLETED_SALES_DETAILS exports into a
+# warehouse table. Rows are typed once (DATE, NUMERIC money, FLOAT quantity)
+# and sent to a sink in fixed-size chunks. Each sink stages the chunks and
+# then merges staging into the target keyed on Trans No., Product SKU and
+# Date, so re-running a load does not duplicate rows. BigQuerySink is the
+# production sink; SQLiteSink writes a local file for tests and benchmarks,
+# ParquetSink and CSVSink write a file export of the load.
+# Large exports are streamed: stream_sales() reads the csv in chunks and
+# cleans each one as it goes, so memory is bounded by the chunk size
+# rather than the size of the export.
+##############################################################################
+
+# source column -> warehouse column, in table order
+SALES_COLUMNS = {
+    'Date': 'Date',
+    'Trans No.': 'Trans_No_',
+    'Product SKU': 'Product_SKU',
+    'Product Name': 'Product_Name',
+    'Product Category': 'Product_Category',
+    'Brand Name': 'Brand_Name',
+    'Vendor': 'Vendor',
+    'Member': 'Member',
+    'Quantity Sold': 'Quantity_Sold',
+    'COGs': 'COGs',
+    'Retail Value': 'Retail_Value',
+    'Net Sales': 'Net_Sales',
+    'Subtotal': 'Subtotal',
+    'Total Discount': 'Total_Discount',
+    'Payment Type': 'Payment_Type',
+    'Promotion(s)': 'Promotion_s_',
+    'Marketing Source': 'Marketing_Source',
+    'Zip Code': 'Zip_Code',
+    'Date Joined': 'Date_Joined',
+    'Member ID': 'Member_ID',
+    'Quantity': 'Quantity',
+    'Units': 'Units'
+    }
+MONEY_COLS = ['COGs', 'Retail_Value', 'Net_Sales', 'Subtotal', 'Total_Discount']
+DATE_COLS = ['Date', 'Date_Joined']
+KEY_COLS = ['Trans_No_', 'Product_SKU', 'Date']
+# warehouse column -> BigQuery type, everything else is STRING
+COLUMN_TYPES = dict(
+    {c: 'DATE' for c in DATE_COLS},
+    **{c: 'NUMERIC' for c in MONEY_COLS},
+    Quantity='FLOAT64'
+    )
+
+
+def read_sales_export(path: str, chunk_size: int = None):
+    """Read a COMPLETED_SALES_DETAILS export with every column as str.
+
+    Reading as text keeps values as exported (zip codes keep leading
+    zeros) and gives every chunk the same dtypes regardless of the rows
+    in it.
+
+    Args:
+        path (str): csv export, with the BLAZE title row
+        chunk_size (int, optional): rows per chunk. Defaults to None, which
+        reads the whole file.
+
+    Returns:
+        pd.DataFrame, or an iterator of DataFrames when chunk_size is given
+    """
+    return pd.read_csv(path, skiprows=1, dtype=str, chunksize=chunk_size)
+
+
+def clean_sales(sls: pd.DataFrame) -> pd.DataFrame:
+    """Typed, renamed sales rows ready for a sink, deduplicated on KEY_COLS.
+
+    Args:
+        sls (pd.DataFrame): COMPLETED_SALES_DETAILS export as read from csv
+
+    Returns:
+        pd.DataFrame: one column per SALES_COLUMNS value, dates as
+        datetime64 at midnight, money and quantity as float, the rest str
+    """
+    sls = sls.copy()
+    sls['Member'] = sls['Member'].str.replace('[^a-zA-z ]', '', regex=True)
+    qty = parse_quantity(sls['Quantity Sold'])
+    sls['Quantity'], sls['Units'] = qty['quantity'], qty['unit']
+    sls = sls[list(SALES_COLUMNS)].rename(columns=SALES_COLUMNS)
+    for x in DATE_COLS:
+        sls[x] = pd.to_datetime(sls[x]).dt.normalize()
+    for x in MONEY_COLS:
+        sls[x] = parse_money(sls[x])
+    for x in sls.columns.difference(DATE_COLS + MONEY_COLS + ['Quantity']):
+        sls[x] = sls[x].astype(str).where(sls[x].notna(), None)
+    return sls.drop_duplicates(subset=KEY_COLS).reset_index(drop=True)
+
+
+def iter_chunks(df: pd.DataFrame, chunk_size: int):
+    """Yield consecutive row slices of at most chunk_size rows."""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def unseen_keys(keys: np.ndarray, seen: set) -> np.ndarray:
+    """Mask of the keys not in seen, which are then added to it.
+
+    Args:
+        keys (np.ndarray): hashed row keys of the next chunk
+        seen (set): keys of the chunks before it, updated in place
+
+    Returns:
+        np.ndarray: True where the key is new
+    """
+    keys = keys.tolist()
+    new = np.fromiter((k not in seen for k in keys), dtype=bool, count=len(keys))
+    seen.update(keys)
+    return new
+
+
+def stream_sales(path: str, chunk_size: int = 50_000):
+    """Yield cleaned chunks of an export, the same rows as cleaning it whole.
+
+    Rows whose key was already seen in an earlier chunk are dropped; only
+    a 64 bit hash of each key is kept for that, in a set so each chunk is
+    checked in time proportional to its own size. A missing key column
+    hashes the same in every chunk, so such rows are deduplicated too.
+
+    Args:
+        path (str): csv export, with the BLAZE title row
+        chunk_size (int, optional): rows read per chunk. Defaults to 50_000.
+
+    Yields:
+        pd.DataFrame: clean_sales() output for the next rows of the export
+    """
+    seen = set()
+    for raw in read_sales_export(path, chunk_size):
+        chunk = clean_sales(raw)
+        new = unseen_keys(
+            pd.util.hash_pandas_object(chunk[KEY_COLS], index=False).to_numpy(), seen
+            )
+        if new.any():
+            yield chunk.loc[new]
+
+
+def load_sales(sales: pd.DataFrame, sink, chunk_size: int = 50_000) -> int:
+    """Stage cleaned sales in chunks, then merge them into the sink's table.
+
+    Args:
+        sales (pd.DataFrame): output of clean_sales()
+        sink (SQLiteSink, BigQuerySink, ParquetSink or CSVSink): destination
+        chunk_size (int, optional): rows per staged chunk. Defaults to 50_000.
+
+    Returns:
+        int: nbr of rows new to the target table
+    """
+    return load_chunks(iter_chunks(sales, chunk_size), sink)
+
+
+def load_chunks(chunks, sink) -> int:
+    """Stage each chunk of cleaned sales, then merge them into the sink.
+
+    Args:
+        chunks (iterable): DataFrames from clean_sales(), e.g. stream_sales()
+        sink (SQLiteSink, BigQuerySink, ParquetSink or CSVSink): destination
+
+    Returns:
+        int: nbr of rows new to the target
+    """
+    sink.reset_staging()
+    for chunk in chunks:
+        sink.stage(chunk)
+    return sink.merge()
+
+
+class SQLiteSink:
+    """Local sqlite table with the same columns and merge semantics.
+
+    Args:
+        path (str): sqlite database file
+        table (str, optional): target table. Defaults to 'kc_txns'.
+    """
+
+    sql_types = {'DATE': 'DATE', 'NUMERIC': 'NUMERIC', 'FLOAT64': 'REAL'}
+
+    def __init__(self, path: str, table: str = 'kc_txns'):
+        self.conn = sqlite3.connect(path)
+        self.table = table
+        self.staging = f'{table}_staging'
+        cols = ', '.join(
+            f'"{c}" {self.sql_types.get(COLUMN_TYPES.get(c), "TEXT")}'
+            for c in SALES_COLUMNS.values()
+            )
+        # NULLs are distinct in a unique index, so the keys are coalesced
+        # for rows with a missing SKU or date to be deduplicated as well
+        keys = ', '.join(f"ifnull(\"{c}\", '')" for c in KEY_COLS)
+        with self.conn:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+            self.conn.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}_key" ON "{table}" ({keys})'
+                )
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.staging}" ({cols})')
+
+    def reset_staging(self) -> None:
+        with self.conn:
+            self.conn.execute(f'DELETE FROM "{self.staging}"')
+
+    def stage(self, chunk: pd.DataFrame) -> None:
+        chunk = chunk.copy()
+        for x in DATE_COLS:
+            chunk[x] = chunk[x].dt.strftime('%Y-%m-%d')
+        chunk.to_sql(self.staging, self.conn, if_exists='append', index=False)
+
+    def merge(self) -> int:
+        with self.conn:
+            cur = self.conn.execute(
+                f'INSERT OR IGNORE INTO "{self.table}" SELECT * FROM "{self.staging}"'
+                )
+            self.conn.execute(f'DELETE FROM "{self.staging}"')
+        return cur.rowcount
+
+    def read(self) -> pd.DataFrame:
+        return pd.read_sql(f'SELECT * FROM "{self.table}"', self.conn)
+
+
+class BigQuerySink:
+    """BigQuery table loaded through a staging table and a MERGE.
+
+    Chunks are loaded into `<table>_staging` as parquet with the native
+    column types, then new (Trans_No_, Product_SKU, Date) rows are merged
+    into the target, which is created from the staging schema if needed.
+    A missing key column matches a missing one, as in SQLiteSink.
+
+    Args:
+        table_id (str): 'project.dataset.table'
+        credentials (optional): google credentials. Defaults to the
+        environment's.
+    """
+
+    def __init__(self, table_id: str, credentials=None):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        project = table_id.split('.')[0]
+        self.client = bigquery.Client(project=project, credentials=credentials)
+        self.table = table_id
+        self.staging = f'{table_id}_staging'
+        self.schema = [
+            bigquery.SchemaField(c, COLUMN_TYPES.get(c, 'STRING'))
+            for c in SALES_COLUMNS.values()
+            ]
+        self._first = True
+
+    def reset_staging(self) -> None:
+        self._first = True
+
+    def stage(self, chunk: pd.DataFrame) -> None:
+        chunk = chunk.copy()
+        for x in DATE_COLS:
+            chunk[x] = chunk[x].dt.date
+        for x in MONEY_COLS:
+            chunk[x] = chunk[x].map(lambda v: None if pd.isna(v) else Decimal(f'{v:.2f}'))
+        disposition = 'WRITE_TRUNCATE' if self._first else 'WRITE_APPEND'
+        job = self.client.load_table_from_dataframe(
+            chunk, self.staging,
+            job_config=self.bigquery.LoadJobConfig(
+                schema=self.schema, write_disposition=disposition
+                )
+            )
+        job.result()
+        self._first = False
+
+    def merge(self) -> int:
+        if self._first:
+            return 0
+        # NULL = NULL is never true, so missing keys are matched explicitly
+        on = ' AND '.join(
+            f'(T.{c} = S.{c} OR (T.{c} IS NULL AND S.{c} IS NULL))' for c in KEY_COLS
+            )
+        self.client.query(
+            f'CREATE TABLE IF NOT EXISTS `{self.table}` LIKE `{self.staging}`'
+            ).result()
+        job = self.client.query(f"""
+            MERGE `{self.table}` T
+            USING `{self.staging}` S
+            ON {on}
+            WHEN NOT MATCHED THEN INSERT ROW
+            """)
+        job.result()
+        return job.num_dml_affected_rows or 0
+
+
+class ParquetSink:
+    """Directory of parquet parts holding the rows of the last load.
+
+    Chunks are written to `<path>_staging` and swapped in by merge(), so a
+    failed load leaves the previous export in place.
+
+    Args:
+        path (str): output directory
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.staging = f'{path}_staging'
+        self.rows = 0
+
+    def reset_staging(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+        os.makedirs(self.staging)
+        self.rows = 0
+
+    def stage(self, chunk: pd.DataFrame) -> None:
+        part = len(os.listdir(self.staging))
+        chunk.to_parquet(
+            os.path.join(self.staging, f'part-{part:05d}.parquet'), index=False
+            )
+        self.rows += len(chunk)
+
+    def merge(self) -> int:
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.staging, self.path)
+        return self.rows
+
+    def read(self) -> pd.DataFrame:
+        return pd.read_parquet(self.path)
+
+
+class CSVSink:
+    """Single csv file holding the rows of the last load.
+
+    Args:
+        path (str): output csv
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.staging = f'{path}.staging'
+        self.rows = 0
+
+    def reset_staging(self) -> None:
+        if os.path.exists(self.staging):
+            os.remove(self.staging)
+        self.rows = 0
+
+    def stage(self, chunk: pd.DataFrame) -> None:
+        chunk = chunk.copy()
+        for x in chunk.columns.intersection(DATE_COLS):
+            chunk[x] = chunk[x].dt.strftime('%Y-%m-%d')
+        chunk.to_csv(self.staging, mode='a', header=not self.rows, index=False)
+        self.rows += len(chunk)
+
+    def merge(self) -> int:
+        if not self.rows:
+            return 0
+        os.replace(self.staging, self.path)
+        return self.rows
+
+    def read(self) -> pd.DataFrame:
+        return pd.read_csv(self.path, dtype=str)
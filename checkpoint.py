@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import shutil
+
+##############################################################################
+# Description: Checkpoints for long api pulls. Each completed unit of work
+# (a page offset, a date window) is written to its own gzipped json file as
+# soon as it arrives, so a pull that fails partway can be rerun and only
+# fetches the units that are missing. The checkpoint remembers the job it
+# belongs to (endpoint, params, date range) and starts over if a different
+# job is pointed at the same directory. Callers clear it once the pull has
+# been written to its destination.
+##############################################################################
+
+JOB_FILE = 'job.json'
+
+
+class Checkpoint:
+    """Directory of completed units of one extract job.
+
+    Args:
+        path (str): checkpoint directory, created if missing
+        job (dict): json-able description of the pull, ex: endpoint and
+        params. Units saved for a different job are discarded.
+    """
+
+    def __init__(self, path: str, job: dict):
+        self.path = path
+        self.job = json.loads(json.dumps(job, sort_keys=True, default=str))
+        job_file = os.path.join(path, JOB_FILE)
+        if os.path.exists(job_file):
+            with open(job_file) as f:
+                if json.load(f) != self.job:
+                    shutil.rmtree(path)
+        if not os.path.exists(job_file):
+            os.makedirs(path, exist_ok=True)
+            with open(job_file, 'w') as f:
+                json.dump(self.job, f)
+
+    def _file(self, unit: str) -> str:
+        return os.path.join(self.path, f"{str(unit).replace('/', '-')}.json.gz")
+
+    def __contains__(self, unit: str) -> bool:
+        return os.path.exists(self._file(unit))
+
+    def units(self) -> list:
+        """Units saved so far, in no particular order."""
+        return [
+            x[:-len('.json.gz')] for x in os.listdir(self.path) if x.endswith('.json.gz')
+            ]
+
+    def save(self, unit: str, data) -> None:
+        path = self._file(unit)
+        with gzip.open(path + '.tmp', 'wt') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def load(self, unit: str):
+        with gzip.open(self._file(unit), 'rt') as f:
+            return json.load(f)
+
+    def run(self, unit: str, fetch):
+        """The saved result of unit, else fetch() saved under unit.
+
+        Args:
+            unit (str): name of the unit of work, ex: a page offset
+            fetch (callable): no-arg function returning json-able data
+
+        Returns:
+            the data of unit
+        """
+        if unit in self:
+            return self.load(unit)
+        data = fetch()
+        self.save(unit, data)
+        return data
+
+    def clear(self) -> None:
+        """Remove the checkpoint, once the pull has been stored."""
+        shutil.rmtree(self.path, ignore_errors=True)
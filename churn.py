@@ -0,0 +1,167 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+##############################################################################
+# Description: Churn flagging shared by the segmentation and lifetime value
+# scripts. A churn policy maps customer segments (m_quant, af_quant) to the
+# number of days since last purchase after which the customer counts as
+# churned. None in a key matches any score, so {(None, None): 90} is a flat
+# 90 days and {(1, None): 120} gives the top monetary quintile 120 days.
+# The most specific key wins: (m, af), then (m, None), (None, af) and
+# (None, None). Segments a policy does not cover are never flagged.
+##############################################################################
+
+DEFAULT_POLICY = {(None, None): 90}
+SEGMENT_COLS = ['m_quant', 'af_quant']
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def policy_table(policy: dict) -> np.ndarray:
+    """Lookup table of churn days indexed by [m_quant, af_quant].
+
+    Index 0 on either axis stands for a missing score and only picks up
+    the wildcard entries.
+
+    Args:
+        policy (dict): {(m_quant, af_quant): days}
+
+    Returns:
+        np.ndarray: 6x6 float array, NaN where the policy has no entry
+    """
+    table = np.full((6, 6), np.nan)
+    for m in range(6):
+        for af in range(6):
+            for key in [(m, af), (m, None), (None, af), (None, None)]:
+                if key in policy:
+                    table[m, af] = policy[key]
+                    break
+    return table
+
+
+def churn_days(members: pd.DataFrame, policy: dict = DEFAULT_POLICY) -> np.ndarray:
+    """Churn window in days for each customer under a policy.
+
+    Args:
+        members (pd.DataFrame): one row per customer, with m_quant and
+        af_quant where the policy uses them
+        policy (dict, optional): churn policy. Defaults to DEFAULT_POLICY.
+
+    Returns:
+        np.ndarray: float days, NaN for segments the policy does not cover
+    """
+    idx = [
+        members[col].fillna(0).to_numpy(dtype='int64') if col in members
+        else np.zeros(len(members), dtype='int64')
+        for col in SEGMENT_COLS
+        ]
+    return policy_table(policy)[idx[0], idx[1]]
+
+
+def days_since(last_purchase: pd.Series, as_of: datetime) -> np.ndarray:
+    """Whole days between each last purchase and as_of, like timedelta.days"""
+    last = last_purchase.to_numpy(dtype='datetime64[ns]')
+    return np.floor((pd.Timestamp(as_of).to_datetime64() - last) / ONE_DAY)
+
+
+def flag_churn(last_purchase: pd.Series, days, as_of: datetime) -> np.ndarray:
+    """1 where the last purchase is at least `days` before as_of, else 0.
+
+    Args:
+        last_purchase (pd.Series): last purchase datetime per customer
+        days (int or array-like): churn window, per customer or for all
+        as_of (datetime): date churn is measured at
+
+    Returns:
+        np.ndarray: int8 churn flags
+    """
+    with np.errstate(invalid='ignore'):
+        return (days_since(last_purchase, as_of) >= days).astype('int8')
+
+
+def add_churn(
+        members: pd.DataFrame, policy: dict = DEFAULT_POLICY,
+        as_of: datetime = None, date: str = 'Last Purchase Date'
+        ) -> pd.DataFrame:
+    """Copy of members with churn_days and churn columns added.
+
+    Args:
+        members (pd.DataFrame): one row per customer
+        policy (dict, optional): churn policy. Defaults to DEFAULT_POLICY.
+        as_of (datetime, optional): date churn is measured at. Defaults to now.
+        date (str, optional): last purchase column. Defaults to
+        'Last Purchase Date'.
+
+    Returns:
+        pd.DataFrame: members with churn_days and churn
+    """
+    as_of = as_of or datetime.today()
+    out = members.copy()
+    out['churn_days'] = churn_days(out, policy)
+    out['churn'] = flag_churn(out[date], out['churn_days'].to_numpy(), as_of)
+    return out
+
+
+def churn_pivots(
+        members: pd.DataFrame, policies: dict, as_of: datetime = None,
+        columns: str = 'm_quant', date: str = 'Last Purchase Date'
+        ) -> pd.DataFrame:
+    """Churned customers by month of last purchase for several policies.
+
+    Days since last purchase is computed once and every policy is counted
+    in the same groupby.
+
+    Args:
+        members (pd.DataFrame): one row per customer with the segment
+        scores and last purchase date
+        policies (dict): {name: policy}
+        as_of (datetime, optional): date churn is measured at. Defaults to now.
+        columns (str, optional): segment column to pivot on. Defaults to
+        'm_quant'.
+        date (str, optional): last purchase column. Defaults to
+        'Last Purchase Date'.
+
+    Returns:
+        pd.DataFrame: churn counts indexed by (policy, year, month) with one
+        column per segment
+    """
+    as_of = as_of or datetime.today()
+    elapsed = days_since(members[date], as_of)
+    with np.errstate(invalid='ignore'):
+        flags = pd.DataFrame({
+            name: (elapsed >= churn_days(members, policy)).astype('int64')
+            for name, policy in policies.items()
+            }, index=members.index)
+    last = members[date]
+    counts = flags.groupby([
+        last.dt.year.rename('year'), last.dt.month.rename('month'), members[columns]
+        ]).sum()
+    counts.columns.name = 'policy'
+    return counts.stack().unstack(columns, fill_value=0).reorder_levels(
+        ['policy', 'year', 'month']
+        ).sort_index()
+
+
+def churn_pivot(
+        members: pd.DataFrame, policy: dict = DEFAULT_POLICY,
+        as_of: datetime = None, columns: str = 'm_quant',
+        date: str = 'Last Purchase Date'
+        ) -> pd.DataFrame:
+    """Churned customers by year and month of last purchase per segment.
+
+    Args:
+        members (pd.DataFrame): one row per customer
+        policy (dict, optional): churn policy. Defaults to DEFAULT_POLICY.
+        as_of (datetime, optional): date churn is measured at. Defaults to now.
+        columns (str, optional): segment column to pivot on. Defaults to
+        'm_quant'.
+        date (str, optional): last purchase column. Defaults to
+        'Last Purchase Date'.
+
+    Returns:
+        pd.DataFrame: churn counts indexed by (year, month)
+    """
+    return churn_pivots(
+        members, {'churn': policy}, as_of, columns=columns, date=date
+        ).loc['churn']
@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+##############################################################################
+# Description: One entry point for the reports. Each subcommand takes the
+# paths and as-of date of its run instead of the ones hardcoded in the
+# scripts, and only imports the modules it runs, so --help and the pandas
+# only reports start without loading the google, BLAZE or METRC clients.
+# Frames a command returns are written as csv under --out when given.
+#   python cli.py segmentation --sls-dir exports/ --as-of 2022-01-01 --out out/
+##############################################################################
+
+
+def _date(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _kwargs(args: argparse.Namespace, *names) -> dict:
+    """The given options that were set, so unset ones keep the defaults."""
+    return {n: getattr(args, n) for n in names if getattr(args, n) is not None}
+
+
+def segmentation(args):
+    from cust_segmentation import segment_customers
+    return segment_customers(**_kwargs(args, 'sls_dir', 'cache_dir', 'state_dir', 'as_of'))
+
+
+def clv(args):
+    from customer_lifetime_value import lifetime_value_report
+    return lifetime_value_report(**_kwargs(args, 'sls_dir', 'cache_dir', 'state_dir', 'as_of'))
+
+
+def routes(args):
+    from profit_per_route import profit_per_route, route_averages
+    df = profit_per_route(**_kwargs(args, 'sls_dir', 'cache_dir'))
+    return {'routes': df, 'route_averages': route_averages(df)}
+
+
+def line_items(args):
+    from cust_sls import line_item_sales
+    return {'line_items': line_item_sales(**_kwargs(args, 'sls_dir'))}
+
+
+def onfleet(args):
+    from sg_data_collection2 import onfleet_summary
+    return {'onfleet_summary': onfleet_summary(**_kwargs(args, 'data_dir', 'history_dir'))}
+
+
+def sourcing(args):
+    import logging
+    from sourcing_report import main
+    logging.basicConfig(level=logging.INFO)
+    return {'sales': main(args.force_refresh, **_kwargs(args, 'sls_file'))}
+
+
+def insert_sales(args):
+    from insert_cust_sls import insert_sales
+    inserted = insert_sales(**_kwargs(
+        args, 'path', 'table_id', 'credentials_file', 'chunk_size'
+        ))
+    print(f'{inserted} new rows')
+
+
+def query(args):
+    import sales_db
+    con = sales_db.connect(args.cache_dir, args.start, args.end, args.threads)
+    if args.sql:
+        df = sales_db.query(con, args.sql)
+        if not args.out:
+            print(df.to_string())
+        return {'query': df}
+    reports = {
+        'churn_piv': lambda: sales_db.churn_piv(con, **_kwargs(args, 'as_of')),
+        'new_cust_piv': lambda: sales_db.new_cust_piv(con),
+        'mkt_src': lambda: sales_db.mkt_src(con),
+        'routes': lambda: sales_db.routes(con)
+        }
+    frames = {name: reports[name]() for name in args.report or reports}
+    if not args.out:
+        for name, df in frames.items():
+            print(f'{name}\n{df.to_string()}\n')
+    return frames
+
+
+def metrc(args):
+    from metrc_completion import main
+    return {'metrc_completion': main()}
+
+
+def write_frames(frames: dict, out_dir: str) -> None:
+    """Write each frame to out_dir/<name>.csv.
+
+    Args:
+        frames (dict): name -> DataFrame
+        out_dir (str): directory to write to, created if missing
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in frames.items():
+        df.to_csv(os.path.join(out_dir, f'{name}.csv'))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='KC analytics reports')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def command(name, func, help):
+        p = sub.add_parser(name, help=help)
+        p.set_defaults(func=func)
+        p.add_argument('--out', help='write the resulting tables as csv here')
+        return p
+
+    def sales_dirs(p, state=False):
+        p.add_argument('--sls-dir', help='All Sales Report exports')
+        p.add_argument('--cache-dir', help='parquet sales cache')
+        if state:
+            p.add_argument('--state-dir', help='customer state')
+            p.add_argument(
+                '--as-of', type=_date,
+                help='YYYY-MM-DD recency and churn are measured at, later sales are left out'
+                )
+
+    sales_dirs(command('segmentation', segmentation, 'RFM segments and churn'), state=True)
+    sales_dirs(command('clv', clv, 'customer lifetime value and churn'), state=True)
+    sales_dirs(command('routes', routes, 'margin per delivery route'))
+
+    p = command('line-items', line_items, 'customer line item sales')
+    p.add_argument('--sls-dir', help='All Sales Report exports')
+
+    p = command('onfleet', onfleet, 'Onfleet daily summary history')
+    p.add_argument('--data-dir', help='Onfleet month folders')
+    p.add_argument('--history-dir', help='summary history')
+
+    p = command('sourcing', sourcing, 'BLAZE inventory sheet and line item sales')
+    p.add_argument('--sls-file', help='All Sales Report export')
+    p.add_argument(
+        '--force-refresh', action='store_true', help='ignore the catalog cache'
+        )
+
+    p = command('insert-sales', insert_sales, 'load a sales details export to BigQuery')
+    p.add_argument('path', nargs='?', help='sales details csv')
+    p.add_argument('--table-id', help='project.dataset.table')
+    p.add_argument('--credentials-file', help='service account json')
+    p.add_argument('--chunk-size', type=int)
+
+    p = command('query', query, 'SQL over the parquet sales cache')
+    p.add_argument('sql', nargs='?', help='query on line_items, orders or members')
+    p.add_argument('--cache-dir', required=True, help='parquet sales cache')
+    p.add_argument(
+        '--report', nargs='+', choices=['churn_piv', 'new_cust_piv', 'mkt_src', 'routes'],
+        help='predefined tables to build instead of sql, defaults to all'
+        )
+    p.add_argument('--start', help='first YYYY-MM month to read')
+    p.add_argument('--end', help='last YYYY-MM month to read')
+    p.add_argument('--as-of', type=_date, help='YYYY-MM-DD churn is measured at')
+    p.add_argument('--threads', type=int)
+
+    command('metrc', metrc, "complete the day's METRC deliveries")
+    return parser
+
+
+def main(argv: list = None) -> dict:
+    args = build_parser().parse_args(argv)
+    frames = args.func(args)
+    if frames and args.out:
+        write_frames(frames, args.out)
+    return frames
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,31 +1,55 @@
 import pandas as pd
-from glob import glob
-
-
-df = pd.DataFrame()
-for x in glob('/home/ted/Documents/kc/SLS-2020/*.csv'):
-    df = df.append(pd.read_csv(x, skiprows=1))
-df['Member'] = df['Member'].str.replace('^[a-zA-z]', '')
-df['Date'] = pd.to_datetime(df['Date']).dt.date
-df['Date Joined'] = pd.to_datetime(df['Date Joined']).dt.date
-df[['Quantity', 'Units']] = df['Quantity Sold'].str.split(' ', expand=True)
-df2 = df[['Date',
-          'Product Name',
-          'Product Category',
-          'Brand Name',
-          'Vendor',
-          'Member',
-          'Quantity Sold',
-          'COGs',
-          'Retail Value',
-          'Net Sales',
-          'Subtotal',
-          'Total Discount',
-          'Payment Type',
-          'Promotion(s)',
-          'Marketing Source',
-          'Zip Code',
-          'Date Joined',
-          'Member ID',
-          'Quantity',
-          'Units']]
+
+from instrument import stage
+from parsing import parse_quantity
+from sales_loader import load_sales_reports
+from sales_schema import MONEY_COLS, dollars
+
+SLS_DIR = '/home/ted/Documents/kc/SLS-2020'
+COLUMNS = ['Date',
+           'Product Name',
+           'Product Category',
+           'Brand Name',
+           'Vendor',
+           'Member',
+           'Quantity Sold',
+           'COGs',
+           'Retail Value',
+           'Net Sales',
+           'Subtotal',
+           'Total Discount',
+           'Payment Type',
+           'Promotion(s)',
+           'Marketing Source',
+           'Zip Code',
+           'Date Joined',
+           'Member ID',
+           'Quantity',
+           'Units']
+
+
+def line_item_sales(sls_dir: str = SLS_DIR) -> pd.DataFrame:
+    """Customer line item sales with quantities split from their units.
+
+    Args:
+        sls_dir (str, optional): All Sales Report exports. Defaults to SLS_DIR.
+
+    Returns:
+        pd.DataFrame: COLUMNS of every sale
+    """
+    with stage('load') as rec:
+        df = load_sales_reports(sls_dir)
+        df['Member'] = df['Member'].str.replace('^[a-zA-z]', '')
+        df['Date'] = pd.to_datetime(df['Date']).dt.date
+        df['Date Joined'] = pd.to_datetime(df['Date Joined']).dt.date
+        qty = parse_quantity(df['Quantity Sold'])
+        df['Quantity'], df['Units'] = qty['quantity'], qty['unit']
+        for col in df.columns.intersection(MONEY_COLS):
+            df[col] = dollars(df[col])
+        df2 = df[COLUMNS]
+        rec['rows_out'] = df2
+    return df2
+
+
+if __name__ == '__main__':
+    df2 = line_item_sales()
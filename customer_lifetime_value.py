@@ -1,39 +1,80 @@
+import numpy as np
 import pandas as pd
-from glob import glob
-import os
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from churn import flag_churn
+from customer_state import member_summary, sales_summary, sync_state
+from instrument import stage, traced
+from purchases import purchase_history
+from sales_cache import refresh_cache, read_cache
 
 month_map = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
 
-def gather_sales(sls_dir):
-    df = pd.DataFrame()
-    for x in glob(os.path.join(sls_dir, '*.csv')):
-        print(x)
-        df = df.append(pd.read_csv(x, skiprows=1))
-    df.Date = pd.to_datetime(df.Date)
-    df['Retail Value'] = df['Retail Value'].str.strip('$').astype('float')
-    df['Final Subtotal'] = df['Final Subtotal'].str.strip('$').astype('float')
+SLS_DIR = r'C:\Users\teddy\Documents\Python Scripts\KC\IC Data Collection\Data\All Sales Reports'
+CACHE_DIR = r'C:\Users\teddy\Documents\Python Scripts\KC\IC Data Collection\Data\All Sales Cache'
+STATE_DIR = r'C:\Users\teddy\Documents\Python Scripts\KC\IC Data Collection\Data\Customer State'
+
+@traced('load')
+def gather_sales(sls_dir, cache_dir, state_dir):
+    refresh_cache(sls_dir, cache_dir)
+    state = sync_state(state_dir, cache_dir)
+    df = read_cache(cache_dir)
     df['month'] = df.Date.dt.month
     df['year'] = df.Date.dt.year
-    return df
+    return df, state
 
-def cust_lifetime_value(df):
-    df = df.groupby(['Member ID', 'Member', 'Member Group', 'Date Joined']).agg({'Final Subtotal': 'sum', 'Date': 'max', 'Trans No.': 'nunique'})
+@traced('clv')
+def cust_lifetime_value(members):
+    df = members.rename(
+        columns={'monetary': 'Final Subtotal', 'last_purchase': 'Date', 'frequency': 'Trans No.'}
+        ).set_index(['Member ID', 'Member', 'Member Group', 'Date Joined'])[['Final Subtotal', 'Date', 'Trans No.']]
     return df.sort_values('Final Subtotal', ascending=False)
-sls_df = gather_sales(r'C:\Users\teddy\Documents\Python Scripts\KC\IC Data Collection\Data\All Sales Reports')
-sls_df = sls_df.drop_duplicates(subset=['Date', 'Trans No.', 'Product SKU', 'Net Sales'])
-sls_df = sls_df.sort_values(['Date', 'Member ID'])
-
-sls_by_mon = sls_df.groupby(['year', 'month', 'Member ID']).agg({'Date': 'max'}).reset_index()
-sls_by_mon['month'] = sls_by_mon['month'].map(month_map)
-
-sls_grp = sls_df.groupby(['Date', 'Member', 'Member ID']).agg({'Retail Value': 'sum'}).reset_index()
-sls_grp['date_diff'] = sls_grp.groupby('Member ID')['Date'].diff()
-sls_grp = sls_grp.sort_values(['Member ID', 'Member', 'Date'])
-sls_grp2 = sls_grp.groupby(['Member ID', 'Member']).agg({'Date': 'max'}).reset_index()
-sls_grp2['churn'] = sls_grp2.apply(lambda x: 'Y' if datetime.today() - x['Date'] >= timedelta(days=90) else 'N', axis=1)
-sls_grp2['month'] = sls_grp2['Date'].dt.month
-sls_grp2['year'] = sls_grp2['Date'].dt.year
-churn = sls_grp2.groupby(['year', 'month', 'churn']).count().reset_index()
-sls_df['date_diff'] = sls_df.groupby('Member ID')['Date'].diff().reset_index(drop=True)
-lt_val = cust_lifetime_value(sls_df)
\ No newline at end of file
+
+def lifetime_value_report(sls_dir=SLS_DIR, cache_dir=CACHE_DIR, state_dir=STATE_DIR, as_of=None):
+    """Lifetime value, churn by month of last purchase and purchase history.
+
+    Args:
+        sls_dir (str, optional): All Sales Report exports. Defaults to SLS_DIR.
+        cache_dir (str, optional): parquet sales cache. Defaults to CACHE_DIR.
+        state_dir (str, optional): customer state. Defaults to STATE_DIR.
+        as_of (datetime, optional): date churn is measured at, only sales
+        before it are counted. Defaults to now.
+
+    Returns:
+        dict: name -> DataFrame for lt_val, churn, sls_by_mon and sls_grp
+    """
+    as_of = as_of or datetime.today()
+    sls_df, cust_state = gather_sales(sls_dir, cache_dir, state_dir)
+
+    # lifetime value and churn come from the per member state, which is only
+    # updated with the sales added since the last run. It holds every cached
+    # sale, so for an as_of in the past they come from the sales before it
+    later = sls_df['Date'] >= as_of
+    if later.any():
+        sls_df = sls_df.loc[~later]
+        members = sales_summary(sls_df, value='Final Subtotal')
+    else:
+        members = member_summary(cust_state, value='Final Subtotal')
+    lt_val = cust_lifetime_value(members)
+    with stage('churn', members) as rec:
+        sls_grp2 = members[['Member ID', 'Member', 'last_purchase']].rename(columns={'last_purchase': 'Date'})
+        sls_grp2['churn'] = np.where(flag_churn(sls_grp2['Date'], 90, as_of), 'Y', 'N')
+        sls_grp2['month'] = sls_grp2['Date'].dt.month
+        sls_grp2['year'] = sls_grp2['Date'].dt.year
+        churn = sls_grp2.groupby(['year', 'month', 'churn']).count().reset_index()
+        rec['rows_out'] = churn
+
+    with stage('purchase_history', sls_df) as rec:
+        sls_df = sls_df.drop_duplicates(subset=['Date', 'Trans No.', 'Product SKU', 'Net Sales'])
+        sls_df = sls_df.sort_values(['Date', 'Member ID'])
+
+        sls_by_mon = sls_df.groupby(['year', 'month', 'Member ID'], observed=True).agg({'Date': 'max'}).reset_index()
+        sls_by_mon['month'] = sls_by_mon['month'].map(month_map)
+
+        sls_grp, _ = purchase_history(sls_df, value='Retail Value')
+        sls_grp = sls_grp.rename(columns={'day_btwn_purch': 'date_diff'})
+        rec['rows_out'] = sls_grp
+    return {'lt_val': lt_val, 'churn': churn, 'sls_by_mon': sls_by_mon, 'sls_grp': sls_grp}
+
+if __name__ == '__main__':
+    results = lifetime_value_report()
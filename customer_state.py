@@ -0,0 +1,362 @@
+import json
+import os
+from glob import glob
+
+import numpy as np
+import pandas as pd
+
+from purchases import purchase_history
+from sales_cache import DEDUP_COLS, file_fingerprint
+from sales_schema import apply_schema, cents, concat_schema
+
+##############################################################################
+# Description: Persisted per member state for lifetime value and churn.
+# Instead of regrouping the whole sales history every run, a members file
+# keeps running totals per member (money in cents, transactions, purchases,
+# first and last purchase and the sum of days between purchases), ledger
+# parts record the transactions already counted and a sorted index of
+# their Trans No. is kept next to them. A day of new sales only touches
+# the members in it and looks its transactions up in the index, so feeding
+# the same export twice changes nothing; a re-delivered transaction with
+# different amounts keeps its first version. The ledger itself is only
+# read back when sales land before a member's last purchase, to recompute
+# that member's purchase gaps. state.json names the files that make up the
+# state, plus the fingerprint of every cache partition already folded in;
+# it is swapped in last, so a run that dies half way leaves the previous
+# state intact. Syncing compares it with the cache itself, so rows added
+# by a refresh that was never synced are still picked up.
+##############################################################################
+
+TRANS_DIR = 'trans'
+MANIFEST = 'state.json'
+PARTITION_GLOB = os.path.join('year=*', 'month=*', 'sales.parquet')
+STATE_MONEY = ['Net Sales', 'Final Subtotal', 'Retail Value']
+ATTR_COLS = ['Member', 'Member Group', 'Date Joined', 'Marketing Source']
+LEDGER_COLS = ['Trans No.', 'Member ID', 'Date']
+COUNT_COLS = STATE_MONEY + ['frequency', 'purchases', 'gap_days']
+
+
+def _plain(s: pd.Series) -> pd.Series:
+    """Categorical column back to its category dtype, for stable keys."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype(s.cat.categories.dtype)
+    return s
+
+
+def _write(df: pd.DataFrame, path: str) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + '.tmp', index=False)
+    return path + '.tmp'
+
+
+def _load_manifest(state_dir: str) -> dict:
+    path = os.path.join(state_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'version': 0, 'members': None, 'ids': None, 'parts': [], 'partitions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _commit(
+        state_dir: str, manifest: dict, members: pd.DataFrame = None,
+        ledger: pd.DataFrame = None, ids: np.ndarray = None,
+        partitions: dict = None
+        ) -> None:
+    """Write the new state files, then swap in the manifest naming them."""
+    manifest = dict(manifest, version=manifest['version'] + 1)
+    version = manifest['version']
+    old = [manifest['members'], manifest['ids']]
+    if ledger is not None:
+        part = os.path.join(TRANS_DIR, f'part-{version:06d}.parquet')
+        os.replace(_write(ledger, os.path.join(state_dir, part)), os.path.join(state_dir, part))
+        manifest['parts'] = manifest['parts'] + [part]
+    if members is not None:
+        name = f'members-{version:06d}.parquet'
+        os.replace(_write(members, os.path.join(state_dir, name)), os.path.join(state_dir, name))
+        manifest['members'] = name
+    if ids is not None:
+        name = f'trans-ids-{version:06d}.npy'
+        with open(os.path.join(state_dir, name + '.tmp'), 'wb') as f:
+            np.save(f, ids)
+        os.replace(os.path.join(state_dir, name + '.tmp'), os.path.join(state_dir, name))
+        manifest['ids'] = name
+    if partitions:
+        manifest['partitions'] = {**manifest['partitions'], **partitions}
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    for name in old:
+        if name and name not in (manifest['members'], manifest['ids']):
+            os.remove(os.path.join(state_dir, name))
+
+
+def _load_members(state_dir: str, manifest: dict) -> pd.DataFrame:
+    if manifest['members'] is None:
+        return pd.DataFrame({
+            'Member ID': pd.Series(dtype='int64'),
+            **{c: pd.Series(dtype='float64') for c in COUNT_COLS},
+            'first_purchase': pd.Series(dtype='datetime64[ns]'),
+            'last_purchase': pd.Series(dtype='datetime64[ns]')
+            })
+    return pd.read_parquet(os.path.join(state_dir, manifest['members']))
+
+
+def _load_ledger(state_dir: str, manifest: dict) -> pd.DataFrame:
+    if not manifest['parts']:
+        trans = pd.DataFrame({c: pd.Series(dtype='int64') for c in LEDGER_COLS[:2]})
+        trans['Date'] = pd.Series(dtype='datetime64[ns]')
+        return trans
+    return pd.concat([
+        pd.read_parquet(os.path.join(state_dir, x)) for x in manifest['parts']
+        ], ignore_index=True)
+
+
+def _load_ids(state_dir: str, manifest: dict) -> np.ndarray:
+    """Sorted Trans No. of the ledger, memory mapped so a lookup only reads
+    the pages it touches."""
+    if manifest['ids'] is None:
+        return np.empty(0, dtype='int64')
+    return np.load(os.path.join(state_dir, manifest['ids']), mmap_mode='r')
+
+
+def _in_sorted(values: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Mask of the values found in the sorted ids."""
+    if not len(ids):
+        return np.zeros(len(values), dtype=bool)
+    pos = np.searchsorted(ids, values).clip(max=len(ids) - 1)
+    return ids[pos] == values
+
+
+def load_state(state_dir: str) -> tuple:
+    """Member state and transaction ledger, empty if none saved yet.
+
+    Args:
+        state_dir (str): directory holding the state
+
+    Returns:
+        tuple: (members, trans) DataFrames
+    """
+    manifest = _load_manifest(state_dir)
+    return _load_members(state_dir, manifest), _load_ledger(state_dir, manifest)
+
+
+def _order_stats(orders: pd.DataFrame, prev_last: pd.Series = None) -> pd.DataFrame:
+    """Purchase count, first/last purchase and summed gap days per member.
+
+    orders holds distinct (Member ID, Date) purchases sorted by both. With
+    prev_last (the member's last purchase before these orders) the gap from
+    it to the first order is counted too.
+    """
+    first = orders['Member ID'].ne(orders['Member ID'].shift()).to_numpy()
+    gap = orders['Date'].diff().dt.days.to_numpy(dtype='float64')
+    bridge = np.zeros(len(orders))
+    if prev_last is not None:
+        bridge = (orders['Date'] - prev_last).dt.days.fillna(0).to_numpy()
+    gap = np.where(first, bridge, gap)
+    return orders.assign(gap_days=gap).groupby('Member ID', sort=True).agg(
+        purchases=('Date', 'size'),
+        first_purchase=('Date', 'min'),
+        last_purchase=('Date', 'max'),
+        gap_days=('gap_days', 'sum')
+        )
+
+
+def _counted(sales: pd.DataFrame) -> pd.DataFrame:
+    """Line items the state counts: with a Member ID, Date and Trans No.,
+    deduplicated on DEDUP_COLS."""
+    items = sales.loc[
+        sales['Member ID'].notna() & sales['Date'].notna() & sales['Trans No.'].notna()
+        ]
+    return items.drop_duplicates(subset=[c for c in DEDUP_COLS if c in items])
+
+
+def update_state(
+        state_dir: str, sales: pd.DataFrame, partitions: dict = None
+        ) -> pd.DataFrame:
+    """Fold new sales line items into the saved member state.
+
+    Line items without a Member ID, Date or Trans No. are not counted, nor
+    are transactions already in the ledger.
+
+    Args:
+        state_dir (str): directory holding the state, created if needed
+        sales (pd.DataFrame): new sales line items
+        partitions (dict, optional): fingerprints of the cache partitions
+        sales came from, recorded as applied with the state. Defaults to
+        None.
+
+    Returns:
+        pd.DataFrame: updated member state, one row per Member ID
+    """
+    manifest = _load_manifest(state_dir)
+    members = _load_members(state_dir, manifest)
+    if sales.empty:
+        if partitions:
+            _commit(state_dir, manifest, partitions=partitions)
+        return members
+    items = _counted(sales)
+    ids = _load_ids(state_dir, manifest)
+    items = items.loc[~_in_sorted(items['Trans No.'].to_numpy(dtype='int64'), ids)]
+    if items.empty:
+        if partitions:
+            _commit(state_dir, manifest, partitions=partitions)
+        return members
+    items = items.assign(**{
+        'Member ID': _plain(items['Member ID']),
+        **{c: cents(items[c]) for c in STATE_MONEY if c in items}
+        })
+
+    prev = members.set_index('Member ID')
+    orders = items[['Member ID', 'Date']].drop_duplicates().sort_values(
+        ['Member ID', 'Date'], ignore_index=True
+        )
+    prev_last = pd.Series(
+        prev['last_purchase'].reindex(orders['Member ID']).to_numpy(), index=orders.index
+        )
+    late = orders.loc[orders['Date'] <= prev_last, 'Member ID'].unique()
+
+    batch = items.groupby('Member ID', sort=True).agg(**{
+        **{c: (c, 'sum') for c in STATE_MONEY if c in items},
+        'frequency': ('Trans No.', 'nunique')
+        }).join(_order_stats(orders, prev_last))
+    attr_cols = [c for c in ATTR_COLS if c in items]
+    attrs = items.sort_values('Date', kind='stable').drop_duplicates(
+        'Member ID', keep='last'
+        ).set_index('Member ID')[attr_cols]
+
+    state = prev.reindex(prev.index.union(batch.index))
+    counts = [c for c in COUNT_COLS if c in batch]
+    state[counts] = state[counts].fillna(0).add(
+        batch[counts].reindex(state.index, fill_value=0)
+        )
+    was_last = state['last_purchase'].reindex(batch.index)
+    for col, agg in [('first_purchase', 'min'), ('last_purchase', 'max')]:
+        state[col] = pd.concat(
+            [state[col], batch[col].reindex(state.index)], axis=1
+            ).agg(agg, axis=1)
+    # attributes follow the most recent sale
+    newer = batch.index[(was_last.isna() | (batch['last_purchase'] >= was_last)).to_numpy()]
+    for col in attr_cols:
+        value = _plain(attrs[col])
+        if col not in state:
+            state[col] = pd.Series(dtype=value.dtype)
+        state.loc[newer, col] = value.loc[newer]
+
+    ledger = items[LEDGER_COLS].drop_duplicates()
+    new_ids = np.unique(ledger['Trans No.'].to_numpy(dtype='int64'))
+    ids = np.insert(ids, np.searchsorted(ids, new_ids), new_ids)
+    if len(late):
+        # gaps of members with out of order sales come from the ledger,
+        # the only time it is read back
+        trans = _load_ledger(state_dir, manifest)
+        history = pd.concat([trans, ledger], ignore_index=True)
+        history = history.loc[history['Member ID'].isin(late), ['Member ID', 'Date']]
+        redo = _order_stats(history.drop_duplicates().sort_values(['Member ID', 'Date']))
+        state.loc[redo.index, redo.columns] = redo
+
+    state = state.reset_index()
+    # the ledger part and members file only count once the manifest naming
+    # them is in place
+    _commit(state_dir, manifest, state, ledger, ids, partitions)
+    return state
+
+
+def _partition_fingerprints(cache_dir: str, applied: dict) -> tuple:
+    """Cache partitions that changed since they were applied.
+
+    Returns:
+        tuple: (fingerprints of every changed partition, paths of those
+        whose content is new to the state)
+    """
+    changed, unread = {}, []
+    for path in sorted(glob(os.path.join(cache_dir, PARTITION_GLOB))):
+        key = os.path.relpath(path, cache_dir)
+        entry = applied.get(key)
+        stat = os.stat(path)
+        if entry and (entry['size'], entry['mtime']) == (stat.st_size, stat.st_mtime):
+            continue
+        fp = file_fingerprint(path)
+        changed[key] = fp
+        if not entry or entry['sha256'] != fp['sha256']:
+            unread.append(path)
+    return changed, unread
+
+
+def sync_state(state_dir: str, cache_dir: str) -> pd.DataFrame:
+    """Bring the state up to date with the parquet sales cache.
+
+    Every cache partition new or changed since the state last saw it is
+    read, whoever refreshed the cache, and transactions already in the
+    ledger are skipped, so a month rewritten with a few new rows only adds
+    those. The first run builds the state from the whole cache.
+
+    Args:
+        state_dir (str): directory holding the state
+        cache_dir (str): root of the parquet sales cache
+
+    Returns:
+        pd.DataFrame: updated member state
+    """
+    changed, unread = _partition_fingerprints(
+        cache_dir, _load_manifest(state_dir)['partitions']
+        )
+    # fingerprints are taken before reading, a partition rewritten in
+    # between is just read again next time
+    if unread:
+        sales = concat_schema([apply_schema(pd.read_parquet(x)) for x in unread])
+    else:
+        sales = pd.DataFrame()
+    return update_state(state_dir, sales, changed)
+
+
+def member_summary(state: pd.DataFrame, value: str = 'Net Sales') -> pd.DataFrame:
+    """Member state in the shape of purchases.purchase_history() members.
+
+    Args:
+        state (pd.DataFrame): member state from update_state()
+        value (str, optional): money column to report as monetary. Defaults
+        to 'Net Sales'.
+
+    Returns:
+        pd.DataFrame: Member ID, member attributes, monetary, frequency,
+        purchases, first_purchase, last_purchase and avg_days_btwn_purch
+    """
+    out = state[['Member ID'] + [c for c in ATTR_COLS if c in state]].copy()
+    out['monetary'] = state[value] / 100
+    out['frequency'] = state['frequency'].astype('int64')
+    out['purchases'] = state['purchases'].astype('int64')
+    out['first_purchase'] = state['first_purchase']
+    out['last_purchase'] = state['last_purchase']
+    n_gaps = out['purchases'] - 1
+    out['avg_days_btwn_purch'] = (state['gap_days'] / n_gaps).where(n_gaps > 0)
+    return out
+
+
+def sales_summary(sales: pd.DataFrame, value: str = 'Net Sales') -> pd.DataFrame:
+    """member_summary() worked out from sales line items, nothing saved.
+
+    For reports as of a past date: the saved state holds every cached
+    sale, so the members as of that date come from the sales before it.
+    Line items are counted as update_state() counts them.
+
+    Args:
+        sales (pd.DataFrame): sales line items
+        value (str, optional): money column to report as monetary. Defaults
+        to 'Net Sales'.
+
+    Returns:
+        pd.DataFrame: same columns as member_summary()
+    """
+    items = _counted(sales)
+    items = items.assign(**{'Member ID': _plain(items['Member ID'])})
+    _, members = purchase_history(items, ['Member ID'], value)
+    attr_cols = [c for c in ATTR_COLS if c in items]
+    attrs = items.sort_values('Date', kind='stable').drop_duplicates(
+        'Member ID', keep='last'
+        )[['Member ID'] + attr_cols]
+    out = attrs.merge(members, how='right', on='Member ID')
+    for col in attr_cols:
+        out[col] = _plain(out[col])
+    return out
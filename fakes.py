@@ -0,0 +1,250 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+##############################################################################
+# Description: Local stand-ins for the external services the scripts talk
+# to, for exercising the clients and benchmarks without credentials.
+# FakeBlazeServer serves paged BLAZE partner API endpoints and
+# FakeMetrcServer the METRC sales delivery endpoints, both on localhost.
+# FakeSpread is an in-memory Google Sheets spreadsheet.
+##############################################################################
+
+
+class FakeServer:
+    """Threaded json http server on a local port, used as a context manager.
+
+    Subclasses implement handle(method, path, query, body) returning
+    (status, body). Every request is recorded in self.requests.
+
+    Args:
+        latency (float, optional): seconds to sleep per request, to mimic
+        the round trip to the real api. Defaults to 0.
+    """
+
+    root = ''
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}{self.root}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, method: str, path: str, query: dict, body) -> tuple:
+        raise NotImplementedError
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def _serve(self):
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                path = url.path[len(fake.root):] if url.path.startswith(fake.root) else url.path
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with fake._lock:
+                    fake.requests.append((self.command, path.strip('/'), query, body))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, out = fake.handle(self.command, path.strip('/'), query, body)
+                payload = json.dumps(out).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_PUT = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeBlazeServer(FakeServer):
+    """Paged BLAZE partner API. base_url points at the api root so it can be
+    passed straight to BlazeClient.
+
+    Args:
+        data (dict): {endpoint path: list of records}, ex: {'products': [...]},
+            or a function of the query params returning the records
+        page_size (int, optional): max records per page. Defaults to 100.
+        latency (float, optional): seconds per request. Defaults to 0.
+        fail (callable, optional): fail(path, query) -> True to answer that
+            request with a 500. Defaults to None.
+    """
+
+    root = '/api/v1/partner'
+
+    def __init__(
+            self, data: dict, page_size: int = 100, latency: float = 0,
+            fail=None
+            ):
+        super().__init__(latency)
+        self.data = data
+        self.page_size = page_size
+        self.fail = fail
+
+    def handle(self, method, path, query, body):
+        if self.fail and self.fail(path, query):
+            return 500, {'message': 'internal error'}
+        if path not in self.data:
+            return 404, {'message': f'unknown endpoint {path}'}
+        records = self.data[path]
+        if callable(records):
+            records = records(query)
+        skip = int(query.get('skip', query.get('start', 0)))
+        limit = min(int(query.get('limit', self.page_size)), self.page_size)
+        return 200, {
+            'values': records[skip:skip + limit],
+            'skip': skip,
+            'limit': limit,
+            'total': len(records)
+            }
+
+
+class FakeMetrcServer(FakeServer):
+    """METRC sales delivery endpoints.
+
+    Serves the active deliveries list, delivery details with their package
+    transactions, and the complete endpoint. A PUT to complete is rejected
+    with 400 if it contains any id in reject_ids, and the first `flaky`
+    requests of any kind get a 500 to exercise retries.
+
+    Args:
+        deliveries (list): delivery records, each with 'Id', 'SalesDateTime'
+        and 'Transactions' (list of {'PackageLabel': ...})
+        reject_ids (set, optional): ids the complete endpoint refuses.
+        Defaults to none.
+        flaky (int, optional): nbr of leading requests to fail with 500.
+        Defaults to 0.
+        latency (float, optional): seconds per request. Defaults to 0.
+    """
+
+    def __init__(
+            self, deliveries: list, reject_ids: set = None, flaky: int = 0,
+            latency: float = 0
+            ):
+        super().__init__(latency)
+        self.deliveries = {d['Id']: d for d in deliveries}
+        self.reject_ids = set(reject_ids or ())
+        self.flaky = flaky
+        self.completed = {}
+
+    def handle(self, method, path, query, body):
+        with self._lock:
+            if self.flaky > 0:
+                self.flaky -= 1
+                return 500, {'Message': 'flaky'}
+        if method == 'GET' and path == 'sales/v1/deliveries/active':
+            active = [
+                {k: v for k, v in d.items() if k != 'Transactions'}
+                for i, d in self.deliveries.items() if i not in self.completed
+                ]
+            return 200, active
+        match = re.fullmatch(r'sales/v1/delivery/(\d+)', path)
+        if method == 'GET' and match:
+            delivery = self.deliveries.get(int(match.group(1)))
+            if delivery is None:
+                return 404, {'Message': 'delivery not found'}
+            return 200, delivery
+        if method == 'PUT' and path == 'sales/v1/deliveries/complete':
+            bad = [d['Id'] for d in body if d['Id'] in self.reject_ids]
+            if bad:
+                return 400, [{'row': i, 'message': f'Delivery {x} cannot be completed'}
+                             for i, x in enumerate(bad)]
+            with self._lock:
+                for d in body:
+                    self.completed[d['Id']] = d
+            return 200, None
+        return 404, {'Message': f'no route for {method} {path}'}
+
+
+class FakeWorksheet:
+    def __init__(self, title: str, sheet_id: int, rows: int = 1000, cols: int = 26):
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows
+        self.cols = cols
+        self.values = []
+
+
+class FakeSpreadsheet:
+    """In-memory stand-in for the gspread Spreadsheet behind a Spread.
+
+    Supports the calls gsheet_publisher makes and records each api round
+    trip in self.calls.
+    """
+
+    def __init__(self, sheet_id: str = 'fake-sheet', tabs: list = ('Sheet1',)):
+        self.id = sheet_id
+        self.calls = []
+        self._tabs = {t: FakeWorksheet(t, i) for i, t in enumerate(tabs)}
+
+    def worksheets(self):
+        self.calls.append('worksheets')
+        return list(self._tabs.values())
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        return self._tabs[title]
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self.calls.append('add_worksheet')
+        ws = self._tabs[title] = FakeWorksheet(title, len(self._tabs), rows, cols)
+        return ws
+
+    def batch_update(self, body: dict) -> dict:
+        self.calls.append('batch_update')
+        by_id = {ws.id: ws for ws in self._tabs.values()}
+        for req in body['requests']:
+            props = req['updateSheetProperties']['properties']
+            ws = by_id[props['sheetId']]
+            ws.rows = props['gridProperties']['rowCount']
+            ws.cols = props['gridProperties']['columnCount']
+            ws.values = [r[:ws.cols] for r in ws.values[:ws.rows]]
+        return {}
+
+    def values_batch_update(self, body: dict) -> dict:
+        self.calls.append('values_batch_update')
+        for item in body['data']:
+            title = item['range'].rsplit('!', 1)[0].strip("'")
+            ws = self._tabs[title]
+            if len(item['values']) > ws.rows:
+                raise ValueError(f'range exceeds grid limits of {title}')
+            ws.values = [list(r) for r in item['values']]
+        return {}
+
+
+class FakeSpread:
+    """gspread_pandas.Spread look-alike wrapping a FakeSpreadsheet."""
+
+    def __init__(self, spread: FakeSpreadsheet = None):
+        self.spread = spread or FakeSpreadsheet()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+##############################################################################
+# Description: Publishes a DataFrame split across several Google Sheets tabs
+# in one batch. The frame is partitioned once with a groupby through a
+# category -> tab map, every changed tab is resized and written in a single
+# batch update, and tabs whose content hash matches the last publish are
+# skipped. Works on a gspread_pandas Spread (through its .spread, the
+# underlying gspread Spreadsheet) or anything with the same methods.
+##############################################################################
+
+INVENTORY_TABS = {
+    'Flower': 'Flower',
+    'Oil Cartridges': 'Oil Cartridges',
+    'Concentrates': 'Conc/Extracts',
+    'Extracts': 'Conc/Extracts',
+    'Pre-rolls': 'Pre-rolls',
+    'Tinctures': 'Tinctures',
+    'Edibles': 'Edibles',
+    'Topicals': 'Topicals'
+    }
+PUBLISH_STATE = os.path.join(os.path.expanduser('~'), '.kc_gsheet_publish.json')
+
+
+def partition_tabs(
+        df: pd.DataFrame, tab_map: dict = INVENTORY_TABS,
+        by: str = 'category_name', all_tab: str = 'All'
+        ) -> dict:
+    """Split df into one frame per tab with a single groupby.
+
+    Args:
+        df (pd.DataFrame): rows to publish
+        tab_map (dict, optional): {value of `by`: tab}. Defaults to
+        INVENTORY_TABS.
+        by (str, optional): column to split on. Defaults to 'category_name'.
+        all_tab (str, optional): tab that gets every row, None for no such
+        tab. Defaults to 'All'.
+
+    Returns:
+        dict: {tab: DataFrame}, with an empty frame for mapped tabs that
+        have no rows so they still get cleared
+    """
+    tabs = {all_tab: df} if all_tab else {}
+    empty = df.iloc[0:0]
+    for tab in dict.fromkeys(tab_map.values()):
+        tabs[tab] = empty
+    for tab, frame in df.groupby(df[by].map(tab_map), sort=False):
+        tabs[tab] = frame
+    return tabs
+
+
+def frame_values(df: pd.DataFrame) -> list:
+    """Header plus rows as strings, blanks for missing values."""
+    body = df.astype(str).where(df.notna(), '')
+    return [[str(c) for c in df.columns]] + body.values.tolist()
+
+
+def content_hash(values: list) -> str:
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+def _load_state(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_state(path: str, state: dict) -> None:
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def publish_tabs(
+        spread, tabs: dict, state_path: str = PUBLISH_STATE, force: bool = False
+        ) -> list:
+    """Write changed tabs to the spreadsheet in one batch.
+
+    Each changed tab is resized to exactly its data, which drops any rows
+    left over from the last publish, and then all tabs are written with one
+    values_batch_update. Missing tabs are created first.
+
+    Args:
+        spread (gspread_pandas.Spread): spreadsheet to write to
+        tabs (dict): {tab: DataFrame}
+        state_path (str, optional): json file of content hashes from the
+        last publish, None to always write. Defaults to PUBLISH_STATE.
+        force (bool, optional): write every tab regardless of hashes.
+        Defaults to False.
+
+    Returns:
+        list: tabs that were written
+    """
+    sheet = spread.spread
+    state = _load_state(state_path)
+    last = state.get(sheet.id, {})
+    values = {tab: frame_values(df) for tab, df in tabs.items()}
+    hashes = {tab: content_hash(v) for tab, v in values.items()}
+    changed = [t for t in tabs if force or last.get(t) != hashes[t]]
+    if not changed:
+        return []
+
+    ws = {w.title: w for w in sheet.worksheets()}
+    for tab in changed:
+        if tab not in ws:
+            ws[tab] = sheet.add_worksheet(
+                title=tab, rows=len(values[tab]), cols=len(values[tab][0])
+                )
+    sheet.batch_update({'requests': [{
+        'updateSheetProperties': {
+            'properties': {
+                'sheetId': ws[tab].id,
+                'gridProperties': {
+                    'rowCount': len(values[tab]),
+                    'columnCount': max(len(values[tab][0]), 1)
+                    }
+                },
+            'fields': 'gridProperties(rowCount,columnCount)'
+            }
+        } for tab in changed]})
+    sheet.values_batch_update({
+        'valueInputOption': 'USER_ENTERED',
+        'data': [{'range': f"'{tab}'!A1", 'values': values[tab]} for tab in changed]
+        })
+
+    if state_path:
+        state[sheet.id] = dict(last, **{t: hashes[t] for t in changed})
+        _save_state(state_path, state)
+    return changed
@@ -1,80 +1,42 @@
-import pandas as pd
-from google.oauth2 import service_account
-import pandas_gbq as pdbq
-
-creds = service_account.Credentials.from_service_account_file(
-    '/home/ted/Documents/kc/cust_dash/bq-test-proj-349123-8e736b8a6e2d.json')
-
-sls = pd.read_csv(
-    '/home/ted/Documents/kc/cust_dash/COMPLETED_SALES_DETAILS_REPORT (2).csv', skiprows=1)
-
-sls['Member'] = sls['Member'].str.replace('[^a-zA-z ]', '')
-sls['Date'] = pd.to_datetime(sls['Date']).dt.date
-sls['Date Joined'] = pd.to_datetime(sls['Date Joined']).dt.date
-sls[['Quantity', 'Units']] = sls['Quantity Sold'].str.split(' ', expand=True)
-for x in ['COGs', 'Retail Value', 'Subtotal', 'Net Sales', 'Total Discount']:
-    sls[x] = sls[x].str.strip('$')
-sls2 = sls[['Date',
-            'Trans No.',
-            'Product Name',
-            'Product Category',
-            'Brand Name',
-            'Vendor',
-            'Member',
-            'Quantity Sold',
-            'COGs',
-            'Retail Value',
-            'Net Sales',
-            'Subtotal',
-            'Total Discount',
-            'Payment Type',
-            'Promotion(s)',
-            'Marketing Source',
-            'Zip Code',
-            'Date Joined',
-            'Member ID',
-            'Quantity',
-            'Units']]
-
-sls2['Date'] = pd.to_datetime(sls2['Date']).dt.date
-sls2['Date Joined'] = pd.to_datetime(sls2['Date Joined']).dt.date
-sls2 = sls2.astype({
-    'COGs': 'float',
-    'Retail Value': 'float',
-    'Net Sales': 'float',
-    'Subtotal': 'float',
-    'Total Discount': 'float',
-    'Quantity': 'float',
-    'Zip Code': str,
-    'Date': str,
-    'Date Joined': str
-})
-
-
-sls2.columns = ['Date',
-                'Trans_No_',
-                'Product_Name',
-                'Product_Category',
-                'Brand_Name',
-                'Vendor',
-                'Member',
-                'Quantity_Sold',
-                'COGs',
-                'Retail_Value',
-                'Net_Sales',
-                'Subtotal',
-                'Total_Discount',
-                'Payment_Type',
-                'Promotion_s_',
-                'Marketing_Source',
-                'Zip_Code',
-                'Date_Joined',
-                'Member_ID',
-                'Quantity',
-                'Units']
-
-
-project_id = 'bq-test-proj-349123'
-pdbq.to_gbq(
-    sls2, 'test_txn.kc_txns_2020_2021_2', project_id=project_id, if_exists='append'
-)
+from bq_loader import BigQuerySink, load_chunks, stream_sales
+from instrument import stage
+
+SLS_FILE = '/home/ted/Documents/kc/cust_dash/COMPLETED_SALES_DETAILS_REPORT (2).csv'
+TABLE_ID = 'bq-test-proj-349123.test_txn.kc_txns'
+CREDENTIALS_FILE = '/home/ted/Documents/kc/cust_dash/bq-test-proj-349123-8e736b8a6e2d.json'
+
+
+def insert_sales(
+        path: str = SLS_FILE, table_id: str = TABLE_ID,
+        credentials_file: str = CREDENTIALS_FILE, chunk_size: int = 50_000
+        ) -> int:
+    """Insert a sales details export into BigQuery.
+
+    Rows are loaded with typed DATE/NUMERIC columns, so they go to a new
+    table rather than the all-string kc_txns_2020_2021_2. Reruns only
+    insert rows whose (Trans No., Product SKU, Date) is not in the table
+    yet. The export is read and cleaned chunk_size rows at a time, so a
+    multi-year backfill fits in memory on the small workers.
+
+    Args:
+        path (str, optional): sales details csv. Defaults to SLS_FILE.
+        table_id (str, optional): project.dataset.table. Defaults to TABLE_ID.
+        credentials_file (str, optional): service account json. Defaults
+        to CREDENTIALS_FILE.
+        chunk_size (int, optional): rows per chunk. Defaults to 50_000.
+
+    Returns:
+        int: nbr of rows inserted
+    """
+    from google.oauth2 import service_account
+
+    creds = service_account.Credentials.from_service_account_file(credentials_file)
+    sink = BigQuerySink(table_id, credentials=creds)
+    with stage('upload') as rec:
+        inserted = load_chunks(stream_sales(path, chunk_size=chunk_size), sink)
+        rec['rows_out'] = inserted
+    return inserted
+
+
+if __name__ == '__main__':
+    print(f'{insert_sales()} new rows')
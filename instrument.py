@@ -0,0 +1,176 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+##############################################################################
+# Description: Stage timing for the analytics scripts. Wrap a stage in
+# `with stage('name') as rec:` or decorate a function with @traced('name')
+# and, when the KC_TRACE env var is set, each run writes a json trace with
+# the wall and cpu seconds, peak RSS growth, rows in and out and nbr of
+# HTTP requests of every stage. KC_TRACE is the directory traces go to
+# ('1' for ./traces). With KC_PROFILE=1 the top level stages also run
+# under cProfile and the slowest one is dumped next to the trace. When
+# KC_TRACE is unset every stage is a no-op.
+##############################################################################
+
+TRACE_ENV = 'KC_TRACE'
+PROFILE_ENV = 'KC_PROFILE'
+DEFAULT_DIR = 'traces'
+
+
+class _Trace:
+    """Stages recorded in this process and the HTTP request counter."""
+
+    def __init__(self, out_dir: str, profile: bool):
+        self.out_dir = out_dir
+        self.profile = profile
+        self.started = datetime.now()
+        self.stages = []
+        self.requests = 0
+        self.slowest = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # imported here so untraced runs do not load requests
+        import requests
+        send = requests.Session.send
+
+        # every BLAZE, METRC and google call goes through a requests session
+        def counted(session, *args, **kwargs):
+            with self._lock:
+                self.requests += 1
+            return send(session, *args, **kwargs)
+
+        requests.Session.send = counted
+        atexit.register(self.write)
+
+    @property
+    def open_stages(self) -> list:
+        if not hasattr(self._local, 'open'):
+            self._local.open = []
+        return self._local.open
+
+    def write(self) -> str:
+        if not self.stages:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        path = os.path.join(
+            self.out_dir, f"{script}-{self.started.strftime('%Y%m%d-%H%M%S')}.json"
+            )
+        with open(path, 'w') as f:
+            json.dump({
+                'script': script,
+                'started': self.started.isoformat(timespec='seconds'),
+                'stages': self.stages
+                }, f, indent=2, default=str)
+        if self.slowest:
+            self.slowest[1].dump_stats(path[:-len('.json')] + f'-{self.slowest[0]}.prof')
+        return path
+
+
+_trace = None
+
+
+def enabled() -> bool:
+    """Start tracing if KC_TRACE is set; True when tracing."""
+    global _trace
+    if _trace is None and os.getenv(TRACE_ENV):
+        out_dir = os.getenv(TRACE_ENV)
+        _trace = _Trace(
+            DEFAULT_DIR if out_dir == '1' else out_dir,
+            os.getenv(PROFILE_ENV, '') not in ('', '0')
+            )
+    return _trace is not None
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _rows(obj) -> int:
+    """Row count of a DataFrame/Series/array, an int as is, else None."""
+    if hasattr(obj, 'shape'):
+        return len(obj)
+    return obj if isinstance(obj, int) else None
+
+
+@contextmanager
+def stage(name: str, rows_in=None):
+    """Record one named stage of a script.
+
+    Args:
+        name (str): stage name, ex: 'load' or 'fetch_products'
+        rows_in (optional): a DataFrame going in, or its nbr of rows.
+        Defaults to None.
+
+    Yields:
+        dict: the stage record; set rec['rows_out'] to what the stage
+        produced. Only written anywhere when tracing is enabled.
+    """
+    rec = {'stage': name, 'rows_in': _rows(rows_in)}
+    if not enabled():
+        yield rec
+        return
+    trace = _trace
+    parents = trace.open_stages
+    rec['parent'] = parents[-1]['stage'] if parents else None
+    profiler = cProfile.Profile() if trace.profile and not parents else None
+    parents.append(rec)
+    requests_before, rss_before = trace.requests, _peak_rss_mb()
+    cpu, wall = time.process_time(), time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield rec
+    finally:
+        if profiler:
+            profiler.disable()
+        rec['wall_s'] = round(time.perf_counter() - wall, 4)
+        rec['cpu_s'] = round(time.process_time() - cpu, 4)
+        rss_after = _peak_rss_mb()
+        rec['peak_rss_delta_mb'] = (
+            None if rss_after is None else round(rss_after - rss_before, 1)
+            )
+        rec['http_requests'] = trace.requests - requests_before
+        rec['rows_out'] = _rows(rec.get('rows_out'))
+        parents.pop()
+        trace.stages.append(rec)
+        if profiler and (trace.slowest is None or rec['wall_s'] > trace.slowest[2]):
+            trace.slowest = (name, profiler, rec['wall_s'])
+
+
+def traced(name: str = None):
+    """Decorator running the function as a stage.
+
+    rows_in is taken from the first DataFrame argument and rows_out from
+    a DataFrame return value.
+
+    Args:
+        name (str, optional): stage name. Defaults to the function name.
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            rows_in = next((a for a in args if hasattr(a, 'shape')), None)
+            with stage(name or func.__name__, rows_in) as rec:
+                out = func(*args, **kwargs)
+                rec['rows_out'] = out
+                return out
+        return inner
+    return wrap
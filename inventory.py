@@ -0,0 +1,83 @@
+import pandas as pd
+
+##############################################################################
+# Description: Inventory summary for the sourcing report. Joins the BLAZE
+# product catalog to on hand batch quantities, vendors and brands. Batch
+# quantities are summed per product before the join, vendors and brands are
+# indexed by id once and looked up with reindex, and the category name and
+# flower tier price are read out of the nested product fields with the str
+# accessor rather than a python lambda per row. The output matches the
+# original merge/groupby chain column for column.
+##############################################################################
+
+SUMMARY_KEYS = [
+    'brandId', 'vendorId', 'productId', 'sku', 'category_name', 'name', 'unitPrice'
+    ]
+# flower is priced by weight tier, the summary uses the second tier
+FLOWER_TIER = 1
+
+
+def product_prices(products: pd.DataFrame) -> pd.DataFrame:
+    """Products with category_name and the flower tier unitPrice filled in.
+
+    Args:
+        products (pd.DataFrame): products from the BLAZE api
+
+    Returns:
+        pd.DataFrame: copy of products; flower without the tier price gets
+        a NaN unitPrice
+    """
+    products = products.copy()
+    products['category_name'] = products['category'].str.get('name').infer_objects()
+    flower = products['category_name'] == 'Flower'
+    products.loc[flower, 'unitPrice'] = products.loc[flower, 'priceRanges'].str.get(
+        FLOWER_TIER
+        ).str.get('price')
+    return products
+
+
+def _lookup(left: pd.DataFrame, right: pd.DataFrame, on: str) -> pd.DataFrame:
+    """Left join of left[on] against right indexed by its unique key.
+
+    Overlapping column names get the same _x/_y suffixes merge() gives.
+    """
+    found = right.reindex(left[on].to_numpy()).reset_index(drop=True)
+    overlap = left.columns.intersection(found.columns)
+    return pd.concat([
+        left.rename(columns={c: f'{c}_x' for c in overlap}).reset_index(drop=True),
+        found.rename(columns={c: f'{c}_y' for c in overlap})
+        ], axis=1)
+
+
+def inventory_summary(
+        products: pd.DataFrame, batch_qty: pd.DataFrame, vendors: pd.DataFrame,
+        brands: pd.DataFrame
+        ) -> pd.DataFrame:
+    """On hand quantity and value per product, with vendor and brand fields.
+
+    Only products with batch quantities and every SUMMARY_KEYS field set
+    are kept, sorted by SUMMARY_KEYS.
+
+    Args:
+        products (pd.DataFrame): products from the BLAZE api
+        batch_qty (pd.DataFrame): batch quantities with productId, quantity
+        vendors (pd.DataFrame): vendors with id and vendor_name
+        brands (pd.DataFrame): brands with brand_id and brand_name
+
+    Returns:
+        pd.DataFrame: SUMMARY_KEYS, ohq, the vendor and brand columns and
+        onhand($)
+    """
+    qty = batch_qty.groupby('productId', sort=False)['quantity'].sum()
+    products = product_prices(products.drop_duplicates('id'))
+    products['quantity'] = qty.reindex(products['id']).to_numpy()
+    summ = products.rename(columns={'id': 'productId'})[
+        SUMMARY_KEYS + ['quantity']
+        ].dropna(subset=SUMMARY_KEYS + ['quantity'])
+    summ = summ.sort_values(SUMMARY_KEYS, ignore_index=True)
+
+    summ = _lookup(summ, vendors.set_index('id', drop=False), 'vendorId')
+    summ = _lookup(summ, brands.set_index('brand_id', drop=False), 'brandId')
+    summ = summ.rename(columns={'quantity': 'ohq'})
+    summ['onhand($)'] = summ['ohq'] * summ['unitPrice']
+    return summ
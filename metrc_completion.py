@@ -1,56 +1,243 @@
-import re
-import pandas as pd
+import asyncio
 import os
+import time
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
+from instrument import stage
+
+##############################################################################
+# Description: Completes the day's active METRC sales deliveries. Delivery
+# details are fetched concurrently under a rate limit, the completions are
+# sent as multi-delivery PUTs, and failed requests are retried with
+# exponential backoff. If METRC rejects a batch, its deliveries are retried
+# one at a time so a single bad manifest does not hold up the rest. Returns
+# one result row per delivery.
+##############################################################################
+
+BASE_URL = 'https://api-or.metrc.com'
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RESULT_COLS = ['Id', 'status', 'status_code', 'error']
+
+
+def metrc_session(api_key: str = None, pool_size: int = 8) -> requests.Session:
+    """Session with METRC auth headers and a connection pool.
+
+    Args:
+        api_key (str, optional): base64 'vendor:user' key. Defaults to the
+        metrc_api_key env var.
+        pool_size (int, optional): max pooled connections. Defaults to 8.
+
+    Returns:
+        requests.Session: session for METRC calls
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Authorization': f"Basic {api_key or os.getenv('metrc_api_key', '')}"
+        })
+    return session
+
+
+class MetrcAPIError(Exception):
+    """Non-2xx response from the METRC API."""
+
+
 def get_active_deliveries(
-        start_date: datetime=datetime.today().strftime('%m/%d/%Y'),
-        end_date: datetime=None
+        start_date: str = None, end_date: str = None,
+        session: requests.Session = None, base_url: str = BASE_URL,
+        license_number: str = None
         ) -> pd.DataFrame:
+    """Active sales deliveries for the facility.
 
-    url = "https://api-or.metrc.com/sales/v1/deliveries/active"
+    Args:
+        start_date (str, optional): first sales date, mm/dd/yyyy. Defaults
+        to today.
+        end_date (str, optional): last sales date. Defaults to None.
+        session (requests.Session, optional): METRC session. Defaults to
+        metrc_session().
+        base_url (str, optional): api root. Defaults to BASE_URL.
+        license_number (str, optional): facility license. Defaults to the
+        metrc_license env var.
 
-    headers = {
-    'Authorization': 'Basic '
-    }
-    params = {'licenseNumber': '', 'salesDateStart': start_date, 'salesDateEnd': end_date}
+    Raises:
+        MetrcAPIError: on a non-2xx response
 
-    response = requests.get(url, headers=headers, params=params)
-    if response.ok:
-        return pd.json_normalize(response.json())
-    else:
-        return (
-            f'Error retrieving Active Deliveries --'
-            f'Error code: {response.status_code} with reason {response.reason}'
+    Returns:
+        pd.DataFrame: one row per active delivery
+    """
+    session = session or metrc_session()
+    params = {
+        'licenseNumber': license_number or os.getenv('metrc_license', ''),
+        'salesDateStart': start_date or datetime.today().strftime('%m/%d/%Y'),
+        'salesDateEnd': end_date
+        }
+    response = session.get(
+        f'{base_url}/sales/v1/deliveries/active', params=params, timeout=60
+        )
+    if not response.ok:
+        raise MetrcAPIError(
+            f'Error retrieving Active Deliveries -- '
+            f'status code {response.status_code}: {response.reason}'
             )
+    return pd.json_normalize(response.json())
 
-def complete_deliveries(row: pd.Series) -> None:
-    d = {'Id': row['Id'], 'ActualArrivalDateTime': row['SalesDateTime']}
-    
-    url = f"https://api-or.metrc.com//sales/v1/delivery/{d['Id']}"
-    headers = {
-        'Authorization': 'Basic '
-        }    
-    params = {'licenseNumber': ''}
 
-    response = requests.get(url, headers=headers, params=params)
-    d['AcceptedPackages'] = [x.get('PackageLabel') for x in response.json().get('Transactions')]
-    
-    put_response = request_completion(payload=[d], headers=headers, params=params)
+class RateLimiter:
+    """Spaces request starts at least 1/per_second seconds apart.
 
-    if not response.ok:
-        return f'error completing manifest'
+    Args:
+        per_second (float): max requests started per second
+    """
+
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second if per_second else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-def request_completion(payload, headers, params):
-    url = 'https://api-or.metrc.com/sales/v1/deliveries/complete'
-    r = requests.put(url, params=params, headers=headers, data=payload)
-    print(r.status_code, r.reason)
+
+async def _request(
+        session, limiter, semaphore, method, url, retries, backoff, **kwargs
+        ) -> requests.Response:
+    """Send a request from a worker thread, retrying transient failures.
+
+    Connection errors and RETRY_STATUS responses are retried up to
+    `retries` times, sleeping backoff, 2*backoff, 4*backoff... in between.
+    Other responses are returned as is. Raises the last connection error if
+    every attempt failed to connect.
+    """
+    for attempt in range(retries + 1):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                response = await asyncio.to_thread(
+                    session.request, method, url, timeout=60, **kwargs
+                    )
+            except requests.RequestException as e:
+                response, error = None, e
+        if response is not None and response.status_code not in RETRY_STATUS:
+            return response
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+    if response is None:
+        raise error
+    return response
+
+
+async def complete_deliveries_async(
+        deliveries: pd.DataFrame, session: requests.Session = None,
+        base_url: str = BASE_URL, license_number: str = None,
+        max_concurrency: int = 8, per_second: float = 10,
+        batch_size: int = 25, retries: int = 3, backoff: float = 0.5
+        ) -> pd.DataFrame:
+    """Complete deliveries with concurrent detail fetches and batched PUTs.
+
+    Args:
+        deliveries (pd.DataFrame): active deliveries with Id and SalesDateTime
+        session (requests.Session, optional): METRC session. Defaults to
+        metrc_session().
+        base_url (str, optional): api root. Defaults to BASE_URL.
+        license_number (str, optional): facility license. Defaults to the
+        metrc_license env var.
+        max_concurrency (int, optional): max requests in flight. Defaults to 8.
+        per_second (float, optional): max requests started per second.
+        Defaults to 10.
+        batch_size (int, optional): deliveries per complete PUT. Defaults to 25.
+        retries (int, optional): retries per request. Defaults to 3.
+        backoff (float, optional): first retry delay in seconds. Defaults to 0.5.
+
+    Returns:
+        pd.DataFrame: Id, status ('completed', 'fetch_failed' or
+        'complete_failed'), status_code and error for each delivery, empty
+        if there are no deliveries
+    """
+    if deliveries.empty:
+        # nothing active, json_normalize([]) does not even have the columns
+        return pd.DataFrame(columns=RESULT_COLS)
+    session = session or metrc_session(pool_size=max_concurrency)
+    params = {'licenseNumber': license_number or os.getenv('metrc_license', '')}
+    limiter = RateLimiter(per_second)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = {}
+
+    def call(method, path, **kwargs):
+        return _request(
+            session, limiter, semaphore, method, f'{base_url}/{path}',
+            retries, backoff, params=params, **kwargs
+            )
+
+    async def fetch(row):
+        try:
+            response = await call('GET', f"sales/v1/delivery/{row['Id']}")
+        except requests.RequestException as e:
+            results[row['Id']] = ('fetch_failed', None, str(e))
+            return None
+        if not response.ok:
+            results[row['Id']] = ('fetch_failed', response.status_code, response.text)
+            return None
+        return {
+            'Id': row['Id'],
+            'ActualArrivalDateTime': row['SalesDateTime'],
+            'AcceptedPackages': [
+                x.get('PackageLabel') for x in response.json().get('Transactions') or []
+                ]
+            }
+
+    async def complete(batch, split=True):
+        try:
+            response = await call('PUT', 'sales/v1/deliveries/complete', json=batch)
+        except requests.RequestException as e:
+            for d in batch:
+                results[d['Id']] = ('complete_failed', None, str(e))
+            return
+        if response.ok:
+            for d in batch:
+                results[d['Id']] = ('completed', response.status_code, None)
+        elif split and len(batch) > 1 and response.status_code < 500:
+            # METRC rejects the whole batch for one bad delivery, so find
+            # out which ones by sending them individually
+            await asyncio.gather(*(complete([d], split=False) for d in batch))
+        else:
+            for d in batch:
+                results[d['Id']] = ('complete_failed', response.status_code, response.text)
+
+    rows = deliveries[['Id', 'SalesDateTime']].to_dict('records')
+    payload = [d for d in await asyncio.gather(*(fetch(r) for r in rows)) if d]
+    batches = [payload[i:i + batch_size] for i in range(0, len(payload), batch_size)]
+    await asyncio.gather(*(complete(b) for b in batches))
+
+    return pd.DataFrame(
+        [(i, *results[i]) for i in deliveries['Id']], columns=RESULT_COLS
+        )
+
+
+def complete_deliveries(deliveries: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """Blocking wrapper for complete_deliveries_async, same arguments."""
+    return asyncio.run(complete_deliveries_async(deliveries, **kwargs))
 
 
 def main():
-    deliveries = get_active_deliveries()
-    deliveries.apply(complete_deliveries, axis='columns')
+    with stage('fetch_deliveries') as rec:
+        deliveries = get_active_deliveries()
+        rec['rows_out'] = deliveries
+    with stage('complete_deliveries', deliveries) as rec:
+        df = complete_deliveries(deliveries)
+        rec['rows_out'] = df
+    print(df['status'].value_counts().to_string())
     return df
 
-df = main()
\ No newline at end of file
+
+if __name__ == '__main__':
+    df = main()
@@ -0,0 +1,181 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+import numpy as np
+import pandas as pd
+
+##############################################################################
+# Description: Daily delivery operations summary from the Onfleet analytics
+# exports. Each month folder (ex: 'Dec 2021') holds one subfolder per
+# download, each with the by_date reports: one row per metric and one
+# column per day. Every csv of every month is read in parallel and kept
+# under (period, report), days from every subfolder are stacked rather than
+# overwriting each other, the four reports are lined up on Date with one
+# concat and the rate columns are computed together. Summaries are saved to
+# a parquet history, one part per month, so past months are not rebuilt on
+# every run.
+##############################################################################
+
+SEC_TO_HR = 1 / 3600
+# report -> names of its metric rows, in file order
+REPORT_COLUMNS = {
+    'taskCompletionResult_by_date': ['Succeeded', 'Failed'],
+    'taskDelayedOnCompletion_by_date': [
+        'On Time', 'Delayed < 10 min', 'Delayed 10-30 mins', 'Delayed 30-60 mins',
+        'Delayed > 60 mins'
+        ],
+    'workerDistance_by_date': ['Dist In Transit', 'Dist Idle'],
+    'workerDuration_by_date': ['Dur In Transit', 'Dur Idle']
+    }
+# delay bucket -> share of tasks column
+LATE_SHARES = {
+    'On Time': '% On Time',
+    'Delayed < 10 min': '% <10 min Late',
+    'Delayed 10-30 mins': '% 10-30 min Late',
+    'Delayed 30-60 mins': '% 30-60 min Late'
+    }
+SUMMARY_COLS = [
+    'Date', 'Order Rate', 'Tasks per Hour', 'Miles per Task', 'Dur Idle',
+    '% Dur Idle', 'Dist Idle', '% On Time', '% <10 min Late', '% 10-30 min Late',
+    '% 30-60 min Late', 'Failed'
+    ]
+PART_GLOB = 'part-*.parquet'
+
+
+def read_report(path: str, report: str) -> pd.DataFrame:
+    """One by_date export turned to one row per day.
+
+    Args:
+        path (str): csv export
+        report (str): report name, a REPORT_COLUMNS key
+
+    Returns:
+        pd.DataFrame: REPORT_COLUMNS[report] indexed by Date, dates as
+        they appear in the export
+    """
+    df = pd.read_csv(path, index_col=0).T
+    df.columns = REPORT_COLUMNS[report]
+    return df.rename_axis('Date')
+
+
+def collect_reports(root: str, periods: list = None, max_workers: int = 8) -> dict:
+    """Read the Onfleet exports of every period under root.
+
+    Args:
+        root (str): directory of period folders, each holding one folder
+        per download with the report csvs
+        periods (list, optional): period folder names to read. Defaults to
+        every folder under root.
+        max_workers (int, optional): files read at once. Defaults to 8.
+
+    Returns:
+        dict: {(period, report): DataFrame of every day in the period's
+        downloads}; a day in more than one download keeps the last one
+    """
+    if periods is None:
+        periods = sorted(
+            x for x in os.listdir(root) if os.path.isdir(os.path.join(root, x))
+            )
+    files = [
+        (period, os.path.basename(path)[:-len('.csv')], path)
+        for period in periods
+        for path in sorted(glob(os.path.join(root, period, '*', '*.csv')))
+        ]
+    files = [x for x in files if x[1] in REPORT_COLUMNS]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(lambda x: read_report(x[2], x[1]), files))
+
+    grouped = {}
+    for (period, report, _), df in zip(files, frames):
+        grouped.setdefault((period, report), []).append(df)
+    reports = {}
+    for key, dfs in grouped.items():
+        df = pd.concat(dfs)
+        df.index = pd.to_datetime(df.index).rename('Date')
+        reports[key] = df.loc[~df.index.duplicated(keep='last')].sort_index()
+    return reports
+
+
+def daily_summary(reports: dict) -> pd.DataFrame:
+    """Per day task volume, speed, distance and lateness.
+
+    Args:
+        reports (dict): output of collect_reports()
+
+    Returns:
+        pd.DataFrame: SUMMARY_COLS, one row per Date found in all four
+        reports, sorted by Date; empty if any report has no exports
+    """
+    by_report = {
+        report: [df for (_, r), df in reports.items() if r == report]
+        for report in REPORT_COLUMNS
+        }
+    if not all(by_report.values()):
+        return pd.DataFrame(columns=SUMMARY_COLS)
+    for report, dfs in by_report.items():
+        df = pd.concat(dfs)
+        by_report[report] = df.loc[~df.index.duplicated(keep='last')]
+    s = pd.concat(by_report.values(), axis=1, join='inner').sort_index()
+
+    s[['Dur In Transit', 'Dur Idle']] *= SEC_TO_HR
+    tasks = s['Succeeded'] + s['Failed']
+    shares = s[list(LATE_SHARES)].div(tasks, axis=0).rename(columns=LATE_SHARES)
+    rates = pd.DataFrame({
+        'Order Rate': tasks,
+        'Tasks per Hour': (tasks / s['Dur In Transit']).round(2),
+        'Miles per Task': ((s['Dist In Transit'] + s['Dist Idle']) / tasks).round(2),
+        '% Dur Idle': s['Dur Idle'] / (s['Dur Idle'] + s['Dur In Transit'])
+        })
+    s = pd.concat([s, shares, rates], axis=1).reset_index()
+    return s[SUMMARY_COLS]
+
+
+def read_history(history_dir: str) -> pd.DataFrame:
+    """The saved summary history, latest row per Date.
+
+    Args:
+        history_dir (str): directory of summary parts
+
+    Returns:
+        pd.DataFrame: SUMMARY_COLS sorted by Date, empty if none saved
+    """
+    parts = sorted(glob(os.path.join(history_dir, PART_GLOB)))
+    if not parts:
+        return pd.DataFrame(columns=SUMMARY_COLS)
+    hist = pd.concat([pd.read_parquet(x) for x in parts], ignore_index=True)
+    hist = hist.drop_duplicates('Date', keep='last')
+    return hist.sort_values('Date', ignore_index=True)
+
+
+def append_history(summary: pd.DataFrame, history_dir: str) -> int:
+    """Save the summary rows that are new or changed to their month's part.
+
+    Each month of days is kept in one part named for it, so a run only
+    rewrites the months it changed and parts from separate runs never
+    take each other's names.
+
+    Args:
+        summary (pd.DataFrame): output of daily_summary()
+        history_dir (str): directory of summary parts
+
+    Returns:
+        int: nbr of rows new or changed
+    """
+    hist = read_history(history_dir)
+    if len(hist):
+        seen = pd.util.hash_pandas_object(hist[SUMMARY_COLS], index=False).to_numpy()
+        keys = pd.util.hash_pandas_object(summary[SUMMARY_COLS], index=False).to_numpy()
+        summary = summary.loc[~np.isin(keys, seen)]
+    if not len(summary):
+        return 0
+    os.makedirs(history_dir, exist_ok=True)
+    hist_months = pd.to_datetime(hist['Date']).dt.to_period('M')
+    for month, rows in summary.groupby(summary['Date'].dt.to_period('M')):
+        kept = hist.loc[(hist_months == month) & ~hist['Date'].isin(rows['Date'])]
+        if len(kept):
+            rows = pd.concat([kept, rows]).sort_values('Date')
+        part = os.path.join(history_dir, f'part-{month}.parquet')
+        rows.to_parquet(part + '.tmp', index=False)
+        os.replace(part + '.tmp', part)
+    return len(summary)
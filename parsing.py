@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+##############################################################################
+# Description: Parsers for the text money and quantity columns in the BLAZE
+# exports. '$1,234.56', '-$5.00' and '($5.00)' become floats; '3.5 g' and
+# '1 ea' become a value and a unit. Columns only hold a few thousand
+# distinct strings, so each distinct string is parsed once and the result
+# is spread back over the rows by its code. Cells that do not parse raise a
+# ValueError naming them, instead of silently turning into NaN.
+##############################################################################
+
+MONEY_CHARS = r'[\s$,]'
+QUANTITY_RE = r'^\s*([-+]?(?:\d[\d,]*)?\.?\d+)\s*([A-Za-z]*)\s*$'
+MAX_REPORTED = 5
+
+
+def _codes_uniques(s: pd.Series) -> tuple:
+    """Integer codes (-1 for missing) and the distinct values as strings."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+    return codes, pd.Series(np.asarray(uniques, dtype=object)).astype(str)
+
+
+def _spread(values: np.ndarray, codes: np.ndarray, fill=np.nan) -> np.ndarray:
+    """Per unique results taken back to one per row, fill where missing."""
+    out = np.append(values, np.array([fill], dtype=values.dtype))
+    return out[codes]
+
+
+def _check(bad: pd.Series, errors: str, what: str, name) -> None:
+    if errors != 'raise' or not bad.any():
+        return
+    cells = bad.index[bad].tolist()
+    raise ValueError(
+        f'{len(cells)} malformed {what} value(s) in {name!r}: '
+        f'{cells[:MAX_REPORTED]}' + (' ...' if len(cells) > MAX_REPORTED else '')
+        )
+
+
+def parse_money(s: pd.Series, errors: str = 'raise') -> pd.Series:
+    """Money strings to float, '$', ',' and spaces removed.
+
+    A leading '-' (before or after the '$') or surrounding parentheses make
+    the value negative. Numeric columns are returned as float.
+
+    Args:
+        s (pd.Series): money column as read from the export
+        errors (str, optional): 'raise' to raise on cells that do not parse,
+        'coerce' to make them NaN. Defaults to 'raise'.
+
+    Raises:
+        ValueError: with errors='raise', naming the distinct values that
+        did not parse
+
+    Returns:
+        pd.Series: float64 money, NaN where s is missing
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.astype('float64')
+    codes, uniques = _codes_uniques(s)
+    text = uniques.str.replace(MONEY_CHARS, '', regex=True)
+    paren = text.str.startswith('(') & text.str.endswith(')')
+    text = text.where(~paren, '-' + text.str.slice(1, -1))
+    values = pd.to_numeric(text, errors='coerce')
+    _check(values.isna().set_axis(uniques), errors, 'money', s.name)
+    return pd.Series(
+        _spread(values.to_numpy(dtype='float64'), codes), index=s.index, name=s.name
+        )
+
+
+def parse_quantity(s: pd.Series, errors: str = 'raise') -> pd.DataFrame:
+    """Split '3.5 g' / '1 ea' style quantities into value and unit.
+
+    Args:
+        s (pd.Series): quantity column as read from the export
+        errors (str, optional): 'raise' or 'coerce', as for parse_money().
+        Defaults to 'raise'.
+
+    Raises:
+        ValueError: with errors='raise', naming the distinct values that
+        did not parse
+
+    Returns:
+        pd.DataFrame: 'quantity' (float64) and 'unit' (categorical, NaN
+        where no unit was given) with the index of s
+    """
+    codes, uniques = _codes_uniques(s)
+    parts = uniques.str.extract(QUANTITY_RE)
+    values = pd.to_numeric(parts[0].str.replace(',', '', regex=False))
+    _check(parts[0].isna().set_axis(uniques), errors, 'quantity', s.name)
+    units = parts[1].where(parts[1] != '')
+    unit_codes, unit_names = pd.factorize(units)
+    return pd.DataFrame({
+        'quantity': _spread(values.to_numpy(dtype='float64'), codes),
+        'unit': pd.Categorical.from_codes(
+            _spread(unit_codes, codes, fill=-1), unit_names
+            )
+        }, index=s.index)
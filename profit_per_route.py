@@ -1,6 +1,8 @@
 import pandas as pd
-import os
-from glob import glob
+
+from instrument import stage
+from routes import ROUTE_SCHEDULE, route_margin
+from sales_cache import refresh_cache, read_cache
 
 ##############################################################################
 # Author: Ted Ewing
@@ -8,38 +10,54 @@ from glob import glob
 # Description: Get profit per route with Blaze data. Requires the All Sales
 # Reports for YTD. Takes completed time for each transaction, and buckets
 # it into a standard route time, ex: 1-3 or 3-5.
+# Run with: python cli.py routes --help
 ##############################################################################
 
-df = pd.DataFrame()
-for x in glob('C:/Users/teddy/Documents/Python Scripts/KC/IC Data Collection/Data/All Sales Reports/*.csv'):
-    if df.empty:
-        df = pd.read_csv(x, skiprows=1)
-    else:
-        df = df.append(pd.read_csv(x, skiprows=1))
-
-df.Date = pd.to_datetime(df.Date)
-df['hour'] = df.Date.dt.hour
-df['Retail Value'] = df['Retail Value'].str.strip('$').astype('float')
-df['COGs'] = df['COGs'].str.strip('$').astype('float')
-
-df['route'] = None
-
-df.loc[df['hour'].between(13, 15), 'route'] = 'First Route (1-3pm)'
-df.loc[df['hour'].between(15, 17), 'route'] = 'Second Route (3-5pm)'
-df.loc[df['hour'].between(17, 19), 'route'] = 'Third Route (5-7pm)'
-df.loc[df['hour'].between(19, 20), 'route'] = 'Fourth Route (7-8)'
-df.loc[df['hour'].between(20, 21), 'route'] = 'Last Route'
-
-df.loc[df['hour'].between(13, 15), 'route_nbr'] = 1
-df.loc[df['hour'].between(15, 17), 'route_nbr'] = 2
-df.loc[df['hour'].between(17, 19), 'route_nbr'] = 3
-df.loc[df['hour'].between(19, 20), 'route_nbr'] = 4
-df.loc[df['hour'].between(20, 21), 'route_nbr'] = 5
-
-df.Date = df.Date.dt.date
-routes = df.groupby(['Date', 'Employee', 'route', 'route_nbr']).agg({'Retail Value': 'sum', 'COGs': 'sum'})
-routes['margin'] = routes['Retail Value'] - routes['COGs']
-routes = routes.reset_index().sort_values(['Date', 'Employee', 'route_nbr'])
-
-routes.to_clipboard()
-routes.groupby(['route_nbr', 'route']).agg({'margin': 'mean'}).to_clipboard()
\ No newline at end of file
+SLS_DIR = 'C:/Users/teddy/Documents/Python Scripts/KC/IC Data Collection/Data/All Sales Reports'
+CACHE_DIR = 'C:/Users/teddy/Documents/Python Scripts/KC/IC Data Collection/Data/All Sales Cache'
+
+
+def profit_per_route(
+        sls_dir: str = SLS_DIR, cache_dir: str = CACHE_DIR,
+        schedule: list = ROUTE_SCHEDULE
+        ) -> pd.DataFrame:
+    """Margin of every route run.
+
+    Args:
+        sls_dir (str, optional): All Sales Report exports. Defaults to SLS_DIR.
+        cache_dir (str, optional): parquet sales cache. Defaults to CACHE_DIR.
+        schedule (list, optional): route windows. Defaults to ROUTE_SCHEDULE.
+
+    Returns:
+        pd.DataFrame: output of routes.route_margin()
+    """
+    with stage('load') as rec:
+        refresh_cache(sls_dir, cache_dir)
+        df = read_cache(cache_dir, columns=['Date', 'Employee', 'Retail Value', 'COGs'])
+        rec['rows_out'] = df
+
+    # route windows live in routes.ROUTE_SCHEDULE, each sale goes to the
+    # route whose start/end holds its completed time
+    with stage('routes', df) as rec:
+        routes = route_margin(df, schedule)
+        rec['rows_out'] = routes
+    return routes
+
+
+def route_averages(routes: pd.DataFrame) -> pd.DataFrame:
+    """Mean margin per route.
+
+    Args:
+        routes (pd.DataFrame): output of profit_per_route()
+
+    Returns:
+        pd.DataFrame: margin indexed by route_nbr and route
+    """
+    return routes.groupby(['route_nbr', 'route'], observed=True).agg({'margin': 'mean'})
+
+
+if __name__ == '__main__':
+    routes = profit_per_route()
+    with stage('publish', routes):
+        routes.to_clipboard()
+        route_averages(routes).to_clipboard()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from sales_schema import cents
+
+##############################################################################
+# Description: Purchase history kernel shared by the segmentation and
+# lifetime value scripts. Groups sales line items into purchases (one per
+# member per sale time), sorted once by member and date, then works out the
+# days between purchases and the per member totals from that single sorted
+# array instead of a groupby().apply per member.
+##############################################################################
+
+MEMBER_KEYS = ['Member ID', 'Member']
+NS_PER_DAY = 86_400 * 10**9
+
+
+def purchase_history(
+        df: pd.DataFrame, keys: list = MEMBER_KEYS, value: str = 'Net Sales',
+        date: str = 'Date', trans: str = 'Trans No.'
+        ) -> tuple:
+    """Purchases with days between them, plus per member purchase stats.
+
+    Args:
+        df (pd.DataFrame): sales line items
+        keys (list, optional): member columns. Defaults to MEMBER_KEYS.
+        value (str, optional): money column to total. Defaults to 'Net Sales'.
+        date (str, optional): sale datetime column. Defaults to 'Date'.
+        trans (str, optional): transaction column. Defaults to 'Trans No.'.
+
+    Returns:
+        tuple: (orders, members)
+        orders has one row per member and sale time, sorted by member and
+        date, with the summed value, the max trans no. and day_btwn_purch,
+        whole days since the member's previous purchase (<NA> on the first).
+        members has one row per member with monetary, frequency (distinct
+        transactions), purchases, first_purchase, last_purchase and
+        avg_days_btwn_purch (NaN with a single purchase).
+    """
+    # money is added up in whole cents, so totals do not depend on the order
+    # the line items were summed in
+    orders = df.assign(**{value: cents(df[value])}).groupby(
+        keys + [date], sort=True, observed=True
+        ).agg(**{value: (value, 'sum'), trans: (trans, 'max')}).reset_index()
+
+    n = len(orders)
+    first = np.ones(n, dtype=bool)
+    if n:
+        first[1:] = (
+            orders[keys].iloc[1:].to_numpy() != orders[keys].iloc[:-1].to_numpy()
+            ).any(axis=1)
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], n) - 1
+
+    t = orders[date].to_numpy(dtype='datetime64[ns]').view('int64')
+    gap = np.zeros(n, dtype='int64')
+    gap[1:] = np.diff(t) // NS_PER_DAY
+    gap[first] = 0
+    orders['day_btwn_purch'] = pd.arrays.IntegerArray(gap, first)
+
+    members = orders.loc[starts, keys].reset_index(drop=True)
+    members['monetary'] = np.add.reduceat(orders[value].to_numpy(), starts) / 100
+    orders[value] = orders[value] / 100
+    # same groups and order as orders, which drops rows without a date
+    members['frequency'] = df.loc[df[date].notna()].groupby(
+        keys, sort=True, observed=True
+        )[trans].nunique().to_numpy()
+    members['purchases'] = ends - starts + 1
+    members['first_purchase'] = orders[date].to_numpy()[starts]
+    members['last_purchase'] = orders[date].to_numpy()[ends]
+    n_gaps = members['purchases'].to_numpy() - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        members['avg_days_btwn_purch'] = np.where(
+            n_gaps > 0, np.add.reduceat(gap, starts) / n_gaps, np.nan
+            )
+    return orders, members
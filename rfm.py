@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+##############################################################################
+# Description: RFM scoring engine. Scores each customer 1-5 on Recency,
+# Frequency, Monetary and AF (average days between purchases) by comparing
+# against the 20/40/60/80% quantiles of the customer base. Scores are
+# computed with np.searchsorted against the quantile edges instead of a
+# python function per row. RScore and FMScore are the original row-wise
+# scorers, kept as the reference the vectorized version must match.
+##############################################################################
+
+QUANTILES = [0.2, 0.4, 0.6, 0.8]
+RFM_COLS = {
+    'r_quant': 'recency',
+    'f_quant': 'frequency',
+    'm_quant': 'monetary',
+    'af_quant': 'Avg Days Between Purch'
+    }
+# low recency / avg days between purchases is good, high frequency and
+# monetary is good, so the latter are scored in reverse
+REVERSED = {'frequency', 'monetary'}
+
+
+def RScore(x, p, d):
+    """Recency Score func, segments
+    according to recency in 20% subsets
+
+    Args:
+        x (string): 'recency' for getting dict val
+        p (dict): mapping for quantiles
+        d (pd.Series): recency series
+
+    Returns:
+        int: recency segment value
+    """
+
+    if x <= d[p][0.2]:
+        return 1
+    elif x <= d[p][0.4]:
+        return 2
+    elif x <= d[p][0.6]:
+        return 3
+    elif x <= d[p][0.8]:
+        return 4
+    else:
+        return 5
+
+
+def FMScore(x, p, d):
+    """Frequency and Monetary func, segements
+    according to frequency and monetary values
+    in 20% subsets
+
+    Args:
+        x (string): 'frequency' or 'monetary' for getting dict val
+        p (dict): mapping for quantiles
+        d (pd.Series): respective series for use
+
+    Returns:
+        int: frequency or monetary segement value
+    """
+
+    if x <= d[p][0.2]:
+        return 5
+    elif x <= d[p][0.4]:
+        return 4
+    elif x <= d[p][0.6]:
+        return 3
+    elif x <= d[p][0.8]:
+        return 2
+    else:
+        return 1
+
+
+def quantile_edges(df: pd.DataFrame, cols: list = None, q: list = QUANTILES) -> dict:
+    """Quantiles of the scored columns, shaped like DataFrame.quantile().to_dict()
+
+    Args:
+        df (pd.DataFrame): one row per customer
+        cols (list, optional): columns to take quantiles of. Defaults to
+        the RFM columns.
+        q (list, optional): quantiles. Defaults to QUANTILES.
+
+    Returns:
+        dict: {column: {quantile: value}}
+    """
+    cols = cols or list(RFM_COLS.values())
+    return df[cols].astype('float64').quantile(q=q).to_dict()
+
+
+def quintile_score(x, edges, reverse: bool = False) -> np.ndarray:
+    """Score values 1-5 against four quantile edges.
+
+    A value scores 1 if it is <= the first edge, 2 if <= the second and so
+    on, 5 above the last edge. NaN compares false against every edge, so it
+    scores 5 (1 when reversed), same as the row-wise functions.
+
+    Args:
+        x (array-like): values to score
+        edges (array-like): ascending quantile edges
+        reverse (bool, optional): score 5 to 1 instead. Defaults to False.
+
+    Returns:
+        np.ndarray: int8 scores
+    """
+    x = np.asarray(x, dtype='float64')
+    edges = np.asarray(edges, dtype='float64')
+    # a NaN edge never matches, which is the same as an edge at -inf
+    edges = np.where(np.isnan(edges), -np.inf, edges)
+    score = np.searchsorted(edges, x, side='left').astype('int8') + 1
+    return 6 - score if reverse else score
+
+
+def rfm_scores(cust: pd.DataFrame, quantiles: dict = None) -> pd.DataFrame:
+    """Add r/f/m/af quintile scores and a combined RFMScore to customers.
+
+    RFMScore packs the four scores into one integer, r*1000 + f*100 +
+    m*10 + af, so it reads the same as the old '1234' string code.
+
+    Args:
+        cust (pd.DataFrame): one row per customer with recency, frequency,
+        monetary and Avg Days Between Purch columns
+        quantiles (dict, optional): quantile edges to score against, as
+        returned by quantile_edges(). Defaults to the edges of cust.
+
+    Returns:
+        pd.DataFrame: copy of cust with the score columns added
+    """
+    if quantiles is None:
+        quantiles = quantile_edges(cust)
+    out = cust.copy()
+    for score_col, col in RFM_COLS.items():
+        edges = [quantiles[col][q] for q in QUANTILES]
+        out[score_col] = quintile_score(
+            pd.to_numeric(out[col]), edges, reverse=col in REVERSED
+            )
+    scores = out[list(RFM_COLS)].to_numpy(dtype='int16')
+    out['RFMScore'] = scores @ np.array([1000, 100, 10, 1], dtype='int16')
+    return out
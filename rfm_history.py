@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+from churn import DEFAULT_POLICY, ONE_DAY, churn_days
+from purchases import MEMBER_KEYS, purchase_history
+from rfm import QUANTILES, RFM_COLS, REVERSED, quantile_edges, quintile_score
+from sales_schema import cents
+
+##############################################################################
+# Description: As-of RFM segmentation. Instead of scoring every member
+# against today, members are scored at a series of cutoffs (by default the
+# first of each month) using only the purchases made before each cutoff.
+# Purchases are sorted once by member and date and turned into running
+# totals; the state of every member at every cutoff is then one
+# searchsorted into those running totals, so a history of dozens of
+# monthly snapshots costs about one run of the segmentation.
+##############################################################################
+
+SECOND = np.timedelta64(1, 's')
+
+
+def monthly_cutoffs(start, end) -> pd.DatetimeIndex:
+    """First day of every month from start's month through end's month.
+
+    Args:
+        start (datetime): first month
+        end (datetime): last month
+
+    Returns:
+        pd.DatetimeIndex: month start cutoffs
+    """
+    return pd.date_range(
+        pd.Timestamp(start).to_period('M').to_timestamp(),
+        pd.Timestamp(end).to_period('M').to_timestamp(),
+        freq='MS'
+        )
+
+
+def _last_before(codes, t, cutoffs, span):
+    """Index of each member's last row before each cutoff, -1 if none.
+
+    codes and t (seconds since the first sale) are sorted by (code, t),
+    t < span - 1. Returns one row per member and one column per cutoff.
+    """
+    keys = codes * span + t
+    members = np.arange(codes[-1] + 1 if len(codes) else 0)
+    targets = members[:, None] * span + np.clip(cutoffs, 0, span - 1)[None, :]
+    idx = np.searchsorted(keys, targets.ravel(), side='left').reshape(targets.shape) - 1
+    # rows of the previous member are not this member's purchases
+    owner = codes[idx.clip(0)] if len(codes) else idx
+    return np.where((idx >= 0) & (owner == members[:, None]), idx, -1)
+
+
+def rfm_history(
+        df: pd.DataFrame, cutoffs, policy: dict = DEFAULT_POLICY,
+        keys: list = MEMBER_KEYS, value: str = 'Net Sales', date: str = 'Date',
+        trans: str = 'Trans No.'
+        ) -> pd.DataFrame:
+    """RFM/AF scores and churn of every member at each cutoff.
+
+    A member appears at a cutoff once they have purchased before it. Each
+    cutoff is scored against the quantiles of the members active at that
+    cutoff, exactly as if the segmentation had been run on that day with
+    the sales made before it.
+
+    Args:
+        df (pd.DataFrame): sales line items
+        cutoffs (array-like): datetimes to take snapshots at, see
+        monthly_cutoffs()
+        policy (dict, optional): churn policy. Defaults to DEFAULT_POLICY.
+        keys (list, optional): member columns. Defaults to MEMBER_KEYS.
+        value (str, optional): money column to total. Defaults to 'Net Sales'.
+        date (str, optional): sale datetime column. Defaults to 'Date'.
+        trans (str, optional): transaction column. Defaults to 'Trans No.'.
+
+    Returns:
+        pd.DataFrame: long table, one row per cutoff and member, with
+        monetary, frequency, purchases, first/last purchase, recency,
+        Avg Days Between Purch, r/f/m/af_quant, RFMScore and churn
+    """
+    cutoffs = pd.DatetimeIndex(cutoffs).sort_values()
+    orders, members = purchase_history(df, keys, value, date, trans)
+    if orders.empty:
+        return pd.DataFrame()
+
+    # member code of each order, orders are sorted by member then date and
+    # only a member's first order has no days between purchases
+    first = orders['day_btwn_purch'].isna().to_numpy()
+    codes = np.cumsum(first) - 1
+
+    when = orders[date].to_numpy(dtype='datetime64[ns]')
+    t0 = when.min()
+    t = (when - t0) // SECOND
+    c = (cutoffs.to_numpy(dtype='datetime64[ns]') - t0) // SECOND
+    span = int(t.max()) + 2
+    last = _last_before(codes, t, c, span)
+
+    # distinct transactions per member, dated by their first sale
+    seen = df.loc[df[trans].notna() & df[date].notna(), keys + [date, trans]]
+    seen = seen.sort_values(date).drop_duplicates(keys + [trans])
+    seen_codes = seen[keys].merge(
+        members[keys].assign(code=np.arange(len(members))), how='left', on=keys
+        )['code'].fillna(-1).to_numpy(dtype='int64')
+    seen_t = (seen[date].to_numpy(dtype='datetime64[ns]') - t0) // SECOND
+    order = np.lexsort((seen_t, seen_codes))
+    keep = order[seen_codes[order] >= 0]
+    seen_codes, seen_t = seen_codes[keep], seen_t[keep]
+    last_trans = _last_before(seen_codes, seen_t, c, span)
+    trans_starts = np.searchsorted(seen_codes, np.arange(len(members)))
+
+    # running totals per member, restarted at each member's first order.
+    # Money is summed in whole cents: differences of running float sums
+    # drift, which moves members across quantile ties
+    starts = np.flatnonzero(first)
+    gap = orders['day_btwn_purch'].fillna(0).to_numpy(dtype='int64')
+    cum_value = np.cumsum(cents(orders[value]))
+    cum_gap = np.cumsum(gap)
+    base_value = np.append(0, cum_value)[starts]
+    base_gap = np.append(0, cum_gap)[starts]
+
+    m_idx, c_idx = np.nonzero(last >= 0)
+    row = last[m_idx, c_idx]
+    purchases = row - starts[m_idx] + 1
+    n_gaps = purchases - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_gap = np.where(
+            n_gaps > 0, (cum_gap[row] - base_gap[m_idx]) / n_gaps, np.nan
+            )
+    cutoffs = cutoffs.to_numpy(dtype='datetime64[ns]')
+    as_of = cutoffs[c_idx]
+    hist = members.loc[m_idx, keys].reset_index(drop=True)
+    hist.insert(0, 'cutoff', as_of)
+    hist['monetary'] = (cum_value[row] - base_value[m_idx]) / 100
+    trans_row = last_trans[m_idx, c_idx]
+    hist['frequency'] = np.where(trans_row >= 0, trans_row - trans_starts[m_idx] + 1, 0)
+    hist['purchases'] = purchases
+    hist['first_purchase'] = when[starts[m_idx]]
+    hist['Last Purchase Date'] = when[row]
+    hist['recency'] = np.floor((as_of - when[row]) / ONE_DAY)
+    hist['Avg Days Between Purch'] = avg_gap
+    hist = hist.sort_values(['cutoff'], kind='stable', ignore_index=True)
+
+    # score each cutoff against its own customer base
+    bounds = np.searchsorted(hist['cutoff'].to_numpy(dtype='datetime64[ns]'), cutoffs)
+    bounds = np.append(bounds, len(hist))
+    scores = np.zeros((len(hist), len(RFM_COLS)), dtype='int16')
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        snap = hist.iloc[lo:hi]
+        edges = quantile_edges(snap)
+        for j, col in enumerate(RFM_COLS.values()):
+            scores[lo:hi, j] = quintile_score(
+                snap[col], [edges[col][q] for q in QUANTILES],
+                reverse=col in REVERSED
+                )
+    for j, score_col in enumerate(RFM_COLS):
+        hist[score_col] = scores[:, j].astype('int8')
+    hist['RFMScore'] = scores @ np.array([1000, 100, 10, 1], dtype='int16')
+
+    with np.errstate(invalid='ignore'):
+        hist['churn'] = (hist['recency'].to_numpy() >= churn_days(hist, policy)
+                         ).astype('int8')
+    return hist
+
+
+def segment_migration(
+        hist: pd.DataFrame, segment: str = 'm_quant', keys: list = MEMBER_KEYS
+        ) -> pd.DataFrame:
+    """Members moving between segments from one cutoff to the next.
+
+    Args:
+        hist (pd.DataFrame): output of rfm_history()
+        segment (str, optional): segment column. Defaults to 'm_quant'.
+        keys (list, optional): member columns. Defaults to MEMBER_KEYS.
+
+    Returns:
+        pd.DataFrame: member counts indexed by (cutoff, from) with one column
+        per segment moved to; members new at a cutoff come from 0
+    """
+    cols = keys + [segment]
+    cutoffs = np.sort(hist['cutoff'].unique())
+    now = hist[cols].assign(step=np.searchsorted(cutoffs, hist['cutoff']))
+    before = now.assign(step=now['step'] + 1).rename(columns={segment: 'from'})
+    moves = now.loc[now['step'] > 0].merge(
+        before, how='left', on=keys + ['step']
+        )
+    moves['from'] = moves['from'].fillna(0).astype('int8')
+    moves['cutoff'] = cutoffs[moves['step']]
+    return pd.crosstab(
+        [moves['cutoff'], moves['from']], moves[segment]
+        ).rename_axis(columns='to')
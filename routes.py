@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from sales_schema import cents
+
+##############################################################################
+# Description: Buckets sales into delivery routes by the time of day they
+# were completed. A route schedule is a list of (start, end, name, number)
+# with 'HH:MM' times; a sale belongs to the route whose [start, end) window
+# holds its time of day, to the minute. Every sale is labelled with one
+# searchsorted over the route start times.
+##############################################################################
+
+ROUTE_SCHEDULE = [
+    ('13:00', '15:00', 'First Route (1-3pm)', 1),
+    ('15:00', '17:00', 'Second Route (3-5pm)', 2),
+    ('17:00', '19:00', 'Third Route (5-7pm)', 3),
+    ('19:00', '20:00', 'Fourth Route (7-8)', 4),
+    ('20:00', '22:00', 'Last Route', 5),
+    ]
+
+
+def _minutes(hhmm: str) -> int:
+    hour, minute = hhmm.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def schedule_minutes(schedule: list = ROUTE_SCHEDULE) -> tuple:
+    """Schedule sorted by start time with its windows in minutes of the day.
+
+    Args:
+        schedule (list, optional): (start, end, name, number) rows.
+        Defaults to ROUTE_SCHEDULE.
+
+    Raises:
+        ValueError: if two routes in the schedule overlap
+
+    Returns:
+        tuple: (sorted schedule, start minutes, end minutes)
+    """
+    schedule = sorted(schedule, key=lambda x: _minutes(x[0]))
+    starts = np.array([_minutes(x[0]) for x in schedule])
+    ends = np.array([_minutes(x[1]) for x in schedule])
+    if (starts[1:] < ends[:-1]).any() or (ends <= starts).any():
+        raise ValueError(f'route schedule windows overlap or are empty: {schedule}')
+    return schedule, starts, ends
+
+
+def assign_routes(dates: pd.Series, schedule: list = ROUTE_SCHEDULE) -> pd.DataFrame:
+    """Route name and number for each sale time.
+
+    Args:
+        dates (pd.Series): sale datetimes
+        schedule (list, optional): (start, end, name, number) rows.
+        Defaults to ROUTE_SCHEDULE.
+
+    Raises:
+        ValueError: if two routes in the schedule overlap
+
+    Returns:
+        pd.DataFrame: route (categorical in schedule order) and route_nbr
+        (Int64), missing for sales outside every route, same index as dates
+    """
+    schedule, starts, ends = schedule_minutes(schedule)
+    minute = (dates.dt.hour * 60 + dates.dt.minute).to_numpy()
+    idx = np.searchsorted(starts, minute, side='right') - 1
+    hit = (idx >= 0) & (minute < ends[idx.clip(0)])
+    codes = np.where(hit, idx, -1)
+    numbers = np.array([x[3] for x in schedule])
+    return pd.DataFrame({
+        'route': pd.Categorical.from_codes(codes, [x[2] for x in schedule]),
+        'route_nbr': pd.arrays.IntegerArray(numbers[codes.clip(0)], ~hit)
+        }, index=dates.index)
+
+
+def route_margin(df: pd.DataFrame, schedule: list = ROUTE_SCHEDULE) -> pd.DataFrame:
+    """Retail value, COGs and margin per day, driver and route.
+
+    Args:
+        df (pd.DataFrame): sales with Date, Employee, Retail Value and COGs
+        schedule (list, optional): route schedule. Defaults to ROUTE_SCHEDULE.
+
+    Returns:
+        pd.DataFrame: one row per Date, Employee, route, route_nbr sorted by
+        date, employee and route number; sales outside every route dropped
+    """
+    labels = assign_routes(df['Date'], schedule)
+    money = pd.DataFrame(
+        {c: cents(df[c]) for c in ['Retail Value', 'COGs']}, index=df.index
+        )
+    routes = money.groupby([
+        df['Date'].dt.normalize().rename('Date'), df['Employee'], labels['route']
+        ], observed=True).sum().reset_index()
+    numbers = {x[2]: x[3] for x in schedule}
+    routes.insert(3, 'route_nbr', routes['route'].map(numbers).astype('Int64'))
+    routes['margin'] = (routes['Retail Value'] - routes['COGs']) / 100
+    routes[['Retail Value', 'COGs']] = routes[['Retail Value', 'COGs']] / 100
+    routes['Date'] = routes['Date'].dt.date
+    return routes.sort_values(['Date', 'Employee', 'route_nbr'])
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+from glob import glob
+
+import pandas as pd
+
+from sales_loader import read_sales_report
+from sales_schema import apply_schema, concat_schema
+
+##############################################################################
+# Description: Incremental Parquet cache of the All Sales Report exports.
+# The cache is partitioned by year and month of the sale and keeps a
+# manifest of every source csv (path, size, mtime, sha256 and the months it
+# covers). A refresh only parses files that are new or changed, so a nightly
+# run costs about one file instead of the whole history. Duplicate line
+# items across exports are dropped as they are added.
+##############################################################################
+
+DEDUP_COLS = ['Date', 'Trans No.', 'Product SKU', 'Net Sales', 'Member ID']
+MANIFEST = 'manifest.json'
+
+
+def file_fingerprint(path: str) -> dict:
+    """Size, mtime and content hash for a source csv.
+
+    Args:
+        path (str): path to the csv
+
+    Returns:
+        dict: fingerprint entry for the manifest
+    """
+    stat = os.stat(path)
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': sha.hexdigest()
+        }
+
+
+def partition_path(cache_dir: str, month: str) -> str:
+    """Path of the parquet file holding a 'YYYY-MM' month."""
+    year, mon = month.split('-')
+    return os.path.join(cache_dir, f'year={year}', f'month={mon}', 'sales.parquet')
+
+
+def _load_manifest(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(cache_dir: str, manifest: dict) -> None:
+    path = os.path.join(cache_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _read_partition(cache_dir: str, month: str) -> pd.DataFrame:
+    path = partition_path(cache_dir, month)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def _write_partition(cache_dir: str, month: str, df: pd.DataFrame) -> None:
+    path = partition_path(cache_dir, month)
+    if df.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def _append_partition(cache_dir: str, month: str, frames: list) -> int:
+    existing = _read_partition(cache_dir, month)
+    df = pd.concat([existing] + frames, ignore_index=True).drop_duplicates(
+        subset=DEDUP_COLS
+        )
+    _write_partition(cache_dir, month, df)
+    return len(df) - len(existing)
+
+
+def _split_months(df: pd.DataFrame) -> dict:
+    df = df.loc[df['Date'].notna()]
+    months = df['Date'].dt.strftime('%Y-%m')
+    return {m: x for m, x in df.groupby(months, sort=True)}
+
+
+def refresh_cache(
+        sls_dir: str, cache_dir: str, pattern: str = '*.csv'
+        ) -> int:
+    """Bring the cache up to date with the exports in sls_dir.
+
+    New files are parsed and merged into the months they cover. Changed or
+    removed files cause the months they touched to be rebuilt from the
+    files still on disk. Files whose size and mtime are unchanged are not
+    read at all.
+
+    Args:
+        sls_dir (str): directory of All Sales Report csv exports
+        cache_dir (str): root of the parquet cache
+        pattern (str, optional): glob for the exports. Defaults to '*.csv'.
+
+    Returns:
+        int: nbr of line items written to the cache by this refresh
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    on_disk = sorted(glob(os.path.join(sls_dir, pattern)))
+    removed = {p: manifest.pop(p) for p in set(manifest) - set(on_disk)}
+    removed_by_hash = {v['sha256']: v for v in removed.values()}
+
+    new, changed = [], []
+    for path in on_disk:
+        entry = manifest.get(path)
+        stat = os.stat(path)
+        if entry and (entry['size'], entry['mtime']) == (stat.st_size, stat.st_mtime):
+            continue
+        fp = file_fingerprint(path)
+        if entry and entry['sha256'] == fp['sha256']:
+            entry.update(fp)
+        elif not entry and fp['sha256'] in removed_by_hash:
+            # renamed or moved, content already cached
+            months = removed_by_hash.pop(fp['sha256'])['months']
+            manifest[path] = dict(fp, months=months)
+        elif entry:
+            changed.append(path)
+            manifest[path] = dict(fp, months=entry['months'])
+        else:
+            new.append(path)
+            manifest[path] = dict(fp, months=[])
+
+    parsed = {path: _split_months(read_sales_report(path)) for path in changed}
+    # months touched by a changed or removed file have to be rebuilt from
+    # every file still covering them, otherwise stale rows would linger
+    rebuild = {m for v in removed_by_hash.values() for m in v['months']}
+    for path in changed:
+        rebuild |= set(manifest[path]['months']) | set(parsed[path])
+        manifest[path]['months'] = sorted(parsed[path])
+
+    # new files are read one at a time and a month is appended to as soon
+    # as the next file does not cover it, so with the exports in date order
+    # each month is written once and only the month in progress is held
+    written = 0
+    pending = {}
+    for path in new:
+        months = _split_months(read_sales_report(path))
+        manifest[path]['months'] = sorted(months)
+        for month in sorted(set(pending) - set(months)):
+            written += _append_partition(cache_dir, month, pending.pop(month))
+        for month, df in months.items():
+            if month not in rebuild:
+                pending.setdefault(month, []).append(df)
+    for month, frames in sorted(pending.items()):
+        written += _append_partition(cache_dir, month, frames)
+
+    for month in sorted(rebuild):
+        frames = []
+        for path in on_disk:
+            if month not in manifest[path]['months']:
+                continue
+            if path not in parsed:
+                parsed[path] = _split_months(read_sales_report(path))
+            frames.append(parsed[path][month])
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if not df.empty:
+            df = df.drop_duplicates(subset=DEDUP_COLS)
+        _write_partition(cache_dir, month, df)
+        written += len(df)
+
+    _save_manifest(cache_dir, manifest)
+    return written
+
+
+def read_cache(
+        cache_dir: str, start: str = None, end: str = None,
+        columns: list = None, compact: bool = True
+        ) -> pd.DataFrame:
+    """Read cached sales line items, optionally limited to a month range.
+
+    Args:
+        cache_dir (str): root of the parquet cache
+        start (str, optional): first 'YYYY-MM' month to read. Defaults to None.
+        end (str, optional): last 'YYYY-MM' month to read. Defaults to None.
+        columns (list, optional): columns to read. Defaults to all.
+        compact (bool, optional): convert to the sales_schema dtypes.
+        Defaults to True.
+
+    Returns:
+        pd.DataFrame: deduplicated sales line items
+    """
+    frames = []
+    for path in sorted(glob(os.path.join(cache_dir, 'year=*', 'month=*', 'sales.parquet'))):
+        year = os.path.basename(os.path.dirname(os.path.dirname(path)))[5:]
+        mon = os.path.basename(os.path.dirname(path))[6:]
+        month = f'{year}-{mon}'
+        if (start and month < start) or (end and month > end):
+            continue
+        df = pd.read_parquet(path, columns=columns)
+        frames.append(apply_schema(df) if compact else df)
+    if not frames:
+        return pd.DataFrame()
+    return concat_schema(frames) if compact else pd.concat(frames, ignore_index=True)
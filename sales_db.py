@@ -0,0 +1,333 @@
+import os
+from datetime import datetime
+from glob import glob
+
+import numpy as np
+import pandas as pd
+
+from churn import DEFAULT_POLICY, policy_table
+from rfm import QUANTILES
+from routes import ROUTE_SCHEDULE, schedule_minutes
+from sales_schema import DATE_COLS, MONEY_COLS
+
+##############################################################################
+# Description: DuckDB views over the parquet sales cache for ad hoc
+# questions. connect() opens an in-process database with three views:
+# line_items (the cached sales, money as DECIMAL(18, 2) and dates parsed like
+# sales_schema does), orders (one row per transaction) and members (the per
+# member totals, first/last purchase and average days between purchases
+# of customer_state, with the m/f/af quintile scores of rfm). Queries only
+# read the columns they use, filters on year/month skip whole partitions
+# and aggregation runs on every core, so a pivot no longer means loading
+# the history into pandas. churn_piv(), new_cust_piv(), mkt_src() and
+# routes() are the cust_segmentation and profit_per_route tables as SQL;
+# duckdb is only imported when a connection is opened.
+##############################################################################
+
+PARTITION_GLOB = os.path.join('year=*', 'month=*', 'sales.parquet')
+# score column -> (column, scored high to low), as in rfm.RFM_COLS/REVERSED,
+# recency is left out since it depends on the as-of date
+SCORES = {
+    'f_quant': ('frequency', True),
+    'm_quant': ('monetary', True),
+    'af_quant': ('avg_days_btwn_purch', False)
+    }
+
+
+def _score(col: str, reverse: bool) -> str:
+    """SQL for rfm.quintile_score of col against the q_ edge columns."""
+    # a NULL edge never matches and a NULL value scores 5 (1 when reversed)
+    above = ' + '.join(
+        f'({col} > q_{col}_{i} OR q_{col}_{i} IS NULL)::INTEGER'
+        for i in range(len(QUANTILES))
+        )
+    score = f'CASE WHEN {col} IS NULL THEN 5 ELSE 1 + {above} END'
+    return f'6 - ({score})' if reverse else score
+
+
+def _source(cache_dir: str) -> str:
+    path = os.path.join(cache_dir, PARTITION_GLOB).replace("'", "''")
+    return f"""read_parquet(
+        '{path}', hive_partitioning = true, union_by_name = true,
+        hive_types = {{'year': INTEGER, 'month': INTEGER}}
+        )"""
+
+
+def _views(cache_dir: str, types: dict, start: str = None, end: str = None) -> list:
+    """CREATE VIEW statements for the cache, types is column -> duckdb type."""
+    # the sales_schema conversions: money to exact cents, so sums match the
+    # pandas reports to the cent, and text dates parsed
+    schema = [
+        f'CAST("{c}" AS DECIMAL(18, 2)) AS "{c}"' for c in MONEY_COLS if c in types
+        ]
+    schema += [
+        f'coalesce(TRY_CAST("{c}" AS TIMESTAMP), '
+        f'try_strptime("{c}", \'%m/%d/%Y\')) AS "{c}"'
+        for c in DATE_COLS if types.get(c) == 'VARCHAR'
+        ]
+    replace = f"REPLACE ({', '.join(schema)})" if schema else ''
+    months = []
+    if start:
+        months.append(f"year * 100 + month >= {int(start.replace('-', ''))}")
+    if end:
+        months.append(f"year * 100 + month <= {int(end.replace('-', ''))}")
+    where = f"WHERE {' AND '.join(months)}" if months else ''
+    edges = ', '.join(
+        f'quantile_cont({col}, {q}) AS q_{col}_{i}'
+        for col, _ in SCORES.values() for i, q in enumerate(QUANTILES)
+        )
+    return [
+        f"""
+        CREATE OR REPLACE VIEW line_items AS
+        SELECT * {replace}
+        FROM {_source(cache_dir)}
+        {where}
+        """,
+        """
+        CREATE OR REPLACE VIEW orders AS
+        SELECT
+            "Trans No.", "Member ID",
+            min("Date") AS "Date",
+            count(*) AS items,
+            sum("Net Sales") AS "Net Sales",
+            sum("Final Subtotal") AS "Final Subtotal",
+            sum("Retail Value") AS "Retail Value",
+            sum("COGs") AS "COGs"
+        FROM line_items
+        WHERE "Trans No." IS NOT NULL
+        GROUP BY ALL
+        """,
+        f"""
+        CREATE OR REPLACE VIEW members AS
+        WITH items AS (
+            SELECT * FROM line_items
+            WHERE "Member ID" IS NOT NULL AND "Date" IS NOT NULL
+                AND "Trans No." IS NOT NULL
+        ),
+        visits AS (
+            SELECT
+                "Member ID", "Date",
+                floor((epoch("Date") - epoch(lag("Date") OVER (
+                    PARTITION BY "Member ID" ORDER BY "Date"
+                    ))) / 86400) AS gap_days
+            FROM (SELECT DISTINCT "Member ID", "Date" FROM items)
+        ),
+        purchases AS (
+            SELECT
+                "Member ID",
+                count(*) AS purchases,
+                min("Date") AS first_purchase,
+                max("Date") AS last_purchase,
+                sum(gap_days) / nullif(count(*) - 1, 0) AS avg_days_btwn_purch
+            FROM visits
+            GROUP BY ALL
+        ),
+        totals AS (
+            -- attributes follow the most recent sale
+            SELECT
+                "Member ID",
+                arg_max("Member", "Date") AS "Member",
+                arg_max("Member Group", "Date") AS "Member Group",
+                arg_max("Date Joined", "Date") AS "Date Joined",
+                coalesce(arg_max("Marketing Source", "Date"), 'None') AS "Marketing Source",
+                sum("Net Sales") AS monetary,
+                sum("Final Subtotal") AS "Final Subtotal",
+                sum("Retail Value") AS "Retail Value",
+                count(DISTINCT "Trans No.") AS frequency
+            FROM items
+            GROUP BY ALL
+        ),
+        summary AS (
+            SELECT * FROM totals JOIN purchases USING ("Member ID")
+        ),
+        edges AS (
+            SELECT {edges} FROM summary
+        )
+        SELECT
+            summary.*,
+            {', '.join(f'{_score(col, rev)} AS {name}' for name, (col, rev) in SCORES.items())}
+        FROM summary, edges
+        """
+        ]
+
+
+def connect(
+        cache_dir: str, start: str = None, end: str = None,
+        threads: int = None, database: str = ':memory:'
+        ):
+    """DuckDB connection with the sales views over a parquet sales cache.
+
+    Args:
+        cache_dir (str): root of the parquet cache (see sales_cache)
+        start (str, optional): first 'YYYY-MM' month the views see.
+        Defaults to None.
+        end (str, optional): last 'YYYY-MM' month the views see. Defaults
+        to None.
+        threads (int, optional): worker threads. Defaults to every core.
+        database (str, optional): duckdb database file. Defaults to an
+        in-memory database.
+
+    Raises:
+        FileNotFoundError: if the cache has no partitions yet
+
+    Returns:
+        duckdb.DuckDBPyConnection: connection with line_items, orders and
+        members views
+    """
+    import duckdb
+
+    if not glob(os.path.join(cache_dir, PARTITION_GLOB)):
+        raise FileNotFoundError(f'no cached sales under {cache_dir}')
+    con = duckdb.connect(database)
+    if threads:
+        con.execute(f'SET threads = {int(threads)}')
+    types = {
+        row[0]: row[1]
+        for row in con.execute(f'DESCRIBE SELECT * FROM {_source(cache_dir)}').fetchall()
+        }
+    for view in _views(cache_dir, types, start, end):
+        con.execute(view)
+    return con
+
+
+def query(con, sql: str, params: dict = None) -> pd.DataFrame:
+    """Run a query on the sales views and return it as a DataFrame.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): output of connect()
+        sql (str): query, ex: 'SELECT * FROM members LIMIT 10'
+        params (dict, optional): $name parameters. Defaults to None.
+
+    Returns:
+        pd.DataFrame: query result
+    """
+    return con.execute(sql, params or {}).df()
+
+
+def churn_piv(
+        con, policy: dict = DEFAULT_POLICY, as_of: datetime = None,
+        columns: str = 'm_quant'
+        ) -> pd.DataFrame:
+    """churn.churn_pivot() of the members view.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): output of connect()
+        policy (dict, optional): churn policy. Defaults to DEFAULT_POLICY.
+        as_of (datetime, optional): date churn is measured at. Defaults to now.
+        columns (str, optional): score column to pivot on. Defaults to
+        'm_quant'.
+
+    Returns:
+        pd.DataFrame: churned customers indexed by (year, month) of last
+        purchase, one column per segment
+    """
+    table = policy_table(policy)
+    m, af = np.nonzero(~np.isnan(table))
+    days = pd.DataFrame({'m': m, 'af': af, 'days': table[m, af]})
+    con.register('churn_policy', days)
+    try:
+        counts = query(con, f"""
+            SELECT
+                year(last_purchase) AS year,
+                month(last_purchase) AS month,
+                {columns},
+                sum(coalesce((
+                    floor((epoch($as_of::TIMESTAMP) - epoch(last_purchase)) / 86400)
+                    >= p.days
+                    ), false)::BIGINT) AS churn
+            FROM members
+            LEFT JOIN churn_policy p
+                ON p.m = coalesce(m_quant, 0) AND p.af = coalesce(af_quant, 0)
+            GROUP BY ALL
+            """, {'as_of': as_of or datetime.today()})
+    finally:
+        con.unregister('churn_policy')
+    return counts.pivot_table(
+        index=['year', 'month'], columns=columns, values='churn',
+        aggfunc='sum', fill_value=0
+        ).sort_index()
+
+
+def new_cust_piv(con) -> pd.DataFrame:
+    """New customers per year and month joined, as in cust_segmentation.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): output of connect()
+
+    Returns:
+        pd.DataFrame: year, month and the count of members joined
+    """
+    return query(con, """
+        SELECT year(joined) AS year, month(joined) AS month, count(*) AS "Date Joined"
+        FROM (
+            SELECT max("Date Joined") AS joined
+            FROM line_items
+            WHERE "Member ID" IS NOT NULL AND "Member" IS NOT NULL
+            GROUP BY "Member ID", "Member"
+            )
+        WHERE joined IS NOT NULL
+        GROUP BY ALL
+        ORDER BY year, month
+        """)
+
+
+def mkt_src(con) -> pd.DataFrame:
+    """Members per marketing source and (m_quant, af_quant) segment.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): output of connect()
+
+    Returns:
+        pd.DataFrame: indexed by (m_quant, af_quant), one column per
+        Marketing Source
+    """
+    counts = query(con, """
+        SELECT m_quant, af_quant, "Marketing Source", count(DISTINCT "Member ID") AS n
+        FROM members
+        GROUP BY ALL
+        """)
+    return counts.pivot_table(
+        index=['m_quant', 'af_quant'], columns='Marketing Source', values='n',
+        aggfunc='sum', fill_value=0
+        )
+
+
+def routes(con, schedule: list = ROUTE_SCHEDULE) -> pd.DataFrame:
+    """routes.route_margin() of the line_items view.
+
+    Args:
+        con (duckdb.DuckDBPyConnection): output of connect()
+        schedule (list, optional): route schedule. Defaults to ROUTE_SCHEDULE.
+
+    Raises:
+        ValueError: if two routes in the schedule overlap
+
+    Returns:
+        pd.DataFrame: Date, Employee, route, route_nbr, Retail Value, COGs
+        and margin sorted by date, employee and route number
+    """
+    schedule, starts, ends = schedule_minutes(schedule)
+    windows = pd.DataFrame({
+        'start_min': starts, 'end_min': ends,
+        'route': [x[2] for x in schedule], 'route_nbr': [x[3] for x in schedule]
+        })
+    con.register('route_windows', windows)
+    try:
+        df = query(con, """
+            SELECT
+                CAST("Date" AS DATE) AS "Date", "Employee", w.route, w.route_nbr,
+                sum("Retail Value") AS "Retail Value",
+                sum("COGs") AS "COGs",
+                sum("Retail Value") - sum("COGs") AS margin
+            FROM line_items
+            JOIN route_windows w
+                ON hour("Date") * 60 + minute("Date") >= w.start_min
+                AND hour("Date") * 60 + minute("Date") < w.end_min
+            WHERE "Employee" IS NOT NULL
+            GROUP BY ALL
+            ORDER BY "Date", "Employee", w.route_nbr
+            """)
+    finally:
+        con.unregister('route_windows')
+    df['Date'] = df['Date'].dt.date
+    return df
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+import pandas as pd
+
+from parsing import parse_money
+from sales_schema import MONEY_COLS, apply_schema, concat_schema
+
+##############################################################################
+# Description: Shared loader for the BLAZE All Sales Report exports. Reads
+# every CSV in a directory and concatenates them once, instead of growing a
+# DataFrame with append() per file (which copies the whole frame every time).
+# Dates and dollar columns are parsed at read time so the scripts get typed
+# columns straight away, and the combined frame is converted to the compact
+# dtypes declared in sales_schema.
+##############################################################################
+
+
+def read_sales_report(path: str) -> pd.DataFrame:
+    """Read a single All Sales Report CSV with typed Date and money columns.
+
+    Args:
+        path (str): path to the csv export
+
+    Returns:
+        pd.DataFrame: sales line items
+    """
+    return _typed(pd.read_csv(path, skiprows=1))
+
+
+def read_compact_report(path: str, chunk_size: int = 100_000) -> pd.DataFrame:
+    """Read an All Sales Report CSV straight into the sales_schema dtypes.
+
+    For exports too big to hold as read: the file is parsed chunk_size
+    rows at a time and each chunk converted before the next is read.
+
+    Args:
+        path (str): path to the csv export
+        chunk_size (int, optional): rows parsed at once. Defaults to 100,000.
+
+    Returns:
+        pd.DataFrame: sales line items, compact
+    """
+    return concat_schema([
+        apply_schema(_typed(df))
+        for df in pd.read_csv(path, skiprows=1, chunksize=chunk_size)
+        ])
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df['Date'] = pd.to_datetime(df['Date'])
+    for col in MONEY_COLS:
+        if col in df.columns:
+            df[col] = parse_money(df[col])
+    return df
+
+
+def load_sales_reports(
+        sls_dir: str, pattern: str = '*.csv', processes: int = None,
+        compact: bool = True
+        ) -> pd.DataFrame:
+    """Load every All Sales Report in a directory into one DataFrame.
+
+    Args:
+        sls_dir (str): directory holding the csv exports
+        pattern (str, optional): glob for the exports. Defaults to '*.csv'.
+        processes (int, optional): number of worker processes to parse
+        files with. Defaults to None, which reads in this process.
+        compact (bool, optional): convert to the sales_schema dtypes.
+        Defaults to True.
+
+    Returns:
+        pd.DataFrame: all sales line items, in file name order
+    """
+    files = sorted(glob(os.path.join(sls_dir, pattern)))
+    if not files:
+        return pd.DataFrame()
+    if processes and processes > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            frames = list(pool.map(read_sales_report, files, chunksize=8))
+    else:
+        frames = [read_sales_report(x) for x in files]
+    df = pd.concat(frames, ignore_index=True)
+    return apply_schema(df) if compact else df
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+##############################################################################
+# Description: Declared dtypes for the BLAZE All Sales Report. Most of the
+# text columns only take a few hundred distinct values over millions of line
+# items, so they are stored as categoricals; ids become categorical codes,
+# money becomes whole cents in a nullable int32 and dates are datetime64.
+# apply_schema() converts a frame, concat_schema() stacks frames converted
+# one by one with their categories lined up and memory_report() shows what
+# was saved. Code that adds money up does it on cents() and reports
+# dollars(), so totals are exact whichever way the frame was loaded.
+##############################################################################
+
+CATEGORY_COLS = [
+    'Member', 'Product Name', 'Product Category', 'Brand Name', 'Vendor',
+    'Payment Type', 'Marketing Source', 'Employee', 'Trans Status',
+    'Member Group', 'Promotion(s)', 'Quantity Sold', 'Zip Code'
+    ]
+ID_COLS = ['Member ID', 'Product SKU', 'Batch']
+MONEY_COLS = [
+    'Net Sales', 'COGs', 'Retail Value', 'Final Subtotal', 'Subtotal',
+    'Total Discount'
+    ]
+DATE_COLS = ['Date', 'Date Joined']
+# whole cents, up to $21M per line item
+MONEY_DTYPE = 'Int32'
+
+
+def to_cents(s: pd.Series) -> pd.Series:
+    """Money in dollars as MONEY_DTYPE cents, <NA> where missing.
+
+    A column already in MONEY_DTYPE is taken to be cents and returned as is.
+    """
+    if s.dtype == MONEY_DTYPE:
+        return s
+    return pd.Series(
+        pd.array(np.rint(s.to_numpy(dtype='float64') * 100), dtype=MONEY_DTYPE),
+        index=s.index, name=s.name
+        )
+
+
+def cents(s: pd.Series) -> np.ndarray:
+    """int64 cents of a money column, 0 where missing, for exact sums.
+
+    Args:
+        s (pd.Series): money in dollars, or MONEY_DTYPE cents
+
+    Returns:
+        np.ndarray: int64 cents
+    """
+    return to_cents(s).to_numpy(dtype='int64', na_value=0)
+
+
+def dollars(s: pd.Series) -> pd.Series:
+    """Money column as float64 dollars, NaN where missing.
+
+    Args:
+        s (pd.Series): money in dollars, or MONEY_DTYPE cents
+
+    Returns:
+        pd.Series: float64 dollars
+    """
+    if s.dtype == MONEY_DTYPE:
+        return s.astype('float64') / 100
+    return s.astype('float64')
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Sales frame converted to the declared compact dtypes.
+
+    Columns not in the schema, or missing from df, are left alone. Money
+    columns must already be numeric (see parsing.parse_money) and are
+    converted from dollars to cents.
+
+    Args:
+        df (pd.DataFrame): sales line items
+
+    Returns:
+        pd.DataFrame: new frame with compact columns
+    """
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORY_COLS or col in ID_COLS:
+            s = s.astype('category')
+        elif col in MONEY_COLS and pd.api.types.is_numeric_dtype(s):
+            s = to_cents(s)
+        elif col in DATE_COLS and not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s)
+        cols[col] = s
+    return pd.DataFrame(cols, index=df.index)
+
+
+def concat_schema(frames: list) -> pd.DataFrame:
+    """Concatenate frames that apply_schema() has already converted.
+
+    Each categorical column is set to the sorted union of its categories
+    in every frame first, so it stays categorical and matches converting
+    the concatenated frame, while only one frame at a time is ever held in
+    its wide dtypes.
+
+    Args:
+        frames (list): DataFrames with the same columns
+
+    Returns:
+        pd.DataFrame: frames stacked with a fresh index
+    """
+    frames = [x for x in frames if len(x.columns)]
+    if not frames:
+        return pd.DataFrame()
+    for col in frames[0].columns:
+        if not all(isinstance(x[col].dtype, pd.CategoricalDtype) for x in frames):
+            continue
+        # all missing columns come back with empty categories of no
+        # particular dtype, they take any
+        cats = [x[col].cat.categories for x in frames if len(x[col].cat.categories)]
+        if not cats:
+            continue
+        union = cats[0].append(cats[1:]).unique().sort_values()
+        frames = [
+            x.assign(**{col: x[col].cat.set_categories(union)}) for x in frames
+            ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def fill_category(s: pd.Series, value: str) -> pd.Series:
+    """fillna for a categorical column, adding value as a category if needed."""
+    if isinstance(s.dtype, pd.CategoricalDtype) and value not in s.cat.categories:
+        s = s.cat.add_categories([value])
+    return s.fillna(value)
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Per column memory use of a frame before and after apply_schema.
+
+    Args:
+        before (pd.DataFrame): frame as loaded
+        after (pd.DataFrame): same frame with the schema applied
+
+    Returns:
+        pd.DataFrame: dtype and MB before/after per column plus a total row,
+        largest savings first
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'mb_before': before.memory_usage(deep=True, index=False) / 2**20,
+        'mb_after': after.memory_usage(deep=True, index=False) / 2**20
+        })
+    saved = report['mb_before'] - report['mb_after']
+    report = report.loc[saved.sort_values(ascending=False).index]
+    report.loc['total'] = ['', '', report['mb_before'].sum(), report['mb_after'].sum()]
+    report['ratio'] = report['mb_before'] / report['mb_after']
+    return report.round(2)
@@ -1,278 +1,275 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
 import pandas as pd
-import requests
-import os
-from gspread_pandas import Spread
 from datetime import datetime, timedelta
 
-def get_blz_batch_qty(skip: int=0, inventory: str='safe') -> pd.DataFrame:
+from blaze_cache import CachedBlazeClient
+from blaze_client import BlazeClient, in_order
+from bq_loader import load_chunks, unseen_keys
+from checkpoint import Checkpoint
+from gsheet_publisher import INVENTORY_TABS, partition_tabs, publish_tabs
+from instrument import stage
+from inventory import inventory_summary
+from parsing import parse_quantity
+from sales_loader import read_compact_report
+from sales_schema import MONEY_COLS, dollars
+
+INVENTORIES = {
+    'safe': '5d26ca35002ec407fccc9e39',
+    'backstock': '5d72f55b0964cc083b14fce8',
+    'ict1': '61031630142eec3c1122ebb3',
+    'exchange': '5d26ca35002ec407fccc9e3c'
+    }
+# transaction times come back as epoch ms, reported in store local time
+STORE_TZ = 'America/Los_Angeles'
+TXN_ITEM_COLS = ['txn_id', 'created_dt', 'completedTime', 'transNo', 'productId', 'quantity']
+SLS_FILE = '/home/ted/Downloads/All Sales Report (8).csv'
+SLS_OUT = '/run/user/1000/gvfs/google-drive:host=gmail.com,user=ted.kushcart/ln_itm_sls_2021.csv'
+
+
+def get_blz_batch_qty(
+        inventory: str='safe', client: BlazeClient=None, inventories: dict=INVENTORIES
+        ) -> pd.DataFrame:
     """
     Retrieve batch quantities from BLAZE.
     Args:
-        skip (int, optional): nbr records to skip at API call. Defaults to 0.
         inventory (str, optional): inventory to query. Defaults to 'safe'.
+        client (BlazeClient, optional): api client. Defaults to a new client.
+        inventories (dict, optional): inventory name -> id. Defaults to INVENTORIES.
+    Raises:
+        BlazeAPIError: if a page could not be fetched
     Returns:
         pd.DataFrame: batch quantity df
     """
-    inventories = {
-        'safe': '5d26ca35002ec407fccc9e39',
-        'backstock': '5d72f55b0964cc083b14fce8',
-        'ict1': '61031630142eec3c1122ebb3',
-        'exchange': '5d26ca35002ec407fccc9e3c'
-        }
-    url = "https://api.partners.blaze.me/api/v1/partner/store/batches/quantities"
-    headers = {
-        'partner_key': os.getenv('blz_partner_key'),
-        'Authorization': os.getenv('blz_api_key')
-        }
-    params = {'inventoryId': inventories.get(inventory), 'start': skip}
-
-    response = requests.get(url, headers=headers, params=params)
-
-    if response.status_code == 200:
-        dat = pd.DataFrame().from_records(response.json().get('values'))
-        if skip >= response.json().get('total'):
-            return dat
-        else:
-            return (
-                pd.concat([
-                    dat,
-                    get_blz_batch_qty(
-                        skip=skip + response.json().get('limit'),
-                        inventory='safe'
-                        )
-                    ])
-                )
-    else:
-        return f'Error retrieving inventory: {inventory} with '
-        f'id {inventories.get(inventory)} with status code {response.status_code}'
-
-
-def get_products(skip: int=0) -> pd.DataFrame:
+    if inventory not in inventories:
+        raise ValueError(f'unknown inventory {inventory!r}, expected one of {list(inventories)}')
+    client = client or BlazeClient()
+    return client.fetch_all(
+        'store/batches/quantities',
+        params={'inventoryId': inventories[inventory]},
+        offset_param='start'
+        )
+
+
+def get_batch_quantities(stores: dict=None, max_workers: int=8) -> pd.DataFrame:
+    """
+    Batch quantities of every inventory of every store, fetched in parallel.
+    Args:
+        stores (dict, optional): store name -> (BlazeClient, {inventory name: id}).
+            Defaults to one 'default' store with the env credentials and INVENTORIES.
+        max_workers (int, optional): inventories fetched at once. Defaults to 8.
+    Returns:
+        pd.DataFrame: batch quantities of all inventories with store and
+            inventory columns
+    """
+    stores = stores or {'default': (BlazeClient(), INVENTORIES)}
+    jobs = [
+        (store, name, client, inventories)
+        for store, (client, inventories) in stores.items()
+        for name in inventories
+        ]
+
+    def fetch(job):
+        store, name, client, inventories = job
+        return get_blz_batch_qty(name, client, inventories).assign(
+            store=store, inventory=name
+            )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(fetch, jobs))
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_products(client: BlazeClient=None) -> pd.DataFrame:
     """
     Retrieve all products from BLAZE API.
     Args:
-        skip (int, optional): Nbr records to skip at API call. Defaults to 0.
+        client (BlazeClient, optional): api client. Defaults to a new client.
+    Raises:
+        BlazeAPIError: if a page could not be fetched
     Returns:
         pd.DataFrame: df of all products
     """
-    url = "https://api.partners.blaze.me/api/v1/partner/products"
-
-    headers = {
-        'partner_key': os.getenv('blz_partner_key'),
-        'Authorization': os.getenv('blz_api_key')
-        }
-    params = {'skip': skip}
-
-    response = requests.get(url, headers=headers,params=params)
-    if response.status_code == 200:
-        dat = pd.DataFrame().from_records(response.json().get('values'))
-        if skip  >= response.json().get('total'):
-            return dat
-        else:
-            return(
-                pd.concat([
-                    dat,
-                    get_products(skip=skip + response.json().get('limit'))
-                ])
-            )
-    else:
-        return f'Error retrieving products: with status code {response.status_code}'
+    client = client or BlazeClient()
+    return client.fetch_all('products')
 
 
-def get_vendors(skip: int=0) -> pd.DataFrame:
+def get_vendors(client: BlazeClient=None) -> pd.DataFrame:
     """
-    Get all vendors from BLAZE, recursively
+    Get all vendors from BLAZE
     Args:
-        skip (int, optional): nbr records to skip. Defaults to 0.
+        client (BlazeClient, optional): api client. Defaults to a new client.
+    Raises:
+        BlazeAPIError: if a page could not be fetched
     Returns:
         pd.DataFrame: vendors data
     """
-    url = "https://api.partners.blaze.me/api/v1/partner/vendors"
-
-    headers = {
-        'partner_key': os.getenv('blz_partner_key'),
-        'Authorization': os.getenv('blz_api_key')
-        }
-    params = {'skip': skip}
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        dat = pd.DataFrame().from_records(response.json().get('values')).rename(
-            columns={
-                'name': 'vendor_name'
-                }
-            ).drop_duplicates('id')
-        if skip >= response.json().get('total'):
-            return dat
-        else:
-            return(
-                pd.concat([
-                    dat,
-                    get_vendors(skip=skip + response.json().get('limit'))
-                ])
-            )
-    else:
-        return f'Error retrieving products: with status code {response.status_code}'
+    client = client or BlazeClient()
+    return client.fetch_all('vendors').rename(
+        columns={
+            'name': 'vendor_name'
+            }
+        ).drop_duplicates('id')
 
 
-def get_brands(skip: int=0) -> pd.DataFrame:
+def get_brands(client: BlazeClient=None) -> pd.DataFrame:
     """
-    Get all brands from BLAZE API recursively
+    Get all brands from BLAZE API
     Args:
-        skip (int, optional): nbr of records to skip (api param). Defaults to 0.
+        client (BlazeClient, optional): api client. Defaults to a new client.
+    Raises:
+        BlazeAPIError: if a page could not be fetched
     Returns:
         pd.DataFrame: Brands data
     """
-    url = "https://api.partners.blaze.me/api/v1/partner/store/inventory/brands"
-
-    headers = {
-        'partner_key': os.getenv('blz_partner_key'),
-        'Authorization': os.getenv('blz_api_key')
-        }
-    params = {'limit': 200, 'start': skip}
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        dat = pd.DataFrame().from_records(response.json().get('values')).rename(
+    client = client or BlazeClient()
+    return client.fetch_all(
+        'store/inventory/brands', offset_param='start', page_size=200
+        ).rename(
             columns={
                 'name': 'brand_name', 'id': 'brand_id'
                 }
             ).drop_duplicates('brand_id')
-        if skip >= response.json().get('total'):
-            return dat
-        else:
-            return(
-                pd.concat([
-                    dat,
-                    get_brands(skip=skip + response.json().get('limit'))
-                ])
-            )
-    else:
-        return f'Error retrieving products: with status code {response.status_code}'
 
-def combine_txns(s):
-    """For get_sls(), but is not in use. See comments in main()
+def transaction_items(records: list) -> pd.DataFrame:
+    """
+    Flatten the cart items of BLAZE transactions to one row per line item.
+    Items are tied to their own transaction by json_normalize rather than
+    by matching id prefixes, and created/completed times are read in
+    STORE_TZ.
     Args:
-        s ([type]): [description]
+        records (list): transaction records from the api
     Returns:
-        [type]: [description]
+        pd.DataFrame: TXN_ITEM_COLS, one row per cart item
     """
-    df = pd.DataFrame()
-    for x in s:
-        if df.empty:
-            df = x
-        else:
-            df = pd.concat([df, x])
-    return df
+    records = [x for x in records if (x.get('cart') or {}).get('items')]
+    if not records:
+        return pd.DataFrame(columns=TXN_ITEM_COLS)
+    items = pd.json_normalize(
+        records, record_path=['cart', 'items'],
+        meta=['id', 'transNo', 'created', 'completedTime'],
+        meta_prefix='txn_', errors='ignore'
+        ).rename(columns={'txn_transNo': 'transNo'})
+    for col, out in (('txn_created', 'created_dt'), ('txn_completedTime', 'completedTime')):
+        items[out] = pd.to_datetime(
+            pd.to_numeric(items[col]), unit='ms', utc=True
+            ).dt.tz_convert(STORE_TZ).dt.tz_localize(None)
+    items = items.reindex(columns=TXN_ITEM_COLS)
+    items['quantity'] = items['quantity'].astype('float64')
+    for x in ['txn_id', 'transNo', 'productId']:
+        items[x] = items[x].astype('str')
+    return items
 
 
 def get_sls(
-        start: str=(datetime.today() - timedelta(days=1)).strftime('%m/%d/%Y'),
-        end: str=datetime.today().strftime('%m/%d/%Y'),
-        skip=0
-        ):
-    """Currently unused, needs revision. See comments in main()
+        start: str=None, end: str=None, client: BlazeClient=None,
+        checkpoint: Checkpoint=None
+        ) -> pd.DataFrame:
+    """
+    Line items of the transactions in one date window, pages fetched
+    concurrently.
     Args:
-        start (str, optional): [description]. Defaults to (datetime.today() - timedelta(days=1)).strftime('%m/%d/%Y').
-        end (str, optional): [description]. Defaults to datetime.today().strftime('%m/%d/%Y').
-        skip (int, optional): [description]. Defaults to 0.
+        start (str, optional): first day, mm/dd/yyyy. Defaults to yesterday.
+        end (str, optional): last day, mm/dd/yyyy. Defaults to today.
+        client (BlazeClient, optional): api client. Defaults to a new client.
+        checkpoint (Checkpoint, optional): where finished windows are kept;
+            a window already in it is not fetched again. Defaults to None.
+    Raises:
+        BlazeAPIError: if a page of the window could not be fetched
     Returns:
-        [type]: [description]
+        pd.DataFrame: see transaction_items()
     """
+    today = datetime.today()
+    start = start or (today - timedelta(days=1)).strftime('%m/%d/%Y')
+    end = end or today.strftime('%m/%d/%Y')
+    client = client or BlazeClient()
 
-    url = "https://api.partners.blaze.me/api/v1/partner/transactions"
-    headers = {
-            'partner_key': os.getenv('blz_partner_key'),
-            'Authorization': os.getenv('blz_api_key')
-            }
-    params = {'startDate': start, 'endDate': end, 'skip': skip}
-    response = requests.get(url, headers=headers, params=params)
-    if response.ok:
-        dat = pd.DataFrame().from_dict(response.json().get('values'))
-        itms = dat.cart.apply(lambda x: x.get('items'))
-        itms = itms.apply(lambda x: pd.DataFrame().from_records(x))
-        itms = combine_txns(itms)
-        dat['joinid'] = dat.id.apply(lambda x: x[0:-3])
-        dat = dat.rename(columns={'id': 'txn_id'})
-        dat['created_dt'] = dat.created.apply(lambda x: datetime.fromtimestamp(x/1000))
-        dat['completedTime'] = dat['completedTime'].apply(lambda x: datetime.fromtimestamp(x/1000))
-        itms['joinid'] = itms.id.apply(lambda x: x[0:-3])
-        ln_itm_txns = dat.merge(
-            itms,
-            how='left',
-            on='joinid'
+    def fetch():
+        return list(chain.from_iterable(client.iter_pages(
+            'transactions', params={'startDate': start, 'endDate': end}
+            )))
+
+    unit = f'{start}_{end}'
+    return transaction_items(checkpoint.run(unit, fetch) if checkpoint else fetch())
+
+
+def _unseen(chunks):
+    """Drop the items of transactions already yielded by an earlier window."""
+    seen = set()
+    for chunk in chunks:
+        new = unseen_keys(
+            pd.util.hash_pandas_object(chunk['txn_id'], index=False).to_numpy(), seen
             )
-        ln_itm_txns = ln_itm_txns[[
-            'created_dt',
-            'completedTime',
-            'transNo',
-            'productId',
-            'quantity'
-            ]]
-        if skip + response.json().get("limit") >= response.json().get('total'):
-            return ln_itm_txns
-        else:
-            return pd.concat([
-                ln_itm_txns,
-                get_sls(start=start, end=end, skip=skip + response.json().get('limit'))
-                ])
-    else:
-        return f'Error retrieving sls data from BLAZE -- response code: {response.status_code}:{response.reason}'
+        if new.any():
+            yield chunk.loc[new]
+
+
+def extract_transactions(
+        start: str, end: str, sink, client: BlazeClient=None,
+        delta: timedelta=timedelta(days=1), max_workers: int=4,
+        checkpoint_dir: str=None
+        ) -> int:
+    """
+    Pull the line items of every transaction from start through end into a
+    sink. The range is split into non-overlapping windows by dt_gen(), the
+    windows are fetched concurrently and each one is staged as it arrives.
+    Only 2 * max_workers windows are submitted ahead of the one being
+    staged, so a long backfill never holds more than those in memory.
+    With a checkpoint_dir every fetched window is also saved there, and a
+    rerun after a failure only fetches the windows that are missing. The
+    checkpoint is removed once the sink has been merged.
+    Args:
+        start (str): first day, mm/dd/yyyy
+        end (str): last day, mm/dd/yyyy
+        sink (ParquetSink or CSVSink): destination
+        client (BlazeClient, optional): api client. Defaults to a new client.
+        delta (timedelta, optional): window length. Defaults to one day.
+        max_workers (int, optional): windows fetched at once. Defaults to 4.
+        checkpoint_dir (str, optional): directory to checkpoint windows in.
+            Defaults to None, no checkpoint.
+    Raises:
+        BlazeAPIError: if a window could not be fetched, once the windows
+            already in flight have finished and been checkpointed
+    Returns:
+        int: nbr of line items written
+    """
+    client = client or BlazeClient()
+    windows = dt_gen(start, end, delta)
+    checkpoint = Checkpoint(checkpoint_dir, {
+        'endpoint': 'transactions', 'start': start, 'end': end, 'delta': delta
+        }) if checkpoint_dir else None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        chunks = in_order(
+            pool, lambda w: get_sls(*w, client=client, checkpoint=checkpoint),
+            windows, 2 * max_workers
+            )
+        rows = load_chunks(_unseen(chunks), sink)
+    if checkpoint:
+        checkpoint.clear()
+    return rows
 
 def insert_to_gsheet(ws: str, df: pd.DataFrame) -> None:
     """
     Insert data to Google sheet
     https://docs.google.com/spreadsheets/d/1On64UQPTGt4qjmNdPnqg32u8ASDPN5iopCRNQ4tkrIg/edit?usp=sharing
     Separates each category to different tabs and includes an "All" tab that gives
-    all product information without breakout.
+    all product information without breakout. Category tabs are split with
+    one groupby and published in a single batch, skipping tabs that have not
+    changed since the last run.
     Args:
         ws (str): worksheet
         df (pd.DataFrame): DF to be written
     """
+    # gspread_pandas pulls in the google auth stack, only pay for it when
+    # something is published
+    from gspread_pandas import Spread
+
     wbs = {'inventory': 'BLAZE Inventory', 'sales': 'BLAZE Sales'}
     spread = Spread(wbs[ws])
     if ws == 'inventory':
-        spread.df_to_sheet(df, replace=True, index=False, sheet='All')
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Flower'],
-            replace=True,
-            index=False,
-            sheet='Flower'
-            )
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Oil Cartridges'],
-            replace=True,
-            index=False,
-            sheet='Oil Cartridges'
-            )
-        spread.df_to_sheet(
-            df.loc[
-                (df['category_name'] == 'Concentrates') | (df['category_name'] == 'Extracts')
-                ],
-                replace=True, index=False, sheet='Conc/Extracts'
-            )
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Pre-rolls'],
-            replace=True,
-            index=False,
-            sheet='Pre-rolls'
-            )
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Tinctures'],
-            replace=True,
-            index=False,
-            sheet='Tinctures'
-            )
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Edibles'],
-            replace=True,
-            index=False,
-            sheet='Edibles'
-            )
-        spread.df_to_sheet(
-            df.loc[df['category_name'] == 'Topicals'],
-            replace=True,
-            index=False,
-            sheet='Topicals'
-            )
+        publish_tabs(spread, partition_tabs(df, INVENTORY_TABS))
     elif ws == 'sales':
         spread.df_to_sheet(
             df,
@@ -282,74 +279,48 @@ def insert_to_gsheet(ws: str, df: pd.DataFrame) -> None:
             sheet='Sheet1'
             )
 
-def dt_gen(start: str, end: str, delta: timedelta=timedelta(days=5)) -> str:
+def dt_gen(start: str, end: str, delta: timedelta=timedelta(days=5)):
+    """
+    Split start through end into consecutive windows that do not overlap.
+    Both ends of a window are included, so each window ends the day before
+    the next one starts and the last one ends on end.
+    Args:
+        start (str): first day, mm/dd/yyyy
+        end (str): last day, mm/dd/yyyy
+        delta (timedelta, optional): window length. Defaults to 5 days.
+    Yields:
+        tuple: (first day, last day) of a window, mm/dd/yyyy
+    """
     start = datetime.strptime(start, '%m/%d/%Y')
     end = datetime.strptime(end, '%m/%d/%Y')
     curr = start
-    while curr < end:
-        yield curr.strftime('%m/%d/%Y'), (curr + delta).strftime()
+    while curr <= end:
+        last = min(curr + delta - timedelta(days=1), end)
+        yield curr.strftime('%m/%d/%Y'), last.strftime('%m/%d/%Y')
         curr += delta
 
 
-def main() -> None:
-    """
-    main
-    Returns: None
-    """
-
-    batch_qty = get_blz_batch_qty()
-    products = get_products()
-    vendors = get_vendors()
-    brands = get_brands()
-    products['category_name'] = products.category.apply(lambda x: x.get('name'))
-    products.loc[
-        products['category_name'] == 'Flower', 'unitPrice'
-        ] = products.loc[
-            products['category_name'] == 'Flower', 'priceRanges'
-            ].apply(lambda x: x[1].get('price'))
-    inv_summ = products.merge(
-        batch_qty,
-        how='left',
-        right_on='productId',
-        left_on='id'
-        ).groupby([
-            'brandId', 'vendorId', 'productId',
-            'sku', 'category_name', 'name', 'unitPrice'
-            ]).agg({'quantity': 'sum'}).reset_index().merge(
-                vendors,
-                how='left',
-                left_on='vendorId',
-                right_on='id'
-            ).merge(
-                brands,
-                how='left',
-                left_on='brandId',
-                right_on='brand_id'
-            )
-    inv_summ = inv_summ.rename(columns={'quantity': 'ohq'})
-    inv_summ['onhand($)'] = inv_summ['ohq'] * inv_summ['unitPrice']
+def sales_lines(sls_file: str = SLS_FILE) -> pd.DataFrame:
+    """Line item sales with per unit cost, retail and net sales.
 
-    insert_to_gsheet('inventory', df=inv_summ)
-
-    # Insert sales to Google CSV
+    Args:
+        sls_file (str, optional): All Sales Report export. Defaults to
+        SLS_FILE.
 
-    sls_file = '/home/ted/Downloads/All Sales Report (8).csv'
-    sls = pd.read_csv(sls_file, skiprows=1)
-    sls.Date = pd.to_datetime(sls.Date)
-    sls = sls.drop_duplicates(
-        ['Date', 'Trans No.', 'Product SKU', 'Member', 'Quantity Sold']
-        )
-    sls['Units'] = sls['Quantity Sold'].str.split(' ', expand=True)[1]
-    sls['Quantity Sold'] = sls['Quantity Sold'].str.split(' ', expand=True)[0]
-    sls['COGs'] = sls['COGs'].str.strip('$')
-    sls['Retail Value'] = sls['Retail Value'].str.strip('$')
-    sls['Net Sales'] = sls['Net Sales'].str.strip('$')
-    sls = sls.astype({
-        'COGs': 'float', 
-        'Net Sales': 'float',
-        'Retail Value': 'float',
-        'Quantity Sold': 'float'
-    })
+    Returns:
+        pd.DataFrame: one row per line item, money in dollars
+    """
+    with stage('load_sales') as rec:
+        sls = read_compact_report(sls_file)
+        sls = sls.drop_duplicates(
+            ['Date', 'Trans No.', 'Product SKU', 'Member', 'Quantity Sold']
+            )
+        qty = parse_quantity(sls['Quantity Sold'])
+        sls['Units'] = qty['unit']
+        sls['Quantity Sold'] = qty['quantity']
+        for col in sls.columns.intersection(MONEY_COLS):
+            sls[col] = dollars(sls[col])
+        rec['rows_out'] = sls
 
     sls['Unit Cost'] = sls['COGs']/ sls['Quantity Sold']
     sls['Unit Retail'] = sls['Retail Value'] / sls['Quantity Sold']
@@ -367,24 +338,48 @@ def main() -> None:
     return df
 
 
-    ##########################################################################
-    # For getting sales information from get_sls(). This functionality 
-    # pulls from BLAZE API, but currently does not align with ground truth of 
-    # existing data in BLAZE. This will need to be reviewed, refactored, and
-    # verified against existing data. Going forward, I will instead manually
-    # add sales for sourcing reporting.
-    ##########################################################################
-    # start = (datetime.today() - timedelta(days=5)).strftime('%m/%d/%Y')
-    # end = datetime.today().strftime('%m/%d/%Y')
-    # for i, j in dt_gen(start=start, end=end):
-    #     x = get_sls(start=i, end=j)
-    #     xp = x.merge(
-    #         p[['id', 'name']],
-    #         how='left',
-    #         left_on='productId',
-    #         right_on='id'
-    #         )
+def main(force_refresh: bool=False, sls_file: str=SLS_FILE) -> pd.DataFrame:
+    """
+    main
+    Args:
+        force_refresh (bool, optional): pull the product, vendor and brand
+            catalogs from BLAZE even if the cached copies are still fresh.
+            Defaults to False.
+        sls_file (str, optional): All Sales Report export the line item
+            sales come from. Defaults to SLS_FILE.
+    Returns:
+        pd.DataFrame: line item sales with unit cost, retail and net sales
+    """
+
+    client = BlazeClient()
+    # every inventory in one parallel pull, the summary reports the safe
+    with stage('fetch_batch_qty') as rec:
+        on_hand = get_batch_quantities({'default': (client, INVENTORIES)})
+        batch_qty = on_hand.loc[on_hand['inventory'] == 'safe']
+        rec['rows_out'] = on_hand
+    # the catalogs change far less often than quantities, serve them from
+    # the on-disk cache while fresh
+    with stage('fetch_catalog') as rec:
+        catalog = CachedBlazeClient(client, force=force_refresh)
+        products = get_products(client=catalog)
+        vendors = get_vendors(client=catalog)
+        brands = get_brands(client=catalog)
+        rec['rows_out'] = products
+    with stage('inventory_summary', products) as rec:
+        inv_summ = inventory_summary(products, batch_qty, vendors, brands)
+        rec['rows_out'] = inv_summ
+
+    with stage('publish', inv_summ):
+        insert_to_gsheet('inventory', df=inv_summ)
+
+    # Insert sales to Google CSV. Line items can also be pulled from the
+    # api with extract_transactions(); until those are checked against the
+    # BLAZE sales export the report keeps using the downloaded csv.
+
+    return sales_lines(sls_file)
+
+
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     sls = main()
-    b = get_blz_batch_qty()
-    sls.to_csv('/run/user/1000/gvfs/google-drive:host=gmail.com,user=ted.kushcart/ln_itm_sls_2021.csv')
+    sls.to_csv(SLS_OUT)
@@ -0,0 +1,283 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from onfleet_reports import REPORT_COLUMNS
+
+##############################################################################
+# Description: Deterministic synthetic data shaped like the exports and api
+# responses the scripts read, for benchmarks and local runs without the
+# real files. Column names and text formats follow the real exports: money
+# as '$12.34' strings, 'Quantity Sold' like '3.5 g', the BLAZE title row
+# above the csv header. Every generator takes a seed, so the same arguments
+# always give the same data.
+##############################################################################
+
+CATEGORIES = [
+    'Flower', 'Oil Cartridges', 'Concentrates', 'Extracts',
+    'Pre-rolls', 'Tinctures', 'Edibles', 'Topicals'
+    ]
+MKT_SOURCES = ['Google', 'Instagram', 'Referral', 'Weedmaps', None]
+# first day of the generated sales, every member joins before it
+SALES_START = datetime(2021, 1, 1)
+
+
+def synthetic_sales(
+        n_rows: int, day: datetime, n_members: int = 5000, seed: int = 0
+        ) -> pd.DataFrame:
+    """Build one day of All Sales Report line items with string money cols.
+
+    Args:
+        n_rows (int): nbr of line items
+        day (datetime): date of the sales
+        n_members (int, optional): size of member pool. Defaults to 5000.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: line items as they appear in the csv export
+    """
+    rng = np.random.default_rng(seed)
+    member = rng.integers(0, n_members, n_rows)
+    # line items of one transaction share the sale time
+    minutes = rng.integers(10 * 60, 22 * 60, n_members)[member]
+    retail = rng.integers(500, 12000, n_rows) / 100
+    cogs = (retail * rng.uniform(0.3, 0.6, n_rows)).round(2)
+    qty = rng.choice(['1 ea', '2 ea', '3.5 g', '7.0 g', '1.0 g'], n_rows)
+    # a member joins the same day in every export, up to two years before
+    # SALES_START, and never after the day of the sale
+    joined = np.minimum(
+        pd.Timestamp(SALES_START) - pd.to_timedelta(member % 730 + 1, 'D'),
+        pd.Timestamp(day).normalize()
+        )
+    return pd.DataFrame({
+        'Date': (
+            pd.Timestamp(day) + pd.to_timedelta(minutes, 'm')
+            ).strftime('%m/%d/%Y %H:%M'),
+        'Trans No.': day.strftime('%y%m%d') + pd.Series(
+            member).astype(str).str.zfill(5),
+        'Trans Status': 'Completed',
+        'Product SKU': pd.Series(rng.integers(1000, 3000, n_rows)).map(
+            'SKU{}'.format),
+        'Product Name': pd.Series(rng.integers(0, 400, n_rows)).map(
+            'Product {}'.format),
+        'Product Category': rng.choice(CATEGORIES, n_rows),
+        'Brand Name': pd.Series(rng.integers(0, 60, n_rows)).map(
+            'Brand {}'.format),
+        'Vendor': pd.Series(rng.integers(0, 30, n_rows)).map(
+            'Vendor {}'.format),
+        'Batch': pd.Series(rng.integers(0, 900, n_rows)).map(
+            'B-{}'.format),
+        'Member': pd.Series(member).map('Member {}'.format),
+        'Member ID': member,
+        'Member Group': rng.choice(['Default', 'VIP'], n_rows),
+        'Date Joined': joined.strftime('%m/%d/%Y'),
+        'Quantity Sold': qty,
+        'COGs': pd.Series(cogs).map('${:.2f}'.format),
+        'Retail Value': pd.Series(retail).map('${:.2f}'.format),
+        'Subtotal': pd.Series(retail).map('${:.2f}'.format),
+        'Total Discount': '$0.00',
+        'Net Sales': pd.Series(retail).map('${:.2f}'.format),
+        'Final Subtotal': pd.Series(retail).map('${:.2f}'.format),
+        'Payment Type': rng.choice(['Cash', 'Debit'], n_rows),
+        'Promotion(s)': None,
+        'Marketing Source': np.array(MKT_SOURCES, dtype=object)[
+            member % len(MKT_SOURCES)],
+        'Zip Code': 97000 + member % 300,
+        'Employee': pd.Series(rng.integers(0, 12, n_rows)).map(
+            'Driver {}'.format),
+        })
+
+
+def write_sales_dir(
+        out_dir: str, n_days: int = 365, rows_per_day: int = 400,
+        start: datetime = SALES_START
+        ) -> list:
+    """Write one All Sales Report csv per day, with the BLAZE title row.
+
+    Args:
+        out_dir (str): directory to write into
+        n_days (int, optional): nbr of daily files. Defaults to 365.
+        rows_per_day (int, optional): line items per file. Defaults to 400.
+        start (datetime, optional): first day. Defaults to 2021-01-01.
+
+    Returns:
+        list: paths written
+    """
+    paths = []
+    for i in range(n_days):
+        day = start + timedelta(days=i)
+        path = os.path.join(
+            out_dir, f"All Sales Report {day.strftime('%Y-%m-%d')}.csv"
+            )
+        with open(path, 'w', newline='') as f:
+            f.write('All Sales Report\n')
+            synthetic_sales(rows_per_day, day, seed=i).to_csv(f, index=False)
+        paths.append(path)
+    return paths
+
+
+def synthetic_customers(n: int, seed: int = 0) -> pd.DataFrame:
+    """One row per customer with the columns RFM scoring works on."""
+    rng = np.random.default_rng(seed)
+    frequency = rng.geometric(0.25, n)
+    avg_gap = rng.gamma(2.0, 12.0, n).round(1)
+    avg_gap[frequency == 1] = np.nan
+    return pd.DataFrame({
+        'Member ID': np.arange(n),
+        'recency': rng.integers(0, 900, n),
+        'frequency': frequency,
+        'monetary': (frequency * rng.gamma(2.0, 40.0, n)).round(2),
+        'Avg Days Between Purch': avg_gap
+        })
+
+
+def synthetic_products(n: int, seed: int = 0) -> list:
+    """BLAZE product records shaped like the partner api's products."""
+    rng = np.random.default_rng(seed)
+    return [{
+        'id': f'p{i:06d}',
+        'sku': f'SKU{i}',
+        'name': f'Product {i}',
+        'brandId': f'b{rng.integers(0, 60):03d}',
+        'vendorId': f'v{rng.integers(0, 30):03d}',
+        'unitPrice': float(rng.integers(500, 6000)) / 100,
+        'category': {'name': CATEGORIES[i % len(CATEGORIES)]},
+        'priceRanges': [
+            {'weightToleranceId': 'w1', 'price': 10.0},
+            {'weightToleranceId': 'w2', 'price': 35.0}
+            ]
+        } for i in range(n)]
+
+
+def write_sales_details(
+        path: str, n_rows: int, start: datetime = SALES_START,
+        rows_per_day: int = 2000
+        ) -> str:
+    """Write a COMPLETED_SALES_DETAILS export of n_rows line items.
+
+    Args:
+        path (str): csv to write
+        n_rows (int): nbr of line items
+        start (datetime, optional): first day. Defaults to 2021-01-01.
+        rows_per_day (int, optional): line items per day. Defaults to 2000.
+
+    Returns:
+        str: path
+    """
+    with open(path, 'w', newline='') as f:
+        f.write('Completed Sales Details Report\n')
+        for i, first in enumerate(range(0, n_rows, rows_per_day)):
+            day = synthetic_sales(
+                min(rows_per_day, n_rows - first), start + timedelta(days=i), seed=i
+                )
+            day.to_csv(f, index=False, header=not i)
+    return path
+
+
+def synthetic_vendors(n: int = 30) -> list:
+    """BLAZE vendor records, ids matching synthetic_products()."""
+    return [
+        {'id': f'v{i:03d}', 'name': f'Vendor {i}', 'active': True, 'companyId': 'c1'}
+        for i in range(n)
+        ]
+
+
+def synthetic_brands(n: int = 60) -> list:
+    """BLAZE brand records, ids matching synthetic_products()."""
+    return [{'id': f'b{i:03d}', 'name': f'Brand {i}', 'active': True} for i in range(n)]
+
+
+def synthetic_batch_qty(product_ids, n: int, seed: int = 0) -> list:
+    """BLAZE batch quantity records spread over product_ids."""
+    rng = np.random.default_rng(seed)
+    return [
+        {'productId': p, 'batchId': f'bt{i}', 'quantity': float(q)}
+        for i, (p, q) in enumerate(zip(
+            rng.choice(np.asarray(product_ids), n), rng.integers(0, 40, n)
+            ))
+        ]
+
+
+def synthetic_transactions(
+        n_days: int, per_day: int, start: datetime = datetime(2022, 3, 1),
+        n_products: int = 5000, seed: int = 0
+        ) -> list:
+    """BLAZE transaction records with their cart items.
+
+    Times are epoch ms like the api's. Item ids share all but the last
+    three characters with their transaction id.
+
+    Args:
+        n_days (int): nbr of days
+        per_day (int): transactions per day
+        start (datetime, optional): first day. Defaults to 2022-03-01.
+        n_products (int, optional): size of the product pool. Defaults to 5000.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list: transaction dicts with 1-5 cart items each
+    """
+    rng = np.random.default_rng(seed)
+    txns = []
+    for d in range(n_days):
+        day = int((start + timedelta(days=d)).timestamp() * 1000)
+        for t in range(per_day):
+            txn_id = f'{d:03d}{t:05d}000'
+            created = day + int(rng.integers(0, 86_400_000))
+            txns.append({
+                'id': txn_id,
+                'transNo': str(100_000 + d * per_day + t),
+                'created': created,
+                'completedTime': created + 60_000,
+                'cart': {'items': [{
+                    'id': f'{txn_id[:-3]}{i:03d}',
+                    'productId': f'p{rng.integers(0, n_products):06d}',
+                    'quantity': float(rng.integers(1, 4))
+                    } for i in range(int(rng.integers(1, 6)))]}
+                })
+    return txns
+
+
+def blaze_pages(records: list, page_size: int = 100) -> list:
+    """Records split into the page bodies the partner api returns."""
+    return [
+        {'values': records[i:i + page_size], 'skip': i, 'limit': page_size,
+         'total': len(records)}
+        for i in range(0, max(len(records), 1), page_size)
+        ]
+
+
+def write_onfleet_dir(
+        root: str, n_months: int = 12, downloads: int = 3,
+        start: str = '2021-01-01', seed: int = 0
+        ) -> pd.DatetimeIndex:
+    """Write Onfleet by_date report csvs, one folder per 30 day period.
+
+    Each period is split over `downloads` subfolders, the way the month
+    exports are downloaded a few days at a time.
+
+    Args:
+        root (str): directory to write the period folders into
+        n_months (int, optional): nbr of periods. Defaults to 12.
+        downloads (int, optional): download folders per period. Defaults to 3.
+        start (str, optional): first day. Defaults to '2021-01-01'.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        pd.DatetimeIndex: every day written
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, periods=n_months * 30, freq='D')
+    for m in range(n_months):
+        month = days[m * 30:(m + 1) * 30]
+        for d, chunk in enumerate(np.array_split(month, downloads)):
+            folder = os.path.join(root, f'M{m:02d}', f'download {d}')
+            os.makedirs(folder)
+            for name, cols in REPORT_COLUMNS.items():
+                vals = rng.integers(1, 5000, size=(len(cols), len(chunk)))
+                pd.DataFrame(
+                    vals, index=cols, columns=chunk.strftime('%Y-%m-%d')
+                    ).to_csv(os.path.join(folder, f'{name}.csv'))
+    return days